@@ -0,0 +1,63 @@
+"""Revise a folder of epubs.
+
+Run with `python -m epub_summary.batch input_fol output_fol`.
+"""
+
+import argparse
+from pathlib import Path
+
+from epub_summary.batch.runner import BatchRunner
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.reviser import ChapterReviser
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input_fol", type=Path)
+    parser.add_argument("output_fol", type=Path)
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=float, default=None)
+    parser.add_argument("--tokens-per-minute", type=float, default=None)
+    parser.add_argument(
+        "--pack-tokens",
+        type=int,
+        default=None,
+        help="Revise consecutive short chapters in one request of up to this many tokens.",
+    )
+    parser.add_argument("--report-every", type=float, default=30.0)
+    parser.add_argument(
+        "--keep-boilerplate",
+        action="store_true",
+        help="Send the paragraphs repeated across chapters to the model too.",
+    )
+    parser.add_argument(
+        "--no-book-cache",
+        action="store_true",
+        help="Parse every book again instead of loading it from the parsed book cache.",
+    )
+    args = parser.parse_args()
+
+    reviser = ChapterReviser(
+        ChatOpenAIConfig(),
+        max_concurrency=args.max_concurrency,
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_pack_tokens=args.pack_tokens,
+    )
+    runner = BatchRunner(
+        args.input_fol,
+        args.output_fol,
+        reviser,
+        report_every_s=args.report_every,
+        strip_boilerplate=not args.keep_boilerplate,
+    )
+    if args.no_book_cache:
+        runner.book_cache = None
+    if args.parse_workers is not None:
+        runner.parse_workers = args.parse_workers
+    runner.run()
+
+
+if __name__ == "__main__":
+    main()
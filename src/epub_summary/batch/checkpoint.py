@@ -0,0 +1,169 @@
+"""Checkpoint manifest of a batch run.
+
+The manifest is an append-only json lines file, one record per finished
+chapter, so that a killed run loses at most the line being written.
+"""
+
+from dataclasses import asdict, dataclass
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from loguru import logger as lg
+
+if TYPE_CHECKING:
+    from epub_summary.epubber.epub import Epub
+
+ChapterStatus = Literal["done", "failed"]
+
+# chapter index of the record marking a whole book as done
+BOOK_DONE_CHAPTER = -1
+
+
+@dataclass
+class ChapterRecord:
+    """Outcome of a chapter in a batch run."""
+
+    book: str
+    chapter: int
+    chap_stem: str
+    status: ChapterStatus
+    output: str | None = None
+    error: str | None = None
+    content_hash: str | None = None
+    """Content hash of the chapter that was revised."""
+    fingerprint: str | None = None
+    """Fingerprint of the prompts and model settings of the revision."""
+
+
+class CheckpointManifest:
+    """Append-only record of the chapters processed by a batch run."""
+
+    def __init__(self, manifest_fp: Path) -> None:
+        """Load the records of the previous runs, if any."""
+        self.manifest_fp = manifest_fp
+        self.done: dict[tuple[str, int], ChapterRecord] = {}
+        self.by_hash: dict[tuple[str, str | None], ChapterRecord] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Read the existing manifest, skipping a truncated last line."""
+        if not self.manifest_fp.exists():
+            return
+        with self.manifest_fp.open() as f:
+            for line in f:
+                try:
+                    record = ChapterRecord(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    lg.warning(f"Skipping broken manifest line: {line!r}")
+                    continue
+                self.add_record(record)
+
+    def add_record(self, record: ChapterRecord) -> None:
+        """Track a record, the last one of a chapter wins."""
+        key = (record.book, record.chapter)
+        if record.status != "done":
+            self.done.pop(key, None)
+            return
+        self.done[key] = record
+        if record.content_hash is not None and record.output is not None:
+            self.by_hash[(record.content_hash, record.fingerprint)] = record
+
+    def get_output_fp(self, record: ChapterRecord) -> Path | None:
+        """Get the path of the output of a record, if it is on disk."""
+        if record.output is None:
+            return None
+        output_fp = self.manifest_fp.parent / record.output
+        return output_fp if output_fp.exists() else None
+
+    def is_done(
+        self,
+        book: str,
+        chapter: int,
+        content_hash: str | None = None,
+        fingerprint: str | None = None,
+    ) -> bool:
+        """Whether a chapter was already revised, with its output on disk.
+
+        If a content hash is given, a chapter revised from different content
+        is not done, and if a fingerprint is given, a chapter revised with
+        other prompts or model settings is not done either.
+        """
+        record = self.done.get((book, chapter))
+        if record is None:
+            return False
+        if content_hash is not None and record.content_hash not in (None, content_hash):
+            return False
+        if fingerprint is not None and record.fingerprint != fingerprint:
+            return False
+        return self.get_output_fp(record) is not None
+
+    def find_by_hash(
+        self,
+        content_hash: str,
+        fingerprint: str | None = None,
+    ) -> Path | None:
+        """Find the output of any chapter revised the same way from the same content."""
+        record = self.by_hash.get((content_hash, fingerprint))
+        if record is None:
+            return None
+        return self.get_output_fp(record)
+
+    def diff_chapters(
+        self,
+        epub: "Epub",
+        fingerprint: str | None = None,
+    ) -> tuple[dict[int, Path], list[int]]:
+        """Compare the chapters of a book with the revised ones.
+
+        Returns the outputs that can be reused for unchanged chapters,
+        and the indexes of the chapters that need to be revised.
+        """
+        reusable: dict[int, Path] = {}
+        changed: list[int] = []
+        for chapter_i, chapter in enumerate(epub.chapters):
+            output_fp = self.find_by_hash(chapter.content_hash, fingerprint)
+            if output_fp is None:
+                changed.append(chapter_i)
+            else:
+                reusable[chapter_i] = output_fp
+        return reusable, changed
+
+    def is_book_done(
+        self,
+        book: str,
+        book_hash: str,
+        fingerprint: str | None = None,
+    ) -> bool:
+        """Whether all the chapters of this version of a book were revised."""
+        record = self.done.get((book, BOOK_DONE_CHAPTER))
+        return (
+            record is not None
+            and record.content_hash == book_hash
+            and record.fingerprint == fingerprint
+        )
+
+    def mark_book_done(
+        self,
+        book: str,
+        book_hash: str,
+        fingerprint: str | None = None,
+    ) -> None:
+        """Record that all the chapters of a book were revised."""
+        self.append(
+            ChapterRecord(
+                book,
+                BOOK_DONE_CHAPTER,
+                "",
+                "done",
+                content_hash=book_hash,
+                fingerprint=fingerprint,
+            )
+        )
+
+    def append(self, record: ChapterRecord) -> None:
+        """Add a record and flush it to disk."""
+        with self.manifest_fp.open("a") as f:
+            f.write(json.dumps(asdict(record)) + "\n")
+            f.flush()
+        self.add_record(record)
@@ -0,0 +1,338 @@
+"""Batch revision of a library of epubs.
+
+The books are parsed in a process pool, or loaded from the parsed book
+cache, and their chapters revised concurrently as soon as each book is
+parsed. Each revised chapter is
+written as it completes and recorded in a checkpoint manifest, so that a
+crashed or killed run resumes without redoing the finished chapters.
+
+The records carry the content hash of each chapter and the fingerprint of
+the reviser: a chapter whose content was already revised with the same
+prompts and model settings, in this run or in a previous run given in
+previous_output_fols, reuses that output instead of calling the model.
+A corrected edition of a book only costs the chapters that changed.
+
+Paragraphs repeated at the start and end of the chapters of a book, like
+running headers, are stripped before revision and put back around the
+revised chapters.
+
+With the max_pack_tokens of the reviser, the consecutive short chapters of
+a book left to revise are packed in a single request.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import time
+
+from loguru import logger as lg
+
+from epub_summary.batch.checkpoint import ChapterRecord, CheckpointManifest
+from epub_summary.epubber.boilerplate import BoilerplateFilter, StrippedChapter
+from epub_summary.epubber.book_cache import ParsedBookCache
+from epub_summary.epubber.epub import BaseHtmlChapterParser, Epub, HtmlChapterParserLxml
+from epub_summary.metrics.registry import METRICS
+from epub_summary.summarizer.packing import plan_packs
+from epub_summary.summarizer.reviser import ChapterRevised, ChapterReviser
+from epub_summary.summarizer.tokens import estimate_tokens
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# chapter index, stem, stripped text and content hash of a chapter to revise
+PendingChapter = tuple[int, str, StrippedChapter, str]
+
+
+def parse_book(
+    epub_fp: Path,
+    parser_cls: type[BaseHtmlChapterParser],
+    book_cache: ParsedBookCache | None = None,
+) -> list[tuple[str, str, str]]:
+    """Parse a book into chapter stems, texts and content hashes.
+
+    Module level so that it can be sent to a process pool.
+    """
+    epub = Epub.from_zip(epub_fp, parser_cls=parser_cls, cache=book_cache)
+    return [(ch.chap_stem, ch.text, ch.content_hash) for ch in epub.chapters]
+
+
+def hash_file(file_fp: Path) -> str:
+    """Get the content hash of a file."""
+    with file_fp.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@dataclass
+class BatchStats:
+    """Progress of a batch run."""
+
+    t_start: float = field(default_factory=time.monotonic)
+    books_total: int = 0
+    books_done: int = 0
+    chapters_done: int = 0
+    chapters_skipped: int = 0
+    chapters_reused: int = 0
+    chapters_failed: int = 0
+
+    def __str__(self) -> str:
+        elapsed_h = (time.monotonic() - self.t_start) / 3600
+        books_per_hour = self.books_done / elapsed_h if elapsed_h > 0 else 0.0
+        chapters_per_min = (
+            self.chapters_done / (elapsed_h * 60) if elapsed_h > 0 else 0.0
+        )
+        s = f"books {self.books_done}/{self.books_total}"
+        s += f", chapters {self.chapters_done} done"
+        s += f", {self.chapters_skipped} skipped, {self.chapters_reused} reused"
+        s += f", {self.chapters_failed} failed"
+        s += f", {books_per_hour:.1f} books/h, {chapters_per_min:.1f} chapters/min"
+        return s
+
+
+@dataclass
+class BatchRunner:
+    """Revise all the epubs in a folder, resuming from the checkpoint."""
+
+    input_fol: Path
+    output_fol: Path
+    reviser: ChapterReviser
+    parse_workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    parser_cls: type[BaseHtmlChapterParser] = HtmlChapterParserLxml
+    max_books_in_flight: int = 16
+    """Books parsed or revised at the same time, bounds the memory use."""
+    report_every_s: float = 30.0
+    previous_output_fols: list[Path] = field(default_factory=list)
+    """Output folders of previous runs, whose revised chapters can be reused."""
+    strip_boilerplate: bool = True
+    """Strip the paragraphs repeated across chapters before revision."""
+    book_cache: ParsedBookCache | None = field(default_factory=ParsedBookCache)
+    """Cache of the parsed books, None to parse every book on every run."""
+
+    def __post_init__(self) -> None:
+        """Load the checkpoint manifests."""
+        self.output_fol.mkdir(parents=True, exist_ok=True)
+        self.manifest = CheckpointManifest(self.output_fol / MANIFEST_NAME)
+        self.previous_manifests = [
+            CheckpointManifest(fol / MANIFEST_NAME) for fol in self.previous_output_fols
+        ]
+        self.stats = BatchStats()
+
+    @property
+    def fingerprint(self) -> str:
+        """Get the fingerprint of every setting changing the revised chapters."""
+        return self.reviser.get_fingerprint(
+            {"strip_boilerplate": self.strip_boilerplate}
+        )
+
+    def find_books(self) -> list[Path]:
+        """Find the epubs in the input folder."""
+        return sorted(self.input_fol.rglob("*.epub"))
+
+    def get_book_key(self, epub_fp: Path) -> str:
+        """Get the key of a book, its path relative to the input folder."""
+        return epub_fp.relative_to(self.input_fol).as_posix()
+
+    def get_chapter_output(self, book: str, chapter: int, chap_stem: str) -> Path:
+        """Get the path of a revised chapter, relative to the output folder."""
+        book_fol = Path(book).with_suffix("")
+        return book_fol / f"{chapter:04d}_{chap_stem}.json"
+
+    async def revise_chapter(
+        self,
+        book: str,
+        chapter: int,
+        chap_stem: str,
+        stripped: StrippedChapter,
+        content_hash: str,
+    ) -> bool:
+        """Revise a chapter, write it and record it in the manifest."""
+        try:
+            if stripped.text.strip() == "":
+                # nothing but boilerplate, nothing to revise
+                revised = ChapterRevised(revised_chapter=stripped.text)
+            else:
+                revised = await self.reviser.arevise_chapter(stripped.text)
+        except Exception as e:
+            lg.warning(f"Failed to revise {book} chapter {chapter}: {e!r}")
+            self.stats.chapters_failed += 1
+            record = ChapterRecord(book, chapter, chap_stem, "failed", error=repr(e))
+            self.manifest.append(record)
+            return False
+        self.write_chapter(book, chapter, chap_stem, stripped, content_hash, revised)
+        return True
+
+    async def revise_pack(self, book: str, pack: list[PendingChapter]) -> list[bool]:
+        """Revise short chapters in a single request, one by one if it fails."""
+        if len(pack) == 1:
+            return [await self.revise_chapter(book, *pack[0])]
+        try:
+            revised_chapters = await self.reviser.arevise_pack(
+                [stripped.text for _, _, stripped, _ in pack]
+            )
+        except Exception as e:
+            # a bad packed answer should not fail its chapters
+            chapters = [chapter for chapter, _, _, _ in pack]
+            lg.warning(f"Failed to revise {book} pack {chapters}, unpacking: {e!r}")
+            return await asyncio.gather(
+                *[self.revise_chapter(book, *pending) for pending in pack]
+            )
+        for pending, revised in zip(pack, revised_chapters):
+            self.write_chapter(book, *pending, revised)
+        return [True] * len(pack)
+
+    def write_chapter(
+        self,
+        book: str,
+        chapter: int,
+        chap_stem: str,
+        stripped: StrippedChapter,
+        content_hash: str,
+        revised: ChapterRevised,
+    ) -> None:
+        """Write a revised chapter with its boilerplate and record it."""
+        revised.revised_chapter = stripped.restore(revised.revised_chapter)
+        output = self.get_chapter_output(book, chapter, chap_stem)
+        output_fp = self.output_fol / output
+        output_fp.parent.mkdir(parents=True, exist_ok=True)
+        tmp_fp = output_fp.with_suffix(".tmp")
+        tmp_fp.write_text(revised.model_dump_json())
+        tmp_fp.replace(output_fp)
+        self.manifest.append(
+            ChapterRecord(
+                book,
+                chapter,
+                chap_stem,
+                "done",
+                output=output.as_posix(),
+                content_hash=content_hash,
+                fingerprint=self.fingerprint,
+            )
+        )
+        self.stats.chapters_done += 1
+
+    def find_reusable_output(self, content_hash: str) -> Path | None:
+        """Find the output of a chapter with the same content, in any run."""
+        for manifest in [self.manifest, *self.previous_manifests]:
+            output_fp = manifest.find_by_hash(content_hash, self.fingerprint)
+            if output_fp is not None:
+                return output_fp
+        return None
+
+    def reuse_chapter(
+        self,
+        book: str,
+        chapter: int,
+        chap_stem: str,
+        content_hash: str,
+        reused_fp: Path,
+    ) -> None:
+        """Copy the output of an unchanged chapter and record it."""
+        output = self.get_chapter_output(book, chapter, chap_stem)
+        output_fp = self.output_fol / output
+        if reused_fp.resolve() != output_fp.resolve():
+            output_fp.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(reused_fp, output_fp)
+        self.manifest.append(
+            ChapterRecord(
+                book,
+                chapter,
+                chap_stem,
+                "done",
+                output=output.as_posix(),
+                content_hash=content_hash,
+                fingerprint=self.fingerprint,
+            )
+        )
+        self.stats.chapters_reused += 1
+
+    async def process_book(self, executor: ProcessPoolExecutor, epub_fp: Path) -> None:
+        """Parse a book in the pool and revise its pending chapters."""
+        book = self.get_book_key(epub_fp)
+        loop = asyncio.get_running_loop()
+        book_hash = await loop.run_in_executor(None, hash_file, epub_fp)
+        if self.manifest.is_book_done(book, book_hash, self.fingerprint):
+            self.stats.books_done += 1
+            return
+        try:
+            chapters = await loop.run_in_executor(
+                executor, parse_book, epub_fp, self.parser_cls, self.book_cache
+            )
+        except Exception as e:
+            lg.warning(f"Failed to parse {book}: {e!r}")
+            return
+        texts = [text for _, text, _ in chapters]
+        if self.strip_boilerplate:
+            boilerplate = BoilerplateFilter.from_texts(texts)
+        else:
+            boilerplate = BoilerplateFilter()
+        stripped_chapters, report = boilerplate.strip_book(texts)
+        if report.paragraphs_removed > 0:
+            tokens_saved = sum(estimate_tokens(text) for text in texts) - sum(
+                estimate_tokens(sc.text) for sc in stripped_chapters
+            )
+            lg.info(f"{book}: {report}, about {tokens_saved} tokens")
+            METRICS.incr("boilerplate.paragraphs_removed", report.paragraphs_removed)
+            METRICS.incr("boilerplate.tokens_saved", tokens_saved)
+        pending: list[PendingChapter] = []
+        for chapter, (chap_stem, _, content_hash) in enumerate(chapters):
+            if self.manifest.is_done(book, chapter, content_hash, self.fingerprint):
+                self.stats.chapters_skipped += 1
+                continue
+            reused_fp = self.find_reusable_output(content_hash)
+            if reused_fp is not None:
+                self.reuse_chapter(book, chapter, chap_stem, content_hash, reused_fp)
+                continue
+            stripped = stripped_chapters[chapter]
+            pending.append((chapter, chap_stem, stripped, content_hash))
+        packs_ok = await asyncio.gather(
+            *[self.revise_pack(book, pack) for pack in self.plan_packs(pending)]
+        )
+        if all(ok for pack_ok in packs_ok for ok in pack_ok):
+            self.manifest.mark_book_done(book, book_hash, self.fingerprint)
+        self.stats.books_done += 1
+
+    def plan_packs(self, pending: list[PendingChapter]) -> list[list[PendingChapter]]:
+        """Group the chapters to revise in packs, alone without max_pack_tokens.
+
+        The chapters left empty by the boilerplate removal are never packed.
+        """
+        max_pack_tokens = self.reviser.max_pack_tokens
+        if max_pack_tokens is None:
+            return [[p] for p in pending]
+        empty = [p for p in pending if p[2].text.strip() == ""]
+        packable = [p for p in pending if p[2].text.strip() != ""]
+        texts = [stripped.text for _, _, stripped, _ in packable]
+        packs = plan_packs(texts, max_pack_tokens, self.reviser.count_tokens)
+        return [[p] for p in empty] + [[packable[i] for i in p.indexes] for p in packs]
+
+    async def report_progress(self) -> None:
+        """Log the throughput periodically."""
+        while True:
+            await asyncio.sleep(self.report_every_s)
+            lg.info(f"Batch progress: {self.stats}")
+
+    async def arun(self) -> BatchStats:
+        """Run the batch."""
+        books = self.find_books()
+        self.stats = BatchStats(books_total=len(books))
+        lg.info(f"Revising {len(books)} books from {self.input_fol}")
+        reporter = asyncio.create_task(self.report_progress())
+        books_in_flight = asyncio.Semaphore(self.max_books_in_flight)
+
+        async def process_book_bounded(epub_fp: Path) -> None:
+            async with books_in_flight:
+                await self.process_book(executor, epub_fp)
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+                await asyncio.gather(*[process_book_bounded(b) for b in books])
+        finally:
+            reporter.cancel()
+        lg.info(f"Batch done: {self.stats}")
+        return self.stats
+
+    def run(self) -> BatchStats:
+        """Run the batch, from sync code."""
+        return asyncio.run(self.arun())
@@ -0,0 +1,3 @@
+from epub_summary.benchmark.suite import main
+
+main()
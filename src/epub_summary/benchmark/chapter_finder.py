@@ -0,0 +1,40 @@
+"""Benchmark the scaling of find_chapter_files with the number of entries.
+
+Run with `python -m epub_summary.benchmark.chapter_finder`.
+"""
+
+import argparse
+from pathlib import Path
+import random
+
+from epub_summary.benchmark.measure import measure
+from epub_summary.epubber.utils import find_chapter_files
+
+
+def make_zipped_file_paths(num_entries: int, seed: int = 0) -> list[Path]:
+    """Make shuffled archive paths with chapters, images and extra pages."""
+    rng = random.Random(seed)
+    fps = [Path(f"OEBPS/text/chapter{i:05d}.xhtml") for i in range(num_entries)]
+    fps += [Path(f"OEBPS/images/page_{i}.jpg") for i in range(num_entries // 4)]
+    fps += [Path("OEBPS/text/cover.xhtml"), Path("OEBPS/text/toc.xhtml")]
+    rng.shuffle(fps)
+    return fps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for num_entries in args.sizes:
+        fps = make_zipped_file_paths(num_entries)
+        m = measure(
+            f"{num_entries:>6} entries", lambda: find_chapter_files(fps), args.repeat
+        )
+        per_entry_us = m.seconds / num_entries * 1e6
+        print(f"{m} ({per_entry_us:.2f} us/entry)")
+
+
+if __name__ == "__main__":
+    main()
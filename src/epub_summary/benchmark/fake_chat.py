@@ -0,0 +1,169 @@
+"""Offline fake chat model, standing in for ChatOpenAI in the benchmarks.
+
+It supports structured output through tool calls, like ChatOpenAI does, so
+that the reviser pipeline can run end to end without network access.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+import json
+import random
+import time
+from typing import Any, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from epub_summary.summarizer.packing import split_packed_chapters
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that shortens the prompt after a configurable delay."""
+
+    latency_s: float = 0.0
+    """Mean delay of every call."""
+    latency_jitter_s: float = 0.0
+    """Uniform jitter added to the delay."""
+    keep_every: int = 2
+    """Keep one word every keep_every words of the prompt."""
+    seed: int = 0
+    stream_chunk_chars: int = 16
+    """Characters of the reply in each streamed chunk."""
+    stream_chunk_delay_s: float = 0.0
+    """Delay between streamed chunks."""
+    num_calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(
+        self,
+        tools: Sequence[Any],
+        **kwargs: Any,
+    ) -> Runnable[Any, BaseMessage]:
+        """Bind the tools, the structured output schema among them."""
+        formatted_tools = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tools=formatted_tools, **kwargs)
+
+    def get_delay(self) -> float:
+        """Get the delay of the next call."""
+        rng = random.Random(self.seed + self.num_calls)
+        return max(0.0, self.latency_s + rng.uniform(0, self.latency_jitter_s))
+
+    def shorten(self, text: str) -> str:
+        """Keep one word every keep_every words."""
+        return " ".join(text.split(" ")[:: self.keep_every])
+
+    def make_args(self, schema: dict[str, Any], prompt: str) -> dict[str, Any]:
+        """Fill the string fields of a schema with the shortened prompt.
+
+        Array fields get an item per chapter of a packed prompt.
+        """
+        args: dict[str, Any] = {}
+        for name, field_schema in schema.get("properties", {}).items():
+            if field_schema.get("type") == "array":
+                parts = split_packed_chapters(prompt) or [prompt]
+                item_schema = field_schema["items"]
+                args[name] = [self.make_args(item_schema, part) for part in parts]
+            else:
+                args[name] = self.shorten(prompt)
+        return args
+
+    def make_result(self, messages: list[BaseMessage], **kwargs: Any) -> ChatResult:
+        """Shorten the prompt and wrap it in a tool call if tools are bound."""
+        self.num_calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        words = prompt.split(" ")
+        tools = kwargs.get("tools", [])
+        if len(tools) == 0:
+            message = AIMessage(content=self.shorten(prompt))
+        else:
+            function = tools[0]["function"]
+            args = self.make_args(function["parameters"], prompt)
+            tool_call = {"name": function["name"], "args": args, "id": "call_fake"}
+            message = AIMessage(content="", tool_calls=[tool_call])
+        message.usage_metadata = {
+            "input_tokens": len(words),
+            "output_tokens": len(words) // self.keep_every,
+            "total_tokens": len(words) + len(words) // self.keep_every,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.get_delay())
+        return self.make_result(messages, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.get_delay())
+        return self.make_result(messages, **kwargs)
+
+    def make_chunks(self, result: ChatResult) -> list[ChatGenerationChunk]:
+        """Split a result in chunks of the content or of the tool arguments."""
+        message = result.generations[0].message
+        step = self.stream_chunk_chars
+        chunks = []
+        if isinstance(message, AIMessage) and len(message.tool_calls) > 0:
+            tool_call = message.tool_calls[0]
+            args_json = json.dumps(tool_call["args"])
+            for i in range(0, len(args_json), step):
+                first = i == 0
+                tool_call_chunk = {
+                    "name": tool_call["name"] if first else None,
+                    "args": args_json[i : i + step],
+                    "id": tool_call["id"] if first else None,
+                    "index": 0,
+                }
+                msg_chunk = AIMessageChunk(
+                    content="", tool_call_chunks=[tool_call_chunk]
+                )
+                chunks.append(ChatGenerationChunk(message=msg_chunk))
+        else:
+            content = str(message.content)
+            for i in range(0, len(content), step):
+                msg_chunk = AIMessageChunk(content=content[i : i + step])
+                chunks.append(ChatGenerationChunk(message=msg_chunk))
+        return chunks
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.get_delay())
+        for chunk in self.make_chunks(self.make_result(messages, **kwargs)):
+            yield chunk
+            time.sleep(self.stream_chunk_delay_s)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.get_delay())
+        for chunk in self.make_chunks(self.make_result(messages, **kwargs)):
+            yield chunk
+            await asyncio.sleep(self.stream_chunk_delay_s)
@@ -0,0 +1,362 @@
+"""Local fake of the OpenAI chat completions API.
+
+It answers like the FakeChatModel, shortening the prompt, but over HTTP,
+so that the real ChatOpenAI client, its connection pool and the retries
+can be tested and load tested without network access.
+The time to the first token is drawn from a latency distribution, and the
+answer is generated at a fixed rate of tokens per second, streamed as
+server-sent events if the client asks for it.
+Overload is simulated with a cap on the requests in flight, over which
+the server answers 429 with a Retry-After header, and errors and rate
+limits can also be injected at random.
+"""
+
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Literal, Self
+
+from epub_summary.benchmark.fake_chat import FakeChatModel
+from epub_summary.summarizer.tokens import estimate_tokens
+
+COMPLETIONS_PATH = "/v1/chat/completions"
+
+# characters of the answer in a streamed chunk, about one token each
+CHARS_PER_TOKEN = 4
+
+LatencyKind = Literal["constant", "uniform", "exponential", "lognormal"]
+
+
+@dataclass
+class LatencyDistribution:
+    """Distribution of the time to the first token."""
+
+    kind: LatencyKind = "constant"
+    median_s: float = 0.0
+    spread: float = 0.0
+    """Half width in seconds for uniform, sigma of the log for lognormal."""
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw a latency in seconds."""
+        if self.kind == "uniform":
+            delay = rng.uniform(
+                self.median_s - self.spread, self.median_s + self.spread
+            )
+        elif self.kind == "exponential":
+            # the median of an exponential is its mean times ln 2
+            delay = rng.expovariate(math.log(2) / self.median_s) if self.median_s else 0
+        elif self.kind == "lognormal":
+            delay = self.median_s * math.exp(rng.gauss(0, self.spread))
+        else:
+            delay = self.median_s
+        return max(0.0, delay)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Handle the requests of the fake server."""
+
+    server: "FakeOpenAIHttpServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep the test output clean."""
+
+    def send_json(
+        self,
+        status: int,
+        data: dict[str, Any],
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        """Send a JSON response."""
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(
+        self,
+        status: int,
+        message: str,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        """Send an error in the format of the API."""
+        error = {"message": message, "type": "fake_error", "code": status}
+        self.send_json(status, {"error": error}, headers)
+
+    def send_events(self, events: list[dict[str, Any]], delay_s: float) -> None:
+        """Stream the events, in a chunked response, delay_s apart."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        lines = [f"data: {json.dumps(event)}\n\n" for event in events]
+        lines.append("data: [DONE]\n\n")
+        for i, line in enumerate(lines):
+            if i > 0:
+                time.sleep(delay_s)
+            data = line.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            self.send_error_json(404, f"No route {self.path}.")
+            return
+        fake = self.server.fake
+        if not fake.enter():
+            retry_after = {"Retry-After": str(fake.retry_after_s)}
+            self.send_error_json(429, "Too many requests.", retry_after)
+            return
+        try:
+            time.sleep(fake.get_delay())
+            if fake.should_fail():
+                self.send_error_json(500, "Injected failure.")
+                return
+            completion = fake.make_completion(request)
+            if request.get("stream"):
+                events = fake.make_chunks(completion, request)
+                self.send_events(events, fake.get_chunk_delay())
+            else:
+                time.sleep(fake.get_generation_delay(completion))
+                self.send_json(200, completion)
+        finally:
+            fake.exit()
+
+
+class FakeOpenAIHttpServer(ThreadingHTTPServer):
+    """HTTP server holding the fake."""
+
+    daemon_threads = True
+
+    def __init__(self, fake: "FakeOpenAIServer") -> None:
+        super().__init__((fake.host, fake.port), FakeOpenAIHandler)
+        self.fake = fake
+
+
+class FakeOpenAIServer:
+    """OpenAI compatible server answering with shortened prompts.
+
+    Use it as a context manager, and point the client at base_url.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyDistribution | None = None,
+        tokens_per_s: float | None = None,
+        stream_chunk_tokens: int = 4,
+        max_in_flight: int | None = None,
+        retry_after_s: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        failure_rate: float = 0.0,
+        keep_every: int = 2,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """Initialize the server, port 0 picks a free port.
+
+        Without tokens_per_s the answer comes at once after the latency.
+        """
+        self.latency = latency or LatencyDistribution()
+        self.tokens_per_s = tokens_per_s
+        self.stream_chunk_tokens = stream_chunk_tokens
+        self.max_in_flight = max_in_flight
+        self.retry_after_s = retry_after_s
+        self.rate_limit_rate = rate_limit_rate
+        self.failure_rate = failure_rate
+        self.host = host
+        self.port = port
+        self.model = FakeChatModel(keep_every=keep_every)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.num_requests = 0
+        self.num_rate_limited = 0
+        self.num_failed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.http_server: FakeOpenAIHttpServer | None = None
+        self.thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        """Get the base url to give to the client."""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def enter(self) -> bool:
+        """Count a request in, False if it is rate limited."""
+        with self.lock:
+            self.num_requests += 1
+            over_limit = (
+                self.max_in_flight is not None and self.in_flight >= self.max_in_flight
+            )
+            if over_limit or self.rng.random() < self.rate_limit_rate:
+                self.num_rate_limited += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def exit(self) -> None:
+        """Count a request out."""
+        with self.lock:
+            self.in_flight -= 1
+
+    def get_delay(self) -> float:
+        """Draw the time to the first token of the next request."""
+        with self.lock:
+            return self.latency.sample(self.rng)
+
+    def get_chunk_delay(self) -> float:
+        """Get the time to generate a streamed chunk."""
+        if self.tokens_per_s is None:
+            return 0.0
+        return self.stream_chunk_tokens / self.tokens_per_s
+
+    def get_generation_delay(self, completion: dict[str, Any]) -> float:
+        """Get the time to generate a whole answer."""
+        if self.tokens_per_s is None:
+            return 0.0
+        return completion["usage"]["completion_tokens"] / self.tokens_per_s
+
+    def should_fail(self) -> bool:
+        """Draw whether the next request fails."""
+        with self.lock:
+            failed = self.rng.random() < self.failure_rate
+            self.num_failed += failed
+        return failed
+
+    def make_message(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Answer with a tool call if tools are given, or with the content."""
+        prompt = "\n".join(str(m.get("content", "")) for m in request["messages"])
+        tools = request.get("tools") or []
+        response_format = request.get("response_format") or {}
+        if len(tools) > 0:
+            function = tools[0]["function"]
+            args = self.model.make_args(function["parameters"], prompt)
+            tool_call = {
+                "id": f"call_{self.num_requests}",
+                "type": "function",
+                "function": {"name": function["name"], "arguments": json.dumps(args)},
+            }
+            return {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            content = json.dumps(self.model.make_args(schema, prompt))
+            return {"role": "assistant", "content": content}
+        return {"role": "assistant", "content": self.model.shorten(prompt)}
+
+    def make_completion(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Build the chat completion answering a request."""
+        message = self.make_message(request)
+        prompt_tokens = sum(
+            estimate_tokens(str(m.get("content", ""))) for m in request["messages"]
+        )
+        if "tool_calls" in message:
+            finish_reason = "tool_calls"
+            answer = message["tool_calls"][0]["function"]["arguments"]
+        else:
+            finish_reason = "stop"
+            answer = message["content"]
+        completion_tokens = estimate_tokens(answer)
+        return {
+            "id": f"chatcmpl-fake-{self.num_requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [
+                {"index": 0, "message": message, "finish_reason": finish_reason}
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def make_chunks(
+        self,
+        completion: dict[str, Any],
+        request: dict[str, Any],
+    ) -> list[dict[str, Any]]:
+        """Split a completion in the chunks of a streamed answer."""
+        choice = completion["choices"][0]
+        message = choice["message"]
+        step = self.stream_chunk_tokens * CHARS_PER_TOKEN
+        deltas: list[dict[str, Any]] = []
+        if "tool_calls" in message:
+            tool_call = message["tool_calls"][0]
+            arguments = tool_call["function"]["arguments"]
+            first_call = {
+                "index": 0,
+                "id": tool_call["id"],
+                "type": "function",
+                "function": {"name": tool_call["function"]["name"], "arguments": ""},
+            }
+            deltas.append({"role": "assistant", "content": None})
+            deltas[0]["tool_calls"] = [first_call]
+            for i in range(0, len(arguments), step):
+                call = {"index": 0, "function": {"arguments": arguments[i : i + step]}}
+                deltas.append({"tool_calls": [call]})
+        else:
+            content = message["content"]
+            deltas.append({"role": "assistant", "content": ""})
+            for i in range(0, len(content), step):
+                deltas.append({"content": content[i : i + step]})
+
+        def make_chunk(delta: dict[str, Any], finish_reason: str | None = None):
+            return {
+                "id": completion["id"],
+                "object": "chat.completion.chunk",
+                "created": completion["created"],
+                "model": completion["model"],
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+
+        chunks = [make_chunk(delta) for delta in deltas]
+        chunks.append(make_chunk({}, choice["finish_reason"]))
+        stream_options = request.get("stream_options") or {}
+        if stream_options.get("include_usage"):
+            usage_chunk = make_chunk({})
+            usage_chunk["choices"] = []
+            usage_chunk["usage"] = completion["usage"]
+            chunks.append(usage_chunk)
+        return chunks
+
+    def start(self) -> None:
+        """Serve in a background thread."""
+        self.http_server = FakeOpenAIHttpServer(self)
+        self.port = self.http_server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.http_server.serve_forever, daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+            self.http_server = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,213 @@
+"""Load test of the revision pipeline against the local fake server.
+
+Run with `python -m epub_summary.benchmark.load_test`: synthetic books are
+revised concurrently by a ChapterReviser talking HTTP to the fake server,
+and the chapter latency percentiles and the throughput are reported.
+"""
+
+import argparse
+import asyncio
+from dataclasses import asdict, dataclass, field
+import json
+from pathlib import Path
+import random
+import time
+from typing import Any, get_args
+
+from epub_summary.benchmark.fake_server import (
+    FakeOpenAIServer,
+    LatencyDistribution,
+    LatencyKind,
+)
+from epub_summary.benchmark.synthetic import make_paragraph
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.metrics.registry import METRICS
+from epub_summary.summarizer.reviser import ChapterReviser
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Get the q-th percentile of the values, by nearest rank."""
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+@dataclass
+class LoadTestConfig:
+    """Shape of the load."""
+
+    num_books: int = 4
+    chapters_per_book: int = 20
+    paragraphs_per_chapter: int = 10
+    stream: bool = False
+    """Stream the revisions, and measure the time to the first token."""
+    seed: int = 0
+
+    def make_book(self, book: int) -> list[str]:
+        """Make the chapter texts of a book."""
+        rng = random.Random(self.seed * 1000 + book)
+        return [
+            "\n".join(make_paragraph(rng) for _ in range(self.paragraphs_per_chapter))
+            for _ in range(self.chapters_per_book)
+        ]
+
+
+@dataclass
+class LoadTestReport:
+    """Latencies and throughput of a load test."""
+
+    num_chapters: int = 0
+    num_failed: int = 0
+    seconds: float = 0.0
+    latencies_s: list[float] = field(default_factory=list)
+    first_token_s: list[float] = field(default_factory=list)
+    num_requests: int = 0
+    """Requests seen by the server, retries included."""
+    num_rate_limited: int = 0
+    peak_in_flight: int = 0
+
+    @property
+    def chapters_per_minute(self) -> float:
+        """Get the throughput of revised chapters."""
+        if self.seconds == 0:
+            return 0.0
+        return (self.num_chapters - self.num_failed) * 60 / self.seconds
+
+    def get_percentiles(self, values: list[float]) -> dict[str, float]:
+        """Get the p50, p95 and p99 of some values."""
+        return {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the report to a dict, with the percentiles."""
+        data = asdict(self)
+        data["latency"] = self.get_percentiles(data.pop("latencies_s"))
+        data["first_token"] = self.get_percentiles(data.pop("first_token_s"))
+        data["chapters_per_minute"] = self.chapters_per_minute
+        return data
+
+    def __str__(self) -> str:
+        latency = self.get_percentiles(self.latencies_s)
+        s = f"{self.num_chapters} chapters in {self.seconds:.2f} s"
+        s += f", {self.chapters_per_minute:.0f} chapters/min"
+        s += f", {self.num_failed} failed\n"
+        s += "latency " + ", ".join(f"{k} {v:.3f} s" for k, v in latency.items())
+        if len(self.first_token_s) > 0:
+            first_token = self.get_percentiles(self.first_token_s)
+            s += "\nfirst token "
+            s += ", ".join(f"{k} {v:.3f} s" for k, v in first_token.items())
+        s += f"\nserver: {self.num_requests} requests"
+        s += f", {self.num_rate_limited} rate limited"
+        s += f", peak {self.peak_in_flight} in flight"
+        return s
+
+
+async def arun_load(reviser: ChapterReviser, config: LoadTestConfig) -> LoadTestReport:
+    """Revise all the books concurrently, timing each chapter."""
+    report = LoadTestReport()
+
+    async def revise_timed(text: str) -> None:
+        t_start = time.perf_counter()
+        first_token: list[float] = []
+
+        def on_text(_: str) -> None:
+            if len(first_token) == 0:
+                first_token.append(time.perf_counter() - t_start)
+
+        try:
+            if config.stream:
+                await reviser.arevise_streaming(text, on_text)
+            else:
+                await reviser.arevise_chapter(text)
+        except Exception:
+            report.num_failed += 1
+            return
+        report.latencies_s.append(time.perf_counter() - t_start)
+        report.first_token_s.extend(first_token)
+
+    books = [config.make_book(book) for book in range(config.num_books)]
+    report.num_chapters = sum(len(texts) for texts in books)
+    t_start = time.perf_counter()
+    await asyncio.gather(*[revise_timed(text) for texts in books for text in texts])
+    report.seconds = time.perf_counter() - t_start
+    return report
+
+
+def run_load_test(
+    server: FakeOpenAIServer,
+    config: LoadTestConfig,
+    chat_openai_config: ChatOpenAIConfig | None = None,
+    max_concurrency: int = 64,
+) -> LoadTestReport:
+    """Run a load test against a started fake server."""
+    if chat_openai_config is None:
+        chat_openai_config = ChatOpenAIConfig(api_key="fake", base_url=server.base_url)
+    reviser = ChapterReviser(chat_openai_config, max_concurrency=max_concurrency)
+    num_requests = server.num_requests
+    num_rate_limited = server.num_rate_limited
+    report = asyncio.run(arun_load(reviser, config))
+    report.num_requests = server.num_requests - num_requests
+    report.num_rate_limited = server.num_rate_limited - num_rate_limited
+    report.peak_in_flight = server.peak_in_flight
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=4)
+    parser.add_argument("--chapters", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=10)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument(
+        "--latency-kind", default="lognormal", choices=get_args(LatencyKind)
+    )
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--tokens-per-s", type=float, default=None)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--hedge-after", type=float, default=None)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        num_books=args.books,
+        chapters_per_book=args.chapters,
+        paragraphs_per_chapter=args.paragraphs,
+        stream=args.stream,
+    )
+    latency = LatencyDistribution(args.latency_kind, args.latency, args.latency_spread)
+    with FakeOpenAIServer(
+        latency,
+        tokens_per_s=args.tokens_per_s,
+        max_in_flight=args.max_in_flight,
+        rate_limit_rate=args.rate_limit_rate,
+        failure_rate=args.failure_rate,
+    ) as server:
+        chat_openai_config = ChatOpenAIConfig(
+            api_key="fake",
+            base_url=server.base_url,
+            initial_concurrency=args.concurrency,
+            hedge_after_s=args.hedge_after,
+        )
+        report = run_load_test(server, config, chat_openai_config)
+    print(report)
+    retries = METRICS.get("llm.retries")
+    print(f"client: {retries.total if retries else 0:.0f} retries")
+
+    if args.output is not None:
+        results = {
+            "config": asdict(config),
+            "latency": asdict(latency),
+            "report": report.to_dict(),
+        }
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Time and memory measurement helpers for the benchmarks."""
+
+from dataclasses import asdict, dataclass
+import time
+import tracemalloc
+from typing import Any, Callable
+
+
+@dataclass
+class Measurement:
+    """Wall time and peak traced memory of a single run."""
+
+    name: str
+    seconds: float
+    peak_bytes: int
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the measurement to a dict."""
+        return asdict(self)
+
+    def __str__(self) -> str:
+        peak_mib = self.peak_bytes / 2**20
+        return f"{self.name}: {self.seconds:.4f} s, peak {peak_mib:.2f} MiB"
+
+
+def measure(name: str, func: Callable[[], Any], repeat: int = 1) -> Measurement:
+    """Run func repeat times, keep the best time and the peak memory."""
+    best_seconds = float("inf")
+    peak_bytes = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        t_start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - t_start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        best_seconds = min(best_seconds, seconds)
+        peak_bytes = max(peak_bytes, peak)
+    return Measurement(name, best_seconds, peak_bytes)
@@ -0,0 +1,41 @@
+"""Benchmark paragraph construction while parsing a large chapter.
+
+Compares the text-first EpubParagraph against eagerly building every p tag,
+which is what the parser used to do for each paragraph.
+
+Run with `python -m epub_summary.benchmark.paragraph`.
+"""
+
+import argparse
+
+from epub_summary.benchmark.measure import measure
+from epub_summary.benchmark.synthetic import make_chapter_html
+from epub_summary.epubber.epub import HtmlChapterParserSingle
+
+
+def parse_lazy(html: str) -> None:
+    """Parse the chapter, building only the paragraph strings."""
+    HtmlChapterParserSingle().parse(html)
+
+
+def parse_eager(html: str) -> None:
+    """Parse the chapter and build the p tag of every paragraph."""
+    secs = HtmlChapterParserSingle().parse(html)
+    for sec in secs:
+        for par in sec.paragraphs:
+            par.p_tag
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paragraphs", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    html = make_chapter_html(args.paragraphs)
+    for name, func in [("eager", parse_eager), ("lazy", parse_lazy)]:
+        print(measure(name, lambda: func(html), repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Benchmark the chapter parser backends on a large chapter.
+
+Run with `python -m epub_summary.benchmark.parser`.
+"""
+
+import argparse
+
+from epub_summary.benchmark.measure import measure
+from epub_summary.benchmark.synthetic import make_chapter_html
+from epub_summary.epubber.epub import (
+    HtmlChapterParserLxml,
+    HtmlChapterParserSections,
+    HtmlChapterParserSingle,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paragraphs", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    html = make_chapter_html(args.paragraphs)
+    for parser_cls in [
+        HtmlChapterParserSingle,
+        HtmlChapterParserLxml,
+        HtmlChapterParserSections,
+    ]:
+        chapter_parser = parser_cls()
+        func = lambda: chapter_parser.parse(html)
+        print(measure(parser_cls.__name__, func, repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
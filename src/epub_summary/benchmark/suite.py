@@ -0,0 +1,169 @@
+"""Per-stage benchmarks of the load and revise pipeline.
+
+Run with `python -m epub_summary.benchmark`, the results are printed and
+optionally written to a json file to compare them across commits.
+"""
+
+import argparse
+from dataclasses import asdict
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import zipfile
+
+from epub_summary.benchmark.chapter_finder import make_zipped_file_paths
+from epub_summary.benchmark.fake_chat import FakeChatModel
+from epub_summary.benchmark.measure import Measurement, measure
+from epub_summary.benchmark.synthetic import SyntheticEpubConfig, write_synthetic_epub
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.epubber.book_cache import ParsedBookCache
+from epub_summary.epubber.epub import (
+    Epub,
+    HtmlChapterParserLxml,
+    HtmlChapterParserSingle,
+)
+from epub_summary.epubber.epub_writer import EpubWriter
+from epub_summary.epubber.utils import find_chapter_files
+from epub_summary.summarizer.book_summary import BookSummarizer
+from epub_summary.summarizer.reviser import ChapterReviser
+
+
+def get_git_commit() -> str | None:
+    """Get the current git commit, if any."""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_suite(
+    config: SyntheticEpubConfig,
+    work_fol: Path,
+    repeat: int = 3,
+    llm_latency_s: float = 0.05,
+) -> list[Measurement]:
+    """Run all the stage benchmarks on a synthetic epub."""
+    epub_fp = write_synthetic_epub(work_fol / "book.epub", config)
+    results: list[Measurement] = []
+
+    def bench(name, func) -> None:
+        m = measure(name, func, repeat)
+        print(m)
+        results.append(m)
+
+    fps = make_zipped_file_paths(config.num_chapters)
+    bench("find_chapter_files", lambda: find_chapter_files(fps))
+    with zipfile.ZipFile(epub_fp) as zf:
+        bench("zip_read", lambda: [zf.read(n) for n in zf.namelist()])
+    bench("from_zip_bs4", lambda: Epub.from_zip(epub_fp))
+    bench(
+        "from_zip_lxml",
+        lambda: Epub.from_zip(epub_fp, parser_cls=HtmlChapterParserLxml),
+    )
+    bench("from_zip_workers", lambda: Epub.from_zip(epub_fp, workers=4))
+
+    def open_first() -> None:
+        with Epub.open(epub_fp) as ep:
+            ep.chapters[0].text
+
+    bench("open_first_chapter", open_first)
+
+    cache = ParsedBookCache(work_fol / "parsed_books")
+    Epub.from_zip(epub_fp, cache=cache)
+    bench("from_zip_warm_cache", lambda: Epub.from_zip(epub_fp, cache=cache))
+
+    ep = Epub.from_zip(epub_fp, parser_cls=HtmlChapterParserSingle)
+    bench("chapter_text", lambda: [ch.text for ch in ep.chapters])
+
+    def write_recompressed() -> None:
+        out_fp = work_fol / "recompressed.epub"
+        with zipfile.ZipFile(epub_fp) as src, zipfile.ZipFile(out_fp, "w") as out:
+            for info in src.infolist():
+                out.writestr(info, src.read(info))
+
+    def write_streaming() -> None:
+        with EpubWriter(epub_fp, work_fol / "revised.epub") as writer:
+            for i, chapter in enumerate(ep.chapters):
+                writer.write_chapter_text(i, chapter.text)
+
+    def write_one_chapter() -> None:
+        with EpubWriter(epub_fp, work_fol / "revised.epub") as writer:
+            writer.write_chapter_text(0, ep.chapters[0].text)
+
+    bench("write_recompressed", write_recompressed)
+    bench("write_all_chapters", write_streaming)
+    bench("write_one_chapter", write_one_chapter)
+
+    fake_model = FakeChatModel(latency_s=llm_latency_s)
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake"), chat_model=fake_model)
+    bench("revise_first_chapter", lambda: cr.invoke(ep.chapters[0].text))
+    bench("revise_book", lambda: cr.revise_many(list(ep.chapters)))
+
+    # front matter and interludes: many chapters of a few paragraphs
+    short_texts = ["\n".join(ch.text.split("\n")[:3]) for ch in ep.chapters]
+    cr_packed = ChapterReviser(
+        ChatOpenAIConfig(api_key="fake"), chat_model=fake_model, max_pack_tokens=3000
+    )
+    bench("revise_short_chapters", lambda: cr.revise_many(short_texts))
+    bench("revise_short_packed", lambda: cr_packed.revise_many(short_texts))
+
+    texts = [ch.text for ch in ep.chapters]
+    bench("summarize_book", lambda: BookSummarizer(cr).summarize(texts))
+    warm_summarizer = BookSummarizer(cr)
+    warm_summarizer.summarize(texts)
+
+    def summarize_one_changed() -> None:
+        texts[0] += " The end."
+        warm_summarizer.summarize(texts)
+
+    bench("summarize_one_changed", summarize_one_changed)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chapters", type=int, default=40)
+    parser.add_argument("--paragraphs", type=int, default=100)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--naming", default="chapter")
+    parser.add_argument("--images", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    config = SyntheticEpubConfig(
+        num_chapters=args.chapters,
+        paragraphs_per_chapter=args.paragraphs,
+        markup_noise=args.noise,
+        naming=args.naming,
+        num_images=args.images,
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_suite(config, Path(work_dir), args.repeat, args.llm_latency)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "config": asdict(config),
+        "results": [m.to_dict() for m in results],
+    }
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Deterministic synthetic book content for the benchmarks."""
+
+from dataclasses import dataclass
+from pathlib import Path
+import random
+from typing import Literal
+import zipfile
+
+WORDS = (
+    "the a of and to in was he she it that his her with as had for on at by "
+    "room door night letter window said looked yellow house garden inspector "
+    "mystery silent quickly never again before after under across through"
+).split()
+
+NamingScheme = Literal["chapter", "padded", "split", "opaque"]
+
+
+def make_paragraph(
+    rng: random.Random,
+    min_words: int = 20,
+    max_words: int = 80,
+) -> str:
+    """Make the text of a single paragraph."""
+    num_words = rng.randint(min_words, max_words)
+    words = [rng.choice(WORDS) for _ in range(num_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def make_chapter_html(num_paragraphs: int, seed: int = 0) -> str:
+    """Make the xhtml of a chapter with num_paragraphs paragraphs."""
+    rng = random.Random(seed)
+    pars_html = [f"<p>{make_paragraph(rng)}</p>" for _ in range(num_paragraphs)]
+    pars_html_one = "\n".join(pars_html)
+    return (
+        f"<html><head><title>Chapter</title></head><body>{pars_html_one}</body></html>"
+    )
+
+
+def add_markup_noise(rng: random.Random, paragraph: str, noise: float) -> str:
+    """Wrap some words of a paragraph in inline markup."""
+    words = paragraph.split(" ")
+    for i, word in enumerate(words):
+        if rng.random() >= noise:
+            continue
+        kind = rng.randrange(4)
+        if kind == 0:
+            words[i] = f"<i>{word}</i>"
+        elif kind == 1:
+            words[i] = f'<span class="c{rng.randrange(9)}">{word}</span>'
+        elif kind == 2:
+            words[i] = f"{word}<!-- note -->"
+        else:
+            words[i] = f"{word}&#160;&amp;"
+    return " ".join(words)
+
+
+@dataclass
+class SyntheticEpubConfig:
+    """Shape of a synthetic epub."""
+
+    num_chapters: int = 20
+    paragraphs_per_chapter: int = 100
+    markup_noise: float = 0.0
+    """Fraction of the words wrapped in inline markup."""
+    naming: NamingScheme = "chapter"
+    """File naming scheme of the chapters."""
+    with_opf: bool = True
+    """Write the container and the OPF with the spine."""
+    num_images: int = 0
+    image_bytes: int = 20_000
+    seed: int = 0
+
+    def chapter_name(self, index: int) -> str:
+        """Get the file name of a chapter."""
+        if self.naming == "padded":
+            return f"ch{index + 1:04d}.xhtml"
+        if self.naming == "split":
+            return f"index_split_{index:03d}.html"
+        if self.naming == "opaque":
+            return f"{random.Random(self.seed + index).getrandbits(48):012x}.xhtml"
+        return f"chapter{index + 1}.xhtml"
+
+
+def make_opf(chapter_names: list[str], image_names: list[str]) -> str:
+    """Make the OPF package file with the manifest and the spine."""
+    items = [
+        f'<item id="c{i}" href="text/{n}" media-type="application/xhtml+xml"/>'
+        for i, n in enumerate(chapter_names)
+    ]
+    items += [
+        f'<item id="i{i}" href="images/{n}" media-type="image/jpeg"/>'
+        for i, n in enumerate(image_names)
+    ]
+    itemrefs = [f'<itemref idref="c{i}"/>' for i in range(len(chapter_names))]
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0">'
+        f"<manifest>{''.join(items)}</manifest>"
+        f"<spine>{''.join(itemrefs)}</spine>"
+        "</package>"
+    )
+
+
+CONTAINER_XML = (
+    '<?xml version="1.0"?>\n'
+    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+    '<rootfiles><rootfile full-path="OEBPS/content.opf"'
+    ' media-type="application/oebps-package+xml"/></rootfiles></container>'
+)
+
+
+def write_synthetic_epub(epub_fp: Path, config: SyntheticEpubConfig) -> Path:
+    """Write a deterministic synthetic epub."""
+    rng = random.Random(config.seed)
+    chapter_names = [config.chapter_name(i) for i in range(config.num_chapters)]
+    image_names = [f"img{i}.jpg" for i in range(config.num_images)]
+    with zipfile.ZipFile(epub_fp, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("mimetype", "application/epub+zip", zipfile.ZIP_STORED)
+        if config.with_opf:
+            zf.writestr("META-INF/container.xml", CONTAINER_XML)
+            zf.writestr("OEBPS/content.opf", make_opf(chapter_names, image_names))
+        for chapter_name in chapter_names:
+            pars = [
+                add_markup_noise(rng, make_paragraph(rng), config.markup_noise)
+                for _ in range(config.paragraphs_per_chapter)
+            ]
+            body = "\n".join(f"<p>{p}</p>" for p in pars)
+            html = (
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                '<html xmlns="http://www.w3.org/1999/xhtml">'
+                f"<head><title>{chapter_name}</title></head><body>{body}</body></html>"
+            )
+            zf.writestr(f"OEBPS/text/{chapter_name}", html)
+        for image_name in image_names:
+            zf.writestr(f"OEBPS/images/{image_name}", rng.randbytes(config.image_bytes))
+    return epub_fp
@@ -1,20 +1,51 @@
 """Chat OpenAI configuration.
 
 These are the default configuration settings for the OpenAI chat model.
+The default `CHAT_OPENAI_CONFIG` is built on first access.
 """
 
-from langchain_core.utils.utils import secret_from_env
+import os
+from typing import Any
+
 from pydantic import BaseModel, Field, SecretStr
 
 
+def api_key_from_env() -> SecretStr | None:
+    """Read the OpenAI API key from the environment, if set."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    return SecretStr(api_key) if api_key is not None else None
+
+
 class ChatOpenAIConfig(BaseModel):
     model: str = Field(default="gpt-4o-mini")
     """Model name to use."""
     temperature: float = 0.2
     """What sampling temperature to use."""
-    api_key: SecretStr | None = Field(
-        default_factory=secret_from_env("OPENAI_API_KEY", default=None)
-    )
+    api_key: SecretStr | None = Field(default_factory=api_key_from_env)
+    base_url: str | None = None
+    """Base URL of an OpenAI compatible API, None for the OpenAI one."""
+    timeout_s: float | None = 120.0
+    """Timeout of a single request."""
+    stream_timeout_s: float | None = 60.0
+    """Timeout of a streamed request waiting for its next chunk, the first one
+    included: a stream still receiving text is not cut however long it is."""
+    max_retries: int = 4
+    """Retries of a request failing with a rate limit or a transient error."""
+    retry_base_delay_s: float = 0.5
+    """Base of the exponential backoff, the delays are jittered."""
+    retry_max_delay_s: float = 30.0
+    """Maximum delay between two retries."""
+    max_connections: int = 64
+    """Size of the HTTP connection pool shared by all the revisers."""
+    initial_concurrency: int = 8
+    """Requests in flight allowed at first, adapted to the rate limits."""
+    min_concurrency: int = 1
+    """Lowest concurrency the rate limit errors can push it down to."""
+    max_concurrency: int = 64
+    """Highest concurrency the successes can push it up to."""
+    hedge_after_s: float | None = None
+    """Send a second copy of a request still running after this long, if there
+    is spare concurrency, None to disable. The slower copy is cancelled."""
 
 
 # from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
@@ -116,4 +147,10 @@ class ChatOpenAIConfig(BaseModel):
 #     model_config = ConfigDict(populate_by_name=True)
 
 
-CHAT_OPENAI_CONFIG = ChatOpenAIConfig()
+def __getattr__(name: str) -> Any:
+    """Build the default config on first access."""
+    if name == "CHAT_OPENAI_CONFIG":
+        global CHAT_OPENAI_CONFIG
+        CHAT_OPENAI_CONFIG = ChatOpenAIConfig()
+        return CHAT_OPENAI_CONFIG
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,10 @@
-"""EpubSummary project configuration."""
+"""EpubSummary project configuration.
+
+The config singleton is built on first use, not on import:
+`EPUB_SUMMARY_CONFIG` and `EPUB_SUMMARY_PATHS` are resolved lazily.
+"""
+
+from typing import Any
 
 from loguru import logger as lg
 
@@ -22,5 +28,20 @@ class EpubSummaryConfig(metaclass=Singleton):
         return str(self)
 
 
-EPUB_SUMMARY_CONFIG = EpubSummaryConfig()
-EPUB_SUMMARY_PATHS = EPUB_SUMMARY_CONFIG.paths
+def get_epub_summary_config() -> EpubSummaryConfig:
+    """Get the project configuration, loading it on first use."""
+    return EpubSummaryConfig()
+
+
+def get_epub_summary_paths() -> EpubSummaryPaths:
+    """Get the project paths, loading the configuration on first use."""
+    return get_epub_summary_config().paths
+
+
+def __getattr__(name: str) -> Any:
+    """Build the module level singletons on first access."""
+    if name == "EPUB_SUMMARY_CONFIG":
+        return get_epub_summary_config()
+    if name == "EPUB_SUMMARY_PATHS":
+        return get_epub_summary_paths()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,152 @@
+"""Paragraphs repeated at the start and end of the chapters of a book.
+
+Running headers, footers, copyright lines and `Chapter N` captions are
+often kept as paragraphs in every chapter file. They are found by counting,
+over the whole book, the chapters whose first or last few paragraphs
+include each paragraph, with the numbers masked so that `Chapter 3` and
+`Chapter 4` count as the same line.
+Only the leading and trailing runs of boilerplate of a chapter are
+stripped before revision, a paragraph in the middle is always part of the
+story. They are put back around the revised text.
+"""
+
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+import re
+from typing import Self
+
+from epub_summary.epubber.utils import hash_str
+
+DIGITS_RE = re.compile(r"\d+")
+
+
+def get_boilerplate_key(line: str) -> str | None:
+    """Get the hash of a paragraph with the numbers masked, None if empty."""
+    norm = " ".join(DIGITS_RE.sub("#", line).lower().split())
+    if norm == "":
+        return None
+    return hash_str(norm)
+
+
+@dataclass
+class StrippedChapter:
+    """The text of a chapter without its boilerplate, and how to restore it."""
+
+    text: str
+    header: list[str] = field(default_factory=list)
+    """The paragraphs removed from the start of the chapter."""
+    footer: list[str] = field(default_factory=list)
+    """The paragraphs removed from the end of the chapter."""
+
+    @property
+    def num_removed(self) -> int:
+        """Get the number of paragraphs removed."""
+        return len(self.header) + len(self.footer)
+
+    def restore(self, revised_text: str) -> str:
+        """Put the removed paragraphs back around the revised text."""
+        if self.num_removed == 0:
+            return revised_text
+        lines = revised_text.split("\n") if revised_text != "" else []
+        return "\n".join(self.header + lines + self.footer)
+
+
+@dataclass
+class BoilerplateReport:
+    """Savings of the boilerplate removal on a book."""
+
+    paragraphs_removed: int = 0
+    chars_before: int = 0
+    chars_removed: int = 0
+
+    def add(self, original_text: str, stripped: StrippedChapter) -> None:
+        """Add the savings on a chapter."""
+        self.paragraphs_removed += stripped.num_removed
+        self.chars_before += len(original_text)
+        self.chars_removed += len(original_text) - len(stripped.text)
+
+    def __str__(self) -> str:
+        s = f"{self.paragraphs_removed} boilerplate paragraphs removed"
+        s += f", {self.chars_removed} of {self.chars_before} characters saved"
+        return s
+
+
+@dataclass
+class BoilerplateFilter:
+    """Find and strip the paragraphs repeated at the edges of the chapters."""
+
+    min_chapters: int = 3
+    """A paragraph must appear in at least this many chapters."""
+    min_fraction: float = 0.5
+    """And in at least this fraction of the chapters."""
+    max_chars: int = 200
+    """Longer paragraphs are never boilerplate."""
+    edge_paragraphs: int = 3
+    """Paragraphs counted at the start and at the end of each chapter."""
+    keys: set[str] = field(default_factory=set)
+
+    def get_key(self, line: str) -> str | None:
+        """Get the key of a paragraph, None if it cannot be boilerplate."""
+        if len(line) > self.max_chars:
+            return None
+        return get_boilerplate_key(line)
+
+    def fit(self, texts: Sequence[str]) -> None:
+        """Count the chapters each short paragraph is at the edges of."""
+        counts: Counter[str] = Counter()
+        for text in texts:
+            lines = [line for line in text.split("\n") if line.strip() != ""]
+            edges = lines[: self.edge_paragraphs] + lines[-self.edge_paragraphs :]
+            # count each paragraph once per chapter
+            chapter_keys = {self.get_key(line) for line in edges}
+            chapter_keys.discard(None)
+            counts.update(chapter_keys)
+        min_count = max(self.min_chapters, self.min_fraction * len(texts))
+        self.keys = {key for key, count in counts.items() if count >= min_count}
+
+    def is_boilerplate(self, line: str) -> bool:
+        """Check if a paragraph is boilerplate, when at the edge of a chapter."""
+        return self.get_key(line) in self.keys
+
+    def get_run_length(self, lines: Sequence[str]) -> int:
+        """Get the length of the leading run of boilerplate and empty lines.
+
+        The run ends with its last boilerplate paragraph.
+        """
+        run_length = 0
+        for i, line in enumerate(lines):
+            if self.is_boilerplate(line):
+                run_length = i + 1
+            elif line.strip() != "":
+                break
+        return run_length
+
+    def strip(self, text: str) -> StrippedChapter:
+        """Remove the boilerplate paragraphs at the start and end of a chapter."""
+        if len(self.keys) == 0:
+            return StrippedChapter(text)
+        lines = text.split("\n")
+        start = self.get_run_length(lines)
+        end = len(lines) - self.get_run_length(lines[start:][::-1])
+        return StrippedChapter("\n".join(lines[start:end]), lines[:start], lines[end:])
+
+    def strip_book(
+        self,
+        texts: Sequence[str],
+    ) -> tuple[list[StrippedChapter], BoilerplateReport]:
+        """Strip all the chapters of a book and report the savings."""
+        report = BoilerplateReport()
+        stripped_chapters = []
+        for text in texts:
+            stripped = self.strip(text)
+            report.add(text, stripped)
+            stripped_chapters.append(stripped)
+        return stripped_chapters, report
+
+    @classmethod
+    def from_texts(cls, texts: Sequence[str], **kwargs) -> Self:
+        """Create a filter fitted on the chapter texts of a book."""
+        boilerplate = cls(**kwargs)
+        boilerplate.fit(texts)
+        return boilerplate
@@ -0,0 +1,228 @@
+"""On-disk cache of parsed books.
+
+Each book is stored in a folder named after the hash of the epub file and
+the parser used, with two files:
+
+* `book.bin`, the utf-8 text of all the paragraphs, one per line, with the
+  chapter html after the paragraphs of each chapter;
+* `index.json`, the chapter stems, section titles and byte offsets into
+  `book.bin`.
+
+On a hit the text is memory-mapped, and the paragraphs of a section are
+only decoded when the section is first accessed.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import weakref
+
+from loguru import logger as lg
+
+from epub_summary.config.epub_summary_config import get_epub_summary_paths
+from epub_summary.epubber.epub import (
+    BaseHtmlChapterParser,
+    ChildList,
+    Epub,
+    EpubChapter,
+    EpubParagraph,
+    EpubSection,
+)
+
+# bump when the layout of the cached files changes
+BOOK_CACHE_VERSION = 1
+
+
+class MappedEpubSection(EpubSection):
+    """EpubSection with paragraphs decoded lazily from a mapped buffer."""
+
+    def __init__(
+        self,
+        section_title: str,
+        buffer: mmap.mmap | bytes,
+        span: tuple[int, int],
+        par_offsets: list[int],
+    ) -> None:
+        """Initialize mapped epub section."""
+        super().__init__(section_title)
+        self.buffer = buffer
+        self.span = span
+        self.par_offsets = par_offsets
+        self._paragraphs: ChildList[EpubParagraph] | None = None
+
+    @property
+    def paragraphs(self) -> list[EpubParagraph]:
+        """Get the paragraphs, decoding them on first access."""
+        if self._paragraphs is None:
+            self._paragraphs = ChildList(
+                self, [EpubParagraph.from_p_str(p) for p in self.get_p_strs()]
+            )
+        return self._paragraphs
+
+    @paragraphs.setter
+    def paragraphs(self, paragraphs: list[EpubParagraph]) -> None:
+        """Set the paragraphs."""
+        self._paragraphs = ChildList(self, paragraphs)
+        self.mark_changed()
+
+    def get_p_strs(self) -> list[str]:
+        """Get the text of each paragraph, straight from the buffer if untouched."""
+        if self._paragraphs is not None:
+            return super().get_p_strs()
+        offs = self.par_offsets
+        return [self.decode(offs[i], offs[i + 1]) for i in range(0, len(offs), 2)]
+
+    def decode(self, start: int, end: int) -> str:
+        """Decode a slice of the buffer."""
+        return self.buffer[start:end].decode("utf-8")
+
+
+@dataclass
+class ParsedBookCache:
+    """Cache of parsed books, keyed on the epub content and the parser."""
+
+    cache_fol: Path | None = None
+    """Folder of the cached books, defaults to the project cache folder."""
+
+    def __post_init__(self) -> None:
+        """Set the default cache folder."""
+        if self.cache_fol is None:
+            self.cache_fol = get_epub_summary_paths().cache_fol / "parsed_books"
+
+    def get_key(
+        self,
+        epub_fp: Path,
+        parser_cls: type[BaseHtmlChapterParser],
+    ) -> str:
+        """Hash the epub file and the parser into a key."""
+        with epub_fp.open("rb") as f:
+            epub_hash = hashlib.file_digest(f, "sha256").hexdigest()
+        parser_id = f"{parser_cls.__module__}.{parser_cls.__qualname__}"
+        key_str = f"{BOOK_CACHE_VERSION}:{parser_id}:{parser_cls.parser_version}"
+        parser_hash = hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+        return f"{epub_hash[:32]}_{parser_hash[:16]}"
+
+    def get_book_fol(self, key: str) -> Path:
+        """Get the folder of a cached book."""
+        assert self.cache_fol is not None
+        return self.cache_fol / key
+
+    def load(self, key: str, epub: Epub) -> bool:
+        """Load a cached book into the epub, return False on a miss.
+
+        A corrupt or malformed book counts as a miss, and is dropped so that
+        it is stored again.
+        """
+        book_fol = self.get_book_fol(key)
+        try:
+            index = json.loads((book_fol / "index.json").read_text())
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            self.drop(key, "Corrupt index")
+            return False
+        try:
+            with (book_fol / "book.bin").open("rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            # an empty book cannot be mapped
+            buffer = b""
+        try:
+            chapters = [
+                self.load_chapter(chapter_data, buffer, epub)
+                for chapter_data in index["chapters"]
+            ]
+        except (KeyError, TypeError, ValueError):
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+            self.drop(key, "Malformed index")
+            return False
+        if isinstance(buffer, mmap.mmap):
+            # the sections keep their book alive, unmap with it
+            weakref.finalize(epub, buffer.close)
+        for chapter in chapters:
+            epub.add_chapter(chapter)
+        lg.debug(f"Loaded parsed book {key} from cache.")
+        return True
+
+    def load_chapter(
+        self,
+        chapter_data: dict,
+        buffer: mmap.mmap | bytes,
+        epub: Epub,
+    ) -> EpubChapter:
+        """Build a chapter from its index entry, its paragraphs are decoded later."""
+        sections: list[EpubSection] = [
+            MappedEpubSection(sd["title"], buffer, sd["span"], sd["pars"])
+            for sd in chapter_data["sections"]
+        ]
+        html_start, html_end = chapter_data["html"]
+        return EpubChapter.from_sections(
+            buffer[html_start:html_end].decode("utf-8"),
+            chapter_data["stem"],
+            epub.parser_cls(),
+            sections,
+        )
+
+    def drop(self, key: str, reason: str) -> None:
+        """Drop a cached book that cannot be loaded, so that it is stored again."""
+        lg.warning(f"{reason} of cached book {key}, dropping it.")
+        shutil.rmtree(self.get_book_fol(key), ignore_errors=True)
+
+    def store(self, key: str, epub: Epub) -> None:
+        """Store the parsed chapters of the epub."""
+        assert self.cache_fol is not None
+        self.cache_fol.mkdir(parents=True, exist_ok=True)
+        # write to a temp folder and rename it, so readers never see half a book
+        tmp_fol = Path(tempfile.mkdtemp(dir=self.cache_fol, prefix=".tmp_"))
+        chapters_data = []
+        with (tmp_fol / "book.bin").open("wb") as f:
+            pos = 0
+
+            def write(text: str) -> tuple[int, int]:
+                nonlocal pos
+                data = text.encode("utf-8")
+                f.write(data)
+                start, pos = pos, pos + len(data)
+                return start, pos
+
+            for chapter in epub.chapters:
+                sections_data = []
+                for sec_i, section in enumerate(chapter.sections):
+                    if sec_i > 0:
+                        write("\n")
+                    sec_start = pos
+                    par_offsets: list[int] = []
+                    for par_i, par in enumerate(section.paragraphs):
+                        if par_i > 0:
+                            write("\n")
+                        par_offsets.extend(write(par.p_str))
+                    sections_data.append(
+                        {
+                            "title": section.section_title,
+                            "span": [sec_start, pos],
+                            "pars": par_offsets,
+                        }
+                    )
+                html_span = write(chapter.html)
+                chapters_data.append(
+                    {
+                        "stem": chapter.chap_stem,
+                        "html": html_span,
+                        "sections": sections_data,
+                    }
+                )
+        index = {"version": BOOK_CACHE_VERSION, "chapters": chapters_data}
+        (tmp_fol / "index.json").write_text(json.dumps(index))
+        try:
+            os.rename(tmp_fol, self.get_book_fol(key))
+        except OSError:
+            # another process stored the same book first
+            shutil.rmtree(tmp_fol, ignore_errors=True)
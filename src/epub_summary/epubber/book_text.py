@@ -0,0 +1,245 @@
+"""The text of a whole book in a single buffer.
+
+The paragraphs of each chapter are joined once, and the offset of every
+paragraph and section is kept, along with running word counts, so that the
+text and the counts of any part of a chapter are a slice or a subtraction
+away. The book is indexed on top of the chapter buffers: after a change only
+the chapters that changed are joined again, and reading a chapter never
+costs work proportional to the whole book.
+"""
+
+from collections.abc import Sequence
+from functools import cached_property
+from itertools import accumulate
+import weakref
+
+from epub_summary.epubber.epub import EpubChapter, EpubSection
+
+# rough characters per token, like the local estimate of the summarizer
+CHARS_PER_TOKEN = 4
+
+
+class ChapterText:
+    """The text of a chapter, indexed by section and paragraph.
+
+    The buffer is the paragraphs joined by newlines, in the same layout as
+    EpubChapter.text, where an empty section is an empty line.
+    Only weak references to the chapter and its sections are kept, so that
+    the buffer of a book does not keep its chapters in memory.
+    """
+
+    def __init__(self, chapter: EpubChapter) -> None:
+        """Join the paragraphs of the chapter and index their lines."""
+        self.chapter_ref = weakref.ref(chapter)
+        self.version = chapter.version
+        self.section_indexes: weakref.WeakKeyDictionary[EpubSection, int] = (
+            weakref.WeakKeyDictionary()
+        )
+        lines: list[str] = []
+        # first line of each section, and the end of the last one
+        self.sec_lines: list[int] = []
+        for sec_i, section in enumerate(chapter.sections):
+            self.section_indexes[section] = sec_i
+            self.sec_lines.append(len(lines))
+            lines.extend(section.get_p_strs() or [""])
+        if len(chapter.sections) == 0:
+            lines.append("")
+        self.sec_lines.append(len(lines))
+        self.text = "\n".join(lines)
+        self.lines = lines
+
+        # a line starts after the previous one and its newline
+        self.line_starts = list(
+            accumulate((len(line) + 1 for line in lines), initial=0)
+        )
+
+    @cached_property
+    def words_before(self) -> list[int]:
+        """Get the running word counts, counted on first use."""
+        return list(accumulate((len(line.split()) for line in self.lines), initial=0))
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether the chapter changed since the buffer was built."""
+        chapter = self.chapter_ref()
+        return chapter is not None and chapter.version != self.version
+
+    def find_section(self, section: EpubSection) -> int:
+        """Get the index of a section of the buffer."""
+        if section not in self.section_indexes:
+            raise ValueError(f"Section {section.section_title} is not in the buffer.")
+        return self.section_indexes[section]
+
+    def get_lines(
+        self,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> tuple[int, int]:
+        """Get the range of lines of the chapter, or of a part of it."""
+        if section is None:
+            return 0, len(self.lines)
+        if not 0 <= section < len(self.sec_lines) - 1:
+            raise IndexError(f"No section {section} in the chapter.")
+        first, last = self.sec_lines[section], self.sec_lines[section + 1]
+        if paragraph is None:
+            return first, last
+        if not 0 <= paragraph < last - first:
+            raise IndexError(f"No paragraph {paragraph} in section {section}.")
+        return first + paragraph, first + paragraph + 1
+
+    def get_span(
+        self,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> tuple[int, int]:
+        """Get the character span of the chapter, or of a part of it."""
+        first, last = self.get_lines(section, paragraph)
+        if first == last:
+            return self.line_starts[first], self.line_starts[first]
+        # drop the newline after the last line
+        return self.line_starts[first], self.line_starts[last] - 1
+
+    def get_text(
+        self,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> str:
+        """Get the text of the chapter, or of a part of it."""
+        if section is None:
+            return self.text
+        start, end = self.get_span(section, paragraph)
+        return self.text[start:end]
+
+    def count_words(
+        self,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> int:
+        """Count the words of the chapter, or of a part of it."""
+        first, last = self.get_lines(section, paragraph)
+        return self.words_before[last] - self.words_before[first]
+
+
+class BookText:
+    """The text of the chapters of a book, indexed by chapter and section.
+
+    The buffer is the chapter texts joined by newlines, each line of it is a
+    paragraph, and the parts of the book are ranges of lines: the whole
+    book, a chapter, a section of a chapter or a paragraph of a section.
+    The whole text is only joined when asked for, the parts of a chapter
+    are sliced from the buffer of the chapter.
+    """
+
+    def __init__(self, chapter_texts: Sequence[ChapterText]) -> None:
+        """Index the chapter buffers in the book."""
+        self.chapter_texts = list(chapter_texts)
+        self.chapter_indexes: weakref.WeakKeyDictionary[EpubChapter, int] = (
+            weakref.WeakKeyDictionary()
+        )
+        for chap_i, chapter_text in enumerate(self.chapter_texts):
+            chapter = chapter_text.chapter_ref()
+            if chapter is not None:
+                self.chapter_indexes[chapter] = chap_i
+        # first line and first character of each chapter
+        self.chap_lines = list(
+            accumulate((len(ct.lines) for ct in self.chapter_texts), initial=0)
+        )
+        self.chap_starts = list(
+            accumulate((len(ct.text) + 1 for ct in self.chapter_texts), initial=0)
+        )
+
+    @classmethod
+    def from_chapters(cls, chapters: Sequence[EpubChapter]) -> "BookText":
+        """Index the buffers of the chapters, rebuilt only if stale."""
+        return cls([chapter.get_chapter_text() for chapter in chapters])
+
+    @cached_property
+    def text(self) -> str:
+        """Get the text of the whole book, joined on first use."""
+        return "\n".join(ct.text for ct in self.chapter_texts)
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether a chapter changed since the buffer was built."""
+        return any(ct.is_stale for ct in self.chapter_texts)
+
+    def find_chapter(self, chapter: EpubChapter) -> int:
+        """Get the index of a chapter of the buffer."""
+        if chapter not in self.chapter_indexes:
+            raise ValueError(f"Chapter {chapter.chap_stem} is not in the buffer.")
+        return self.chapter_indexes[chapter]
+
+    def find_section(self, section: EpubSection) -> tuple[int, int]:
+        """Get the chapter and section index of a section of the buffer."""
+        if section.owner is None:
+            raise ValueError(f"Section {section.section_title} is not in the buffer.")
+        chap_i = self.find_chapter(section.owner)
+        return chap_i, self.chapter_texts[chap_i].find_section(section)
+
+    def get_lines(
+        self,
+        chapter: int | None = None,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> tuple[int, int]:
+        """Get the range of lines of the book, or of a part of it."""
+        if chapter is None:
+            return 0, self.chap_lines[-1]
+        first, last = self.chapter_texts[chapter].get_lines(section, paragraph)
+        offset = self.chap_lines[chapter]
+        return offset + first, offset + last
+
+    def get_span(
+        self,
+        chapter: int | None = None,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> tuple[int, int]:
+        """Get the character span of the book, or of a part of it."""
+        if chapter is None:
+            # drop the newline after the last chapter
+            return 0, max(0, self.chap_starts[-1] - 1)
+        start, end = self.chapter_texts[chapter].get_span(section, paragraph)
+        offset = self.chap_starts[chapter]
+        return offset + start, offset + end
+
+    def get_text(
+        self,
+        chapter: int | None = None,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> str:
+        """Get the text of the book, or of a part of it."""
+        if chapter is None:
+            return self.text
+        return self.chapter_texts[chapter].get_text(section, paragraph)
+
+    def count_chars(
+        self,
+        chapter: int | None = None,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> int:
+        """Count the characters of the book, or of a part of it."""
+        start, end = self.get_span(chapter, section, paragraph)
+        return end - start
+
+    def count_words(
+        self,
+        chapter: int | None = None,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> int:
+        """Count the words of the book, or of a part of it."""
+        if chapter is None:
+            return sum(ct.count_words() for ct in self.chapter_texts)
+        return self.chapter_texts[chapter].count_words(section, paragraph)
+
+    def count_tokens(
+        self,
+        chapter: int | None = None,
+        section: int | None = None,
+        paragraph: int | None = None,
+    ) -> int:
+        """Estimate the tokens of the book, or of a part of it."""
+        return self.count_chars(chapter, section, paragraph) // CHARS_PER_TOKEN + 1
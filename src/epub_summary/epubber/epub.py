@@ -1,20 +1,142 @@
 """Epub."""
 
 from abc import ABC
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Self
+import re
+from typing import TYPE_CHECKING, Any, Self, SupportsIndex, TypeVar, overload
 import warnings
 import zipfile
 
 from bs4 import BeautifulSoup, Tag
 from loguru import logger as lg
+import lxml.etree
+import lxml.html
+
+from epub_summary.epubber.utils import (
+    element_to_str,
+    find_head,
+    find_zip_chapter_files,
+    hash_hashes,
+    hash_str,
+    str_to_p_tag,
+    tag_to_str,
+    text_to_xhtml,
+)
+from epub_summary.metrics.registry import METRICS
+
+if TYPE_CHECKING:
+    from epub_summary.epubber.book_cache import ParsedBookCache
+    from epub_summary.epubber.book_text import BookText, ChapterText
 
-from epub_summary.epubber.utils import find_chapter_files, str_to_p_tag, tag_to_str
+# section title and paragraph strings, cheap to send across processes
+SectionData = tuple[str, list[str]]
+
+# below this many chapters a process pool costs more than it saves
+MIN_PARALLEL_CHAPTERS = 8
+
+DEFAULT_SECTION_TITLE = "default"
+
+# heading tags that start a new section
+SECTION_HEADINGS = ("h1", "h2", "h3", "h4")
+
+# tags the section parser stops at, the inline markup is skipped in C
+WALK_TAGS = ["p", "hr", "section", *SECTION_HEADINGS]
+
+# paragraphs used as scene breaks, like `***`, `* * *`, `#` or `⁂`
+SCENE_BREAK_RE = re.compile(r"^\s*(?:(?:[*#~]\s*){3,}|#|⁂)\s*$")
+
+
+ChildT = TypeVar("ChildT", bound=Any)
+
+
+class ChildList(list[ChildT]):
+    """List of the children of a node of the book, reporting its changes.
+
+    The children added are given the node as owner, and any change to the
+    list is reported to the node, so that the texts of the book are
+    refreshed even when the list is edited in place.
+    """
+
+    def __init__(self, owner: Any, children: Iterable[ChildT] = ()) -> None:
+        """Initialize the list, adopting the children."""
+        super().__init__(children)
+        self.owner = owner
+        for child in self:
+            child.owner = owner
+
+    def adopt(self, children: Iterable[ChildT]) -> list[ChildT]:
+        """Give the children the owner of the list."""
+        children = list(children)
+        for child in children:
+            child.owner = self.owner
+        return children
+
+    def changed(self) -> None:
+        """Report a change to the owner."""
+        self.owner.mark_changed()
+
+    def append(self, child: ChildT) -> None:
+        child.owner = self.owner
+        super().append(child)
+        self.changed()
+
+    def extend(self, children: Iterable[ChildT]) -> None:
+        super().extend(self.adopt(children))
+        self.changed()
+
+    def insert(self, index: SupportsIndex, child: ChildT) -> None:
+        child.owner = self.owner
+        super().insert(index, child)
+        self.changed()
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            value = self.adopt(value)
+        else:
+            value.owner = self.owner
+        super().__setitem__(index, value)
+        self.changed()
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self.changed()
+
+    def __iadd__(self, children) -> Self:
+        self.extend(children)
+        return self
+
+    def pop(self, index: SupportsIndex = -1) -> ChildT:
+        child = super().pop(index)
+        self.changed()
+        return child
+
+    def remove(self, child: ChildT) -> None:
+        super().remove(child)
+        self.changed()
+
+    def clear(self) -> None:
+        super().clear()
+        self.changed()
+
+    def sort(self, **kwargs) -> None:
+        super().sort(**kwargs)
+        self.changed()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self.changed()
 
 
 class BaseHtmlChapterParser(ABC):
     """ABC for HtmlChapterParser."""
 
+    # bump when the output of the parser changes, to invalidate cached books
+    parser_version: int = 1
+
     def get_soup(self, html: str) -> Tag:
         """Get the soup of the html."""
         # filter XMLParsedAsHTMLWarning
@@ -36,7 +158,9 @@ class HtmlChapterParserSingle(BaseHtmlChapterParser):
 
     def parse(self, html: str) -> "list[EpubSection]":
         """Parse the html."""
-        soup = self.get_soup(html)
+        parser_name = type(self).__name__
+        with METRICS.timer("parser.tree", parser=parser_name):
+            soup = self.get_soup(html)
         body = soup.body
         if body is None:
             lg.warning(f"No body found in chapter.")
@@ -46,63 +170,258 @@ class HtmlChapterParserSingle(BaseHtmlChapterParser):
             lg.warning(f"No paragraphs found in chapter.")
             return []
         sec = EpubSection("default")
-        for p_tag in all_p_tag:
-            par = EpubParagraph.from_p_tag(p_tag)
-            sec.add_paragraph(par)
+        with METRICS.timer("parser.paragraphs", parser=parser_name):
+            for p_tag in all_p_tag:
+                par = EpubParagraph.from_p_tag(p_tag)
+                sec.add_paragraph(par)
+        return [sec]
+
+
+class HtmlChapterParserLxml(BaseHtmlChapterParser):
+    """HtmlChapterParserLxml.
+
+    Same output as HtmlChapterParserSingle, built directly on lxml.html
+    without going through BeautifulSoup.
+    """
+
+    parser_version = 2
+
+    def get_root(self, html: str) -> lxml.html.HtmlElement | None:
+        """Get the root element of the html."""
+        # encode so that xhtml with an encoding declaration is accepted
+        html_parser = lxml.html.HTMLParser(encoding="utf-8")
+        try:
+            return lxml.html.document_fromstring(html.encode("utf-8"), html_parser)
+        except lxml.etree.ParserError:
+            return None
+
+    def parse(self, html: str) -> "list[EpubSection]":
+        """Parse the html."""
+        parser_name = type(self).__name__
+        with METRICS.timer("parser.tree", parser=parser_name):
+            root = self.get_root(html)
+        body = root.find("body") if root is not None else None
+        if body is None:
+            lg.warning(f"No body found in chapter.")
+            return []
+        all_p_el = body.iter("p")
+        sec = EpubSection("default")
+        with METRICS.timer("parser.paragraphs", parser=parser_name):
+            for p_el in all_p_el:
+                par = EpubParagraph.from_p_str(element_to_str(p_el))
+                sec.add_paragraph(par)
+        if len(sec.paragraphs) == 0:
+            lg.warning(f"No paragraphs found in chapter.")
+            return []
         return [sec]
 
 
+class HtmlChapterParserSections(HtmlChapterParserLxml):
+    """HtmlChapterParserSections.
+
+    Split the chapter into titled sections in a single walk over the body.
+    A section starts at each heading, at each scene break (an `<hr>` or a
+    paragraph like `***`) and at the start and end of each `<section>` tag.
+    Headings with no paragraphs between them are joined into one title,
+    a scene break continues the title of the section it breaks, and
+    nested section tags keep the title of their parent until a heading, and
+    sections without paragraphs are dropped.
+    """
+
+    def parse(self, html: str) -> "list[EpubSection]":
+        """Parse the html."""
+        parser_name = type(self).__name__
+        with METRICS.timer("parser.tree", parser=parser_name):
+            root = self.get_root(html)
+        body = root.find("body") if root is not None else None
+        if body is None:
+            lg.warning(f"No body found in chapter.")
+            return []
+        secs = [EpubSection(DEFAULT_SECTION_TITLE)]
+        # the current section was started by a heading and is still empty
+        titled = False
+        # titles of the open section tags, to go back to when they close
+        title_stack: list[str] = []
+
+        def start_section(title: str) -> None:
+            nonlocal titled
+            titled = False
+            if len(secs[-1].paragraphs) == 0:
+                secs[-1].section_title = title
+            else:
+                secs.append(EpubSection(title))
+
+        with METRICS.timer("parser.paragraphs", parser=parser_name):
+            walk = lxml.etree.iterwalk(body, events=("start", "end"), tag=WALK_TAGS)
+            for event, el in walk:
+                tag = el.tag
+                if event == "end":
+                    if tag == "section":
+                        start_section(title_stack.pop())
+                    continue
+                if tag == "p":
+                    p_str = element_to_str(el)
+                    if SCENE_BREAK_RE.match(p_str):
+                        start_section(secs[-1].section_title)
+                    else:
+                        secs[-1].add_paragraph(EpubParagraph.from_p_str(p_str))
+                        titled = False
+                elif tag in SECTION_HEADINGS:
+                    title = " ".join(element_to_str(el).split())
+                    if titled:
+                        secs[-1].section_title += f": {title}"
+                    else:
+                        start_section(title)
+                    titled = True
+                elif tag == "hr":
+                    start_section(secs[-1].section_title)
+                elif tag == "section":
+                    title_stack.append(secs[-1].section_title)
+                    start_section(secs[-1].section_title)
+        secs = [sec for sec in secs if len(sec.paragraphs) > 0]
+        if len(secs) == 0:
+            lg.warning(f"No paragraphs found in chapter.")
+        return secs
+
+
 class EpubParagraph:
-    """EpubParagraph."""
+    """EpubParagraph.
+
+    The normalized text is the source of truth: the p tag is only built from
+    it when first accessed, and then kept.
+    A change to the text is reported to the section owning the paragraph.
+    """
+
+    __slots__ = ("_p_str", "_p_tag", "owner")
 
     def __init__(self) -> None:
         """Initialize epub paragraph."""
+        self._p_str = ""
+        self._p_tag: Tag | None = None
+        self.owner: EpubSection | None = None
+
+    @property
+    def p_str(self) -> str:
+        """Get the normalized text of the paragraph."""
+        return self._p_str
+
+    @p_str.setter
+    def p_str(self, p_str: str) -> None:
+        """Set the text of the paragraph, dropping the p tag built from it."""
+        self._p_str = p_str
+        self._p_tag = None
+        if self.owner is not None:
+            self.owner.mark_changed()
+
+    @property
+    def p_tag(self) -> Tag:
+        """Get the p tag of the paragraph, building it on first access."""
+        if self._p_tag is None:
+            self._p_tag = str_to_p_tag(self.p_str)
+        return self._p_tag
 
     def set_p_tag(self, p_tag: Tag) -> None:
-        """Set the p tag of the paragraph."""
-        self.p_tag = p_tag
-        self.set_p_str(tag_to_str(self.p_tag))
+        """Set the p tag of the paragraph.
+
+        Only the normalized text is kept, so the paragraph does not hold a
+        reference to the whole chapter soup.
+        """
+        self.set_p_str(tag_to_str(p_tag))
 
     def set_p_str(self, p_str: str) -> None:
         """Set the p string of the paragraph."""
         self.p_str = p_str
-        self.p_tag = str_to_p_tag(self.p_str)
+
+    @property
+    def content_hash(self) -> str:
+        """Get the content hash of the paragraph text."""
+        return hash_str(self.p_str)
 
     @classmethod
     def from_p_str(cls, p_str: str) -> Self:
         """Create a paragraph from a string."""
         par = cls()
-        par.set_p_str(p_str)
+        # a new paragraph has no owner to tell yet
+        par._p_str = p_str
         return par
 
     @classmethod
     def from_p_tag(cls, p_tag: Tag) -> Self:
         """Create a paragraph from a tag."""
-        par = cls()
-        par.set_p_tag(p_tag)
-        return par
+        return cls.from_p_str(tag_to_str(p_tag))
 
 
 class EpubSection:
-    """EpubSection."""
+    """EpubSection.
+
+    The text of a section in a chapter is a slice of the text of the book.
+    """
 
     def __init__(self, section_title: str) -> None:
         """Initialize epub section."""
         self.section_title = section_title
-        self.paragraphs: list[EpubParagraph] = []
+        self.owner: EpubChapter | None = None
+        self._paragraph_list: ChildList[EpubParagraph] = ChildList(self)
+
+    @property
+    def paragraphs(self) -> list[EpubParagraph]:
+        """Get the paragraphs of the section."""
+        return self._paragraph_list
+
+    @paragraphs.setter
+    def paragraphs(self, paragraphs: list[EpubParagraph]) -> None:
+        """Set the paragraphs of the section."""
+        self._paragraph_list = ChildList(self, paragraphs)
+        self.mark_changed()
 
     def add_paragraph(self, paragraph: EpubParagraph) -> None:
         """Add a paragraph to the section."""
         self.paragraphs.append(paragraph)
 
+    def mark_changed(self) -> None:
+        """Report a change to the paragraphs to the chapter."""
+        if self.owner is not None:
+            self.owner.mark_changed()
+
+    def get_p_strs(self) -> list[str]:
+        """Get the text of each paragraph."""
+        return [p.p_str for p in self.paragraphs]
+
     @property
     def text(self) -> str:
         """Get the text of the section."""
-        return "\n".join([p.p_str for p in self.paragraphs])
+        if self.owner is None:
+            return "\n".join(self.get_p_strs())
+        chapter_text = self.owner.get_chapter_text()
+        return chapter_text.get_text(chapter_text.find_section(self))
+
+    @property
+    def content_hash(self) -> str:
+        """Get the content hash of the section title and paragraphs."""
+        return hash_hashes(
+            [hash_str(self.section_title)] + [p.content_hash for p in self.paragraphs]
+        )
+
+    def to_data(self) -> SectionData:
+        """Convert the section to compact picklable data."""
+        return self.section_title, [p.p_str for p in self.paragraphs]
+
+    @classmethod
+    def from_data(cls, data: SectionData) -> Self:
+        """Create a section from compact data."""
+        section_title, p_strs = data
+        sec = cls(section_title)
+        for p_str in p_strs:
+            sec.add_paragraph(EpubParagraph.from_p_str(p_str))
+        return sec
 
 
 class EpubChapter:
-    """EpubChapter."""
+    """EpubChapter.
+
+    The text is joined once in a buffer of the chapter, rebuilt after a
+    change to the chapter only, and the book is indexed on these buffers.
+    """
 
     def __init__(
         self,
@@ -110,23 +429,62 @@ class EpubChapter:
     ) -> None:
         """Initialize epub chapter."""
         self.html: str = ""
-        self.sections: list[EpubSection] = []
+        self.chap_stem: str = ""
+        self.owner: Epub | None = None
+        self.version = 0
+        """Bumped on every change to the sections or paragraphs."""
+        self._sections: ChildList[EpubSection] = ChildList(self)
+        self._chapter_text: "ChapterText | None" = None
 
         self.parser = parser
 
+    @property
+    def sections(self) -> list[EpubSection]:
+        """Get the sections of the chapter."""
+        return self._sections
+
+    @sections.setter
+    def sections(self, sections: list[EpubSection]) -> None:
+        """Set the sections of the chapter."""
+        self._sections = ChildList(self, sections)
+        self.mark_changed()
+
+    def mark_changed(self) -> None:
+        """Record a change to the sections or paragraphs, and tell the book."""
+        self.version += 1
+        if self.owner is not None:
+            self.owner.mark_changed()
+
+    def get_chapter_text(self) -> "ChapterText":
+        """Get the buffer the text is sliced from, rebuilt if stale."""
+        if self._chapter_text is None or self._chapter_text.version != self.version:
+            from epub_summary.epubber.book_text import ChapterText
+
+            self._chapter_text = ChapterText(self)
+        return self._chapter_text
+
     @property
     def text(self) -> str:
         """Get the text of the chapter."""
-        return "\n".join([s.text for s in self.sections])
+        return self.get_chapter_text().text
+
+    @property
+    def content_hash(self) -> str:
+        """Get the content hash of the sections of the chapter."""
+        return hash_hashes([s.content_hash for s in self.sections])
 
     @text.setter
     def text(self, text: str) -> None:
-        """Set the text of the chapter."""
-        pars = text.split("\n")
-        pars_html = [f"<p>{p}</p>" for p in pars]
-        pars_html_one = "\n".join(pars_html)
-        text_html = f"<body>{pars_html_one}</body>"
-        self.set_html(text_html)
+        """Set the text of the chapter, replacing its sections.
+
+        Each line becomes a paragraph of a single section, built directly
+        without parsing, and the html is rendered with the text escaped,
+        keeping the head of the previous html.
+        """
+        section = EpubSection("default")
+        section.paragraphs = [EpubParagraph.from_p_str(p) for p in text.split("\n")]
+        self.sections = [section]
+        self.html = text_to_xhtml(text, self.chap_stem, find_head(self.html))
 
     def set_html(self, html: str) -> None:
         """Set the html of the chapter."""
@@ -148,7 +506,9 @@ class EpubChapter:
     def update_soup(self) -> None:
         """Update the soup of the chapter."""
         # parse the soup and get the sections
-        secs = self.parser.parse(self.html)
+        with METRICS.timer("chapter.parse"):
+            secs = self.parser.parse(self.html)
+        METRICS.incr("chapter.paragraphs", sum(len(s.paragraphs) for s in secs))
         self.add_sections(secs)
 
     @classmethod
@@ -164,50 +524,347 @@ class EpubChapter:
         chapter.set_html(html)
         return chapter
 
+    @classmethod
+    def from_sections(
+        cls,
+        html: str,
+        chap_stem: str,
+        parser: BaseHtmlChapterParser,
+        sections: list[EpubSection],
+    ) -> Self:
+        """Create a chapter from html that was already parsed into sections."""
+        chapter = cls(parser)
+        chapter.set_chap_stem(chap_stem)
+        chapter.html = html
+        chapter.add_sections(sections)
+        return chapter
+
+
+def parse_chapter_bytes(
+    chapter_bytes: bytes,
+    parser_cls: type[BaseHtmlChapterParser],
+) -> list[SectionData]:
+    """Decode and parse a chapter file into compact section data.
+
+    Module level so that it can be sent to a process pool.
+    """
+    chapter_html = chapter_bytes.decode("utf-8")
+    parser = parser_cls()
+    return [sec.to_data() for sec in parser.parse(chapter_html)]
+
+
+class LazyEpubChapters(Sequence[EpubChapter]):
+    """Sequence of chapters read and parsed from an open zip on access.
+
+    Parsed chapters are kept in an LRU cache of cache_size entries,
+    if cache_size is None all the parsed chapters are kept.
+    A chapter that was modified is pinned instead of evicted, so that the
+    edits are not lost. The last chapter returned is only evicted when the
+    next one is loaded, so that its edits are seen too.
+    The chapters report their changes to the epub, like owned ones.
+    The sequence is read only: chapters cannot be added or removed.
+    """
+
+    def __init__(
+        self,
+        epub: "Epub",
+        chapter_fps: list[Path],
+        cache_size: int | None = None,
+    ) -> None:
+        """Initialize the lazy chapters."""
+        self.epub = epub
+        self.chapter_fps = chapter_fps
+        self.cache_size = cache_size
+        self.cache: OrderedDict[int, EpubChapter] = OrderedDict()
+        # version of the cached chapters when they were parsed
+        self.loaded_versions: dict[int, int] = {}
+        self.pinned: dict[int, EpubChapter] = {}
+
+    def __len__(self) -> int:
+        return len(self.chapter_fps)
+
+    @overload
+    def __getitem__(self, index: int) -> EpubChapter: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[EpubChapter]: ...
+
+    def __getitem__(self, index: int | slice) -> EpubChapter | list[EpubChapter]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Chapter index {index} out of range.")
+        return self.get_chapter(index)
+
+    def get_chapter(self, index: int) -> EpubChapter:
+        """Get a chapter, parsing it if it is not cached."""
+        if index in self.pinned:
+            return self.pinned[index]
+        if index in self.cache:
+            self.cache.move_to_end(index)
+            return self.cache[index]
+        chapter = self.epub.load_chapter(self.chapter_fps[index])
+        chapter.owner = self.epub
+        if self.cache_size is not None:
+            # make room before adding, the new chapter may still be edited
+            while len(self.cache) > 0 and len(self.cache) >= self.cache_size:
+                self.evict()
+        self.cache[index] = chapter
+        self.loaded_versions[index] = chapter.version
+        return chapter
+
+    def evict(self) -> None:
+        """Drop the least recently used chapter, or pin it if it was modified."""
+        index, chapter = self.cache.popitem(last=False)
+        if chapter.version != self.loaded_versions.pop(index):
+            self.pinned[index] = chapter
+
+    def get_chapter_texts(
+        self,
+        previous: "BookText | None" = None,
+    ) -> "list[ChapterText]":
+        """Get the text buffers of all the chapters, without caching them.
+
+        A chapter in memory gives its own buffer, the buffer of another one is
+        reused from the previous book buffer, or it is parsed and dropped:
+        only modified chapters are pinned, so the others match the file.
+        """
+        from epub_summary.epubber.book_text import ChapterText
+
+        chapter_texts = []
+        for index, chapter_fp in enumerate(self.chapter_fps):
+            chapter = self.pinned.get(index, self.cache.get(index))
+            if chapter is not None:
+                chapter_texts.append(chapter.get_chapter_text())
+            elif previous is not None:
+                chapter_texts.append(previous.chapter_texts[index])
+            else:
+                chapter_texts.append(ChapterText(self.epub.load_chapter(chapter_fp)))
+        return chapter_texts
+
 
 class Epub:
     """Epub."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        parser_cls: type[BaseHtmlChapterParser] = HtmlChapterParserSingle,
+    ) -> None:
         """Initialize epub loader."""
         # self.epub_fp: Path | None = None
-        self.chapters: list[EpubChapter] = []
+        self.version = 0
+        """Bumped on every change to the chapters."""
+        self.chapters = []
+        self.input_zip: zipfile.ZipFile | None = None
+        self.parser_cls = parser_cls
+        self._book_text: "BookText | None" = None
+        self._book_text_version = -1
+
+    @property
+    def chapters(self) -> Sequence[EpubChapter]:
+        """Get the chapters of the epub.
+
+        A list for an epub loaded eagerly, a read only LazyEpubChapters for an
+        epub opened with Epub.open: use add_chapter to add chapters.
+        """
+        return self._chapters
+
+    @chapters.setter
+    def chapters(self, chapters: Sequence[EpubChapter]) -> None:
+        """Set the chapters, a list is owned by the epub, lazy ones are not."""
+        if isinstance(chapters, list):
+            chapters = ChildList(self, chapters)
+        self._chapters = chapters
+        self.mark_changed()
+
+    def mark_changed(self) -> None:
+        """Record a change to the chapters."""
+        self.version += 1
 
     def set_epub_fp(self, epub_fp: Path) -> None:
         """Set the epub file path."""
         self.epub_fp = epub_fp
 
-    def load_zip(self, epub_fp: Path) -> None:
-        """Load epub from zip file."""
+    def load_zip(self, epub_fp: Path, workers: int = 1) -> None:
+        """Load epub from zip file.
+
+        With workers > 1 the chapters are parsed in a process pool,
+        unless the book is too small for the pool to pay off.
+        """
         # set the epub file path
         self.set_epub_fp(epub_fp)
         # load the zip (epub) file in memory
-        input_zip = zipfile.ZipFile(self.epub_fp)
-        # get the paths of the files in the zip
-        input_zip_fps = [Path(p) for p in input_zip.namelist()]
-        # find the files with the chapters
-        chapter_fps = find_chapter_files(input_zip_fps)
-        for chapter_fp in chapter_fps:
-            # read the chapter file and decode it
-            chapter_bytes = input_zip.read(str(chapter_fp))
-            chapter_html = chapter_bytes.decode("utf-8")
-            # create a chapter object
-            parser = HtmlChapterParserSingle()
-            chapter = EpubChapter.from_html(
-                chapter_html,
-                chapter_fp.stem,
-                parser,
+        with METRICS.timer("epub.load_zip"), zipfile.ZipFile(self.epub_fp) as input_zip:
+            self.input_zip = input_zip
+            # find the files with the chapters
+            chapter_fps = self.find_chapter_fps()
+            if workers > 1 and len(chapter_fps) >= MIN_PARALLEL_CHAPTERS:
+                self.load_chapters_parallel(chapter_fps, workers)
+            else:
+                for chapter_fp in chapter_fps:
+                    # create a chapter object and add it to the epub
+                    chapter = self.load_chapter(chapter_fp)
+                    self.add_chapter(chapter)
+        self.input_zip = None
+
+    def load_chapters_parallel(self, chapter_fps: list[Path], workers: int) -> None:
+        """Parse the chapters from the open zip in a process pool."""
+        if self.input_zip is None:
+            raise ValueError("The epub zip file is not open.")
+        lg.debug(f"Parsing {len(chapter_fps)} chapters with {workers} workers.")
+        with METRICS.timer("epub.zip_read"):
+            all_chapter_bytes = [self.input_zip.read(str(fp)) for fp in chapter_fps]
+        METRICS.incr("epub.bytes_read", sum(len(b) for b in all_chapter_bytes))
+        METRICS.incr("epub.chapters", len(chapter_fps))
+        chunksize = max(1, len(chapter_fps) // (workers * 4))
+        with (
+            METRICS.timer("epub.parallel_parse"),
+            ProcessPoolExecutor(max_workers=workers) as executor,
+        ):
+            # map keeps the order of the chapter files
+            all_secs_data = executor.map(
+                parse_chapter_bytes,
+                all_chapter_bytes,
+                repeat(self.parser_cls),
+                chunksize=chunksize,
             )
-            # add the chapter to the epub
-            self.add_chapter(chapter)
+            for chapter_fp, chapter_bytes, secs_data in zip(
+                chapter_fps, all_chapter_bytes, all_secs_data
+            ):
+                chapter = EpubChapter.from_sections(
+                    chapter_bytes.decode("utf-8"),
+                    chapter_fp.stem,
+                    self.parser_cls(),
+                    [EpubSection.from_data(sd) for sd in secs_data],
+                )
+                self.add_chapter(chapter)
+
+    def open_zip(self, epub_fp: Path, cache_size: int | None = None) -> None:
+        """Open the epub zip file and load the chapters lazily."""
+        self.set_epub_fp(epub_fp)
+        self.input_zip = zipfile.ZipFile(self.epub_fp)
+        chapter_fps = self.find_chapter_fps()
+        self.chapters = LazyEpubChapters(self, chapter_fps, cache_size)
+
+    def find_chapter_fps(self) -> list[Path]:
+        """Find the paths of the chapter files in the open zip.
+
+        Use the OPF spine, falling back to the file name heuristic.
+        """
+        if self.input_zip is None:
+            raise ValueError("The epub zip file is not open.")
+        return find_zip_chapter_files(self.input_zip)
+
+    def load_chapter(self, chapter_fp: Path) -> EpubChapter:
+        """Read and parse a chapter from the open zip."""
+        if self.input_zip is None:
+            raise ValueError("The epub zip file is not open.")
+        # read the chapter file and decode it
+        with METRICS.timer("epub.zip_read"):
+            chapter_bytes = self.input_zip.read(str(chapter_fp))
+        METRICS.incr("epub.bytes_read", len(chapter_bytes))
+        METRICS.incr("epub.chapters")
+        with METRICS.timer("epub.decode"):
+            chapter_html = chapter_bytes.decode("utf-8")
+        # create a chapter object
+        parser = self.parser_cls()
+        chapter = EpubChapter.from_html(
+            chapter_html,
+            chapter_fp.stem,
+            parser,
+        )
+        return chapter
 
     def add_chapter(self, chapter: EpubChapter) -> None:
-        """Add a chapter to the epub."""
+        """Add a chapter to the epub.
+
+        The chapters of a lazily loaded epub are read only, a TypeError is raised.
+        """
+        if not isinstance(self.chapters, list):
+            raise TypeError("Cannot add chapters to a lazily loaded epub.")
         self.chapters.append(chapter)
 
+    def set_chapter_texts(self, texts: Mapping[int, str]) -> None:
+        """Replace the text of many chapters, keyed by chapter index.
+
+        The modified chapters of a lazily loaded epub are pinned in memory.
+        """
+        for index, text in texts.items():
+            self.chapters[index].text = text
+
+    @property
+    def book_text(self) -> "BookText":
+        """Get the text of the whole book in one buffer, rebuilt if stale.
+
+        Only the chapters that changed are joined again. The chapters of a
+        lazily opened book that are not in memory are parsed without being
+        cached, so the book text keeps the LRU limit of the chapters.
+        """
+        from epub_summary.epubber.book_text import BookText
+
+        if self._book_text is None or self._book_text_version != self.version:
+            if isinstance(self.chapters, LazyEpubChapters):
+                chapter_texts = self.chapters.get_chapter_texts(self._book_text)
+                self._book_text = BookText(chapter_texts)
+            else:
+                self._book_text = BookText.from_chapters(self.chapters)
+            self._book_text_version = self.version
+        return self._book_text
+
+    def close(self) -> None:
+        """Close the epub zip file, if open."""
+        if self.input_zip is not None:
+            self.input_zip.close()
+            self.input_zip = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     @classmethod
-    def from_zip(cls, epub_fp: Path) -> Self:
-        """Load epub from zip file."""
-        ep = cls()
-        ep.load_zip(epub_fp)
+    def from_zip(
+        cls,
+        epub_fp: Path,
+        workers: int = 1,
+        parser_cls: type[BaseHtmlChapterParser] = HtmlChapterParserSingle,
+        cache: "ParsedBookCache | None" = None,
+    ) -> Self:
+        """Load epub from zip file.
+
+        The parsed book cache is opt-in: if one is given, a book already in the
+        cache is loaded from it without parsing, otherwise it is parsed and
+        stored. The batch runner uses one by default.
+        """
+        ep = cls(parser_cls)
+        if cache is None:
+            ep.load_zip(epub_fp, workers)
+            return ep
+        key = cache.get_key(epub_fp, parser_cls)
+        if cache.load(key, ep):
+            ep.set_epub_fp(epub_fp)
+            return ep
+        ep.load_zip(epub_fp, workers)
+        cache.store(key, ep)
+        return ep
+
+    @classmethod
+    def open(
+        cls,
+        epub_fp: Path,
+        cache_size: int | None = None,
+        parser_cls: type[BaseHtmlChapterParser] = HtmlChapterParserSingle,
+    ) -> Self:
+        """Open epub from zip file, parsing the chapters on demand.
+
+        Use as a context manager to close the zip file:
+
+            with Epub.open(epub_fp, cache_size=4) as ep:
+                ch = ep.chapters[0]
+        """
+        ep = cls(parser_cls)
+        ep.open_zip(epub_fp, cache_size)
         return ep
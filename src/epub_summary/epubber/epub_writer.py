@@ -0,0 +1,219 @@
+"""Streaming writer of revised epubs.
+
+The new epub is written next to the source one, a chapter at a time as
+each revision completes, so the book is never held in memory.
+Only the chapters that were revised are compressed again: every other
+entry (images, css, fonts, the OPF) is copied across as raw compressed
+bytes, without inflating and deflating it.
+The raw copy relies on zipfile internals, if they are missing the entries
+are recompressed with ZipFile.writestr instead.
+"""
+
+import copy
+from pathlib import Path
+import struct
+from typing import Self
+import zipfile
+
+from loguru import logger as lg
+
+from epub_summary.epubber.utils import (
+    find_head,
+    find_zip_chapter_files,
+    text_to_xhtml,
+)
+from epub_summary.metrics.registry import METRICS
+
+MIMETYPE_NAME = "mimetype"
+
+# size of the blocks of raw data copied between the zips
+COPY_BLOCK_SIZE = 1 << 20
+
+# flag set when the sizes follow the data instead of the local header
+DATA_DESCRIPTOR_FLAG = 0x08
+
+# the private parts of zipfile used by the raw copy
+RAW_COPY_SUPPORTED = all(
+    hasattr(zipfile, name)
+    for name in ["structFileHeader", "sizeFileHeader", "stringFileHeader"]
+) and hasattr(zipfile.ZipInfo, "FileHeader")
+
+
+class EpubWriter:
+    """Write a copy of an epub, replacing some of the chapters.
+
+    The output is written to a temporary file, renamed into place on close,
+    so that a failed run never leaves a truncated epub behind.
+    """
+
+    def __init__(
+        self,
+        source_fp: Path,
+        output_fp: Path,
+        compresslevel: int | None = None,
+        raw_copy: bool = True,
+    ) -> None:
+        """Initialize the writer, call open or use it as a context manager.
+
+        Without raw_copy, the untouched entries are decompressed and
+        compressed again.
+        """
+        self.source_fp = source_fp
+        self.output_fp = output_fp
+        self.compresslevel = compresslevel
+        self.raw_copy = raw_copy
+        self.tmp_fp = output_fp.with_name(f"{output_fp.name}.tmp")
+        self.source_zip: zipfile.ZipFile | None = None
+        self.output_zip: zipfile.ZipFile | None = None
+        self.chapter_fps: list[Path] = []
+        self.written_names: set[str] = set()
+
+    def open(self) -> None:
+        """Open both zips and copy the mimetype, which must come first."""
+        self.source_zip = zipfile.ZipFile(self.source_fp)
+        self.chapter_fps = find_zip_chapter_files(self.source_zip)
+        self.output_fp.parent.mkdir(parents=True, exist_ok=True)
+        self.output_zip = zipfile.ZipFile(self.tmp_fp, "w")
+        if self.raw_copy and not self.can_copy_raw():
+            lg.warning("Raw zip copy not supported, recompressing the entries.")
+            self.raw_copy = False
+        if MIMETYPE_NAME in self.source_zip.namelist():
+            self.copy_entry(self.source_zip.getinfo(MIMETYPE_NAME))
+
+    def can_copy_raw(self) -> bool:
+        """Whether the zipfile internals used by the raw copy are available."""
+        source_zip, output_zip = self.get_zips()
+        return (
+            RAW_COPY_SUPPORTED
+            and getattr(source_zip, "fp", None) is not None
+            and getattr(output_zip, "fp", None) is not None
+            and isinstance(getattr(output_zip, "start_dir", None), int)
+            and isinstance(getattr(output_zip, "NameToInfo", None), dict)
+        )
+
+    def get_zips(self) -> tuple[zipfile.ZipFile, zipfile.ZipFile]:
+        """Get the source and output zips, checking that they are open."""
+        if self.source_zip is None or self.output_zip is None:
+            raise ValueError("The epub writer is not open.")
+        return self.source_zip, self.output_zip
+
+    def write_entry(self, name: str, data: str | bytes) -> None:
+        """Replace the content of an entry of the source epub."""
+        source_zip, output_zip = self.get_zips()
+        try:
+            source_info = source_zip.getinfo(name)
+        except KeyError:
+            raise ValueError(f"No entry {name} in {self.source_fp}.")
+        if name in self.written_names:
+            raise ValueError(f"Entry {name} was already written.")
+        info = zipfile.ZipInfo(name, date_time=source_info.date_time)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = source_info.external_attr
+        with METRICS.timer("writer.compress"):
+            output_zip.writestr(info, data, compresslevel=self.compresslevel)
+        self.written_names.add(name)
+
+    def write_chapter(self, chapter: int, html: str | bytes) -> None:
+        """Replace the html of a chapter, by its index in the reading order."""
+        self.get_zips()
+        self.write_entry(self.chapter_fps[chapter].as_posix(), html)
+        METRICS.incr("writer.chapters")
+
+    def write_chapter_text(self, chapter: int, text: str, title: str = "") -> None:
+        """Replace a chapter with its revised text, keeping the source head."""
+        source_zip, _ = self.get_zips()
+        head = find_head(source_zip.read(self.chapter_fps[chapter].as_posix()))
+        self.write_chapter(chapter, text_to_xhtml(text, title, head))
+
+    def copy_entry(self, info: zipfile.ZipInfo) -> None:
+        """Copy an entry of the source zip, as raw compressed bytes if supported."""
+        if self.raw_copy:
+            self.copy_entry_raw(info)
+        else:
+            self.copy_entry_recompressed(info)
+
+    def copy_entry_recompressed(self, info: zipfile.ZipInfo) -> None:
+        """Copy an entry of the source zip with the public zipfile api."""
+        source_zip, output_zip = self.get_zips()
+        out_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        out_info.compress_type = info.compress_type
+        out_info.external_attr = info.external_attr
+        with METRICS.timer("writer.compress"):
+            output_zip.writestr(
+                out_info, source_zip.read(info), compresslevel=self.compresslevel
+            )
+        self.written_names.add(info.filename)
+
+    def copy_entry_raw(self, info: zipfile.ZipInfo) -> None:
+        """Copy an entry of the source zip as raw compressed bytes."""
+        source_zip, output_zip = self.get_zips()
+        if source_zip.fp is None or output_zip.fp is None:
+            raise ValueError("The epub writer is not open.")
+        # skip the local header of the source entry to find the data
+        source_zip.fp.seek(info.header_offset)
+        header = struct.unpack(
+            zipfile.structFileHeader, source_zip.fp.read(zipfile.sizeFileHeader)
+        )
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local header for {info.filename}.")
+        filename_length, extra_length = header[-2:]
+        source_zip.fp.seek(filename_length + extra_length, 1)
+
+        # the sizes and crc are known, write them in the local header
+        out_info = copy.copy(info)
+        out_info.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+        out_info.extra = b""
+        output_zip.fp.seek(output_zip.start_dir)
+        out_info.header_offset = output_zip.start_dir
+        output_zip.fp.write(out_info.FileHeader())
+        with METRICS.timer("writer.raw_copy"):
+            remaining = info.compress_size
+            while remaining > 0:
+                block = source_zip.fp.read(min(COPY_BLOCK_SIZE, remaining))
+                if len(block) == 0:
+                    raise zipfile.BadZipFile(f"Truncated data for {info.filename}.")
+                output_zip.fp.write(block)
+                remaining -= len(block)
+        output_zip.start_dir = output_zip.fp.tell()
+        output_zip.filelist.append(out_info)
+        output_zip.NameToInfo[out_info.filename] = out_info
+        METRICS.incr("writer.raw_bytes", info.compress_size)
+        self.written_names.add(info.filename)
+
+    def copy_remaining(self) -> None:
+        """Copy all the entries that were not replaced, in the source order."""
+        source_zip, _ = self.get_zips()
+        for info in source_zip.infolist():
+            if info.filename not in self.written_names:
+                self.copy_entry(info)
+
+    def close(self) -> None:
+        """Copy the untouched entries and move the new epub into place."""
+        self.copy_remaining()
+        self.close_zips()
+        self.tmp_fp.replace(self.output_fp)
+        lg.debug(f"Wrote {self.output_fp}")
+
+    def abort(self) -> None:
+        """Close the zips and remove the partial output."""
+        self.close_zips()
+        self.tmp_fp.unlink(missing_ok=True)
+
+    def close_zips(self) -> None:
+        """Close the zips, if open."""
+        if self.output_zip is not None:
+            self.output_zip.close()
+            self.output_zip = None
+        if self.source_zip is not None:
+            self.source_zip.close()
+            self.source_zip = None
+
+    def __enter__(self) -> Self:
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.abort()
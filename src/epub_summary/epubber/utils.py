@@ -1,92 +1,190 @@
 """Utils for the epubber module."""
 
-import re
 from collections import Counter
-from pathlib import Path
+import hashlib
+from html import escape
+from pathlib import Path, PurePosixPath
+import posixpath
+import re
+from urllib.parse import unquote
+import zipfile
 
 from bs4 import BeautifulSoup, Tag
 from loguru import logger as lg
+import lxml.etree
 
 VALID_CHAP_EXT = [".xhtml", ".xml", ".html"]
+VALID_CHAP_MEDIA_TYPES = ["application/xhtml+xml", "text/html"]
+CONTAINER_FP = "META-INF/container.xml"
+HEAD_RE = re.compile(r"<head\b.*?</head\s*>", re.DOTALL | re.IGNORECASE)
 
+# tags whose strings BeautifulSoup leaves out of the text of a tag
+SKIPPED_TEXT_TAGS = ("script", "style", "template", "rt", "rp")
+# tags in which BeautifulSoup keeps the whitespace only strings as they are
+PRESERVE_WHITESPACE_TAGS = ("pre", "textarea")
+ASCII_SPACES = " \n\t\f\r"
 
-def find_chapter_files(zipped_file_paths: list[Path]) -> list[Path]:
-    """Find text chapters in epub."""
-    # check that we have some files
-    if len(zipped_file_paths) == 0:
-        lg.warning("No files to find from.")
-        return []
 
-    # get the paths that are valid xhtml and similar
-    chap_file_paths = [f for f in zipped_file_paths if f.suffix in VALID_CHAP_EXT]
+def find_opf_file(input_zip: zipfile.ZipFile) -> str | None:
+    """Find the path of the OPF package file from the epub container."""
+    try:
+        container = lxml.etree.fromstring(input_zip.read(CONTAINER_FP))
+    except (KeyError, lxml.etree.XMLSyntaxError):
+        return None
+    rootfile = container.find(".//{*}rootfile")
+    if rootfile is None:
+        return None
+    return rootfile.get("full-path")
 
-    # stem gets the file name without extensions
-    stems = [f.stem for f in chap_file_paths]
 
-    # get the longest stem
-    max_stem_len = max(len(c) for c in stems)
+def find_spine_files(input_zip: zipfile.ZipFile) -> list[Path] | None:
+    """Find text chapters in epub following the OPF spine reading order.
 
-    # track the best regex' performances
-    best_match_num = 0
-    best_stem_re = re.compile("")
+    Returns None if the OPF is missing or broken, so that the caller can
+    fall back to find_chapter_files.
+    """
+    opf_fp = find_opf_file(input_zip)
+    if opf_fp is None:
+        lg.debug("No OPF file found in epub.")
+        return None
+    try:
+        opf = lxml.etree.fromstring(input_zip.read(opf_fp))
+    except (KeyError, lxml.etree.XMLSyntaxError):
+        lg.warning(f"Failed to read OPF file {opf_fp}.")
+        return None
 
-    # iterate over the len, looking for the best match
-    for num_kept_chars in range(max_stem_len):
+    # map the manifest item ids to the paths inside the zip
+    opf_dir = PurePosixPath(opf_fp).parent
+    zipped_names = set(input_zip.namelist())
+    manifest: dict[str, str] = {}
+    for item in opf.iterfind("{*}manifest/{*}item"):
+        item_id = item.get("id")
+        href = item.get("href")
+        if item_id is None or href is None:
+            continue
+        if item.get("media-type") not in VALID_CHAP_MEDIA_TYPES:
+            continue
+        # hrefs are relative to the OPF, and may climb out of its folder
+        item_fp = posixpath.normpath(opf_dir / unquote(href.split("#")[0]))
+        if item_fp in zipped_names:
+            manifest[item_id] = item_fp
 
-        # keep only the beginning of the names
-        stem_chops = [s[:num_kept_chars] for s in stems]
+    # follow the spine, skipping auxiliary items
+    spine_fps: list[Path] = []
+    for itemref in opf.iterfind("{*}spine/{*}itemref"):
+        if itemref.get("linear") == "no":
+            continue
+        item_fp = manifest.get(itemref.get("idref", ""))
+        if item_fp is not None:
+            spine_fps.append(Path(item_fp))
 
-        # count how many names have common prefix
-        stem_freqs = Counter(stem_chops)
+    if len(spine_fps) == 0:
+        lg.warning(f"No chapters found in OPF spine of {opf_fp}.")
+        return None
+    return spine_fps
 
-        # if there are no chapters with common prefix skip
-        if stem_freqs.most_common()[0][1] == 1:
-            continue
 
-        # try to match the prefix with re
-        for stem_might, stem_freq in stem_freqs.items():
+class StemTrieNode:
+    """Node of a trie over the chapter file stems."""
 
-            # compile a regex looking for name{number}
-            stem_re = re.compile(f"{stem_might}(\\d+)")
+    __slots__ = ("depth", "first_idx", "num_ended", "children")
 
-            # how many matches this stem has
-            good_match_num = 0
+    def __init__(self, depth: int, first_idx: int) -> None:
+        """Initialize the trie node."""
+        # length of the prefix the node represents
+        self.depth = depth
+        # index of the first stem with this prefix
+        self.first_idx = first_idx
+        # how many stems end exactly at this node
+        self.num_ended = 0
+        self.children: dict[str, StemTrieNode] = {}
 
-            # track if a regex fails: it can have some matches and then fail
-            failed = False
+    def is_number_prefix(self) -> bool:
+        """Every stem with this prefix continues with a digit."""
+        if self.num_ended > 0 or len(self.children) == 0:
+            return False
+        return all(c.isdecimal() for c in self.children)
 
-            for stem in stems:
-                stem_ch = stem[:num_kept_chars]
-                match = stem_re.match(stem)
 
-                # if the regex does not match but the stem prefix does, fails
-                if match is None and stem_ch == stem_might:
-                    failed = True
-                    break
+def find_chapter_files(zipped_file_paths: list[Path]) -> list[Path]:
+    """Find text chapters in epub.
 
-                good_match_num += 1
+    Look for the shortest prefix that is shared by at least two stems and
+    is always followed by a number, like `chapter` in `chapter12`, and sort
+    the matching chapters by that number.
+    A trie over the stems keeps this linear in the total stem length.
+    """
+    # check that we have some files
+    if len(zipped_file_paths) == 0:
+        lg.warning("No files to find from.")
+        return []
 
-            # if this stem failed to match, don't consider it for the best
-            if failed:
-                continue
+    # get the paths that are valid xhtml and similar
+    chap_file_paths = [f for f in zipped_file_paths if f.suffix in VALID_CHAP_EXT]
 
-            # update info on best matching regex
-            if good_match_num > best_match_num:
-                best_stem_re = stem_re
-                best_match_num = good_match_num
+    # stem gets the file name without extensions
+    stems = [f.stem for f in chap_file_paths]
 
-    # if the best match sucks keep all chapters
-    if best_match_num <= 2:
+    # with two chapters or less there is nothing to sort
+    if len(stems) <= 2:
         return chap_file_paths
 
-    # pair chapter name and chapter number by using the best regex
+    # build the trie of the stems, tracking how many stems share each depth
+    root = StemTrieNode(0, 0)
+    all_nodes = [root]
+    # whether at least two stems share a prefix of this length
+    shared_at_depth = [True]
+    # shortest stem that appears more than once
+    ended_count: Counter[str] = Counter()
+    for stem_idx, stem in enumerate(stems):
+        node = root
+        for char in stem:
+            child = node.children.get(char)
+            if child is None:
+                child = StemTrieNode(node.depth + 1, stem_idx)
+                node.children[char] = child
+                all_nodes.append(child)
+                if len(shared_at_depth) <= child.depth:
+                    shared_at_depth.append(False)
+            else:
+                shared_at_depth[child.depth] = True
+            node = child
+        node.num_ended += 1
+        ended_count[stem] += 1
+    dup_lens = [len(s) for s, c in ended_count.items() if c > 1]
+    min_dup_len = min(dup_lens, default=len(shared_at_depth))
+
+    # pick the shortest valid prefix, ties go to the first stem using it
+    best_node: StemTrieNode | None = None
+    for node in all_nodes:
+        # a depth is only considered if some prefix of that length is shared,
+        # identical shorter stems also count as shared
+        if not (shared_at_depth[node.depth] or node.depth > min_dup_len):
+            continue
+        if not node.is_number_prefix():
+            continue
+        if best_node is None or (node.depth, node.first_idx) < (
+            best_node.depth,
+            best_node.first_idx,
+        ):
+            best_node = node
+
+    # if no prefix is followed by a number keep all chapters
+    if best_node is None:
+        return chap_file_paths
+    prefix = stems[best_node.first_idx][: best_node.depth]
+
+    # pair chapter name and chapter number by using the best prefix
     chap_file_paths_id: list[tuple[Path, int]] = []
     for stem, chap_file_path in zip(stems, chap_file_paths):
-        # match the stem and get the chapter number
-        match = best_stem_re.match(stem)
-        if match is None:
+        if not stem.startswith(prefix):
             continue
-        chap_id = int(match.group(1))
+        num_end = len(prefix)
+        while num_end < len(stem) and stem[num_end].isdecimal():
+            num_end += 1
+        if num_end == len(prefix):
+            continue
+        chap_id = int(stem[len(prefix) : num_end])
         chap_file_paths_id.append((chap_file_path, chap_id))
 
     # sort the list according to the extracted id
@@ -94,9 +192,55 @@ def find_chapter_files(zipped_file_paths: list[Path]) -> list[Path]:
     return chap_file_paths
 
 
+def find_zip_chapter_files(input_zip: zipfile.ZipFile) -> list[Path]:
+    """Find the chapter files in an epub zip.
+
+    Use the OPF spine, falling back to the file name heuristic.
+    """
+    spine_fps = find_spine_files(input_zip)
+    if spine_fps is not None:
+        return spine_fps
+    # get the paths of the files in the zip
+    input_zip_fps = [Path(p) for p in input_zip.namelist()]
+    # find the files with the chapters
+    return find_chapter_files(input_zip_fps)
+
+
 def tag_to_str(tag: Tag) -> str:
     """Convert a tag to a string."""
-    tag_str = tag.text
+    return normalize_p_str(tag.text)
+
+
+def element_to_str(el: lxml.etree._Element) -> str:
+    """Convert an lxml element to a string, like tag_to_str on its soup.
+
+    The strings of the skipped tags are left out, and a whitespace only
+    string is collapsed to a newline or a space, as BeautifulSoup does.
+    """
+    parts: list[str] = []
+
+    def add(text: str | None, preserve: bool) -> None:
+        if not text:
+            return
+        if not preserve and text.strip(ASCII_SPACES) == "":
+            text = "\n" if "\n" in text else " "
+        parts.append(text)
+
+    def collect(el: lxml.etree._Element, preserve: bool) -> None:
+        preserve = preserve or el.tag in PRESERVE_WHITESPACE_TAGS
+        add(el.text, preserve)
+        for child in el:
+            # comments and processing instructions have no string tag
+            if isinstance(child.tag, str) and child.tag not in SKIPPED_TEXT_TAGS:
+                collect(child, preserve)
+            add(child.tail, preserve)
+
+    collect(el, False)
+    return normalize_p_str("".join(parts))
+
+
+def normalize_p_str(tag_str: str) -> str:
+    """Replace the newlines in the text of a paragraph with spaces."""
     tag_str = tag_str.replace("\n\r", " ")
     tag_str = tag_str.replace("\n", " ")
     tag_str = tag_str.replace("\r", " ")
@@ -109,3 +253,40 @@ def str_to_p_tag(tag_str: str) -> Tag:
     if p_tag is None:
         raise ValueError(f"Failed to convert {tag_str} to tag.")
     return p_tag
+
+
+def find_head(html: str | bytes) -> str | None:
+    """Find the head element of an html document, None if it has none."""
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    match = HEAD_RE.search(html)
+    return match.group(0) if match is not None else None
+
+
+def text_to_xhtml(text: str, title: str = "", head: str | None = None) -> str:
+    """Render the text of a chapter as an xhtml document, a paragraph per line.
+
+    The head of the source chapter can be given to keep its stylesheets,
+    otherwise a head with only the title is written.
+    """
+    pars_html = "\n".join(f"<p>{escape(p, quote=False)}</p>" for p in text.split("\n"))
+    if head is None:
+        head = f"<head><title>{escape(title, quote=False)}</title></head>"
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        "<!DOCTYPE html>\n"
+        '<html xmlns="http://www.w3.org/1999/xhtml">\n'
+        f"{head}\n"
+        f"<body>\n{pars_html}\n</body>\n"
+        "</html>\n"
+    )
+
+
+def hash_str(text: str) -> str:
+    """Get a stable content hash of a string."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hash_hashes(hashes: list[str]) -> str:
+    """Combine content hashes, in order, into a single hash."""
+    return hash_str("\n".join(hashes))
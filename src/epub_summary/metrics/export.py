@@ -0,0 +1,76 @@
+"""Export the pipeline metrics as json lines or Prometheus text."""
+
+from dataclasses import asdict
+import json
+from pathlib import Path
+import re
+from typing import TextIO
+
+from epub_summary.metrics.registry import MetricEvent, MetricsRegistry
+
+PROMETHEUS_PREFIX = "epub_summary_"
+
+
+def to_json_lines(registry: MetricsRegistry) -> str:
+    """Dump the aggregated metrics, one json object per line."""
+    lines = []
+    for (name, labels), metric in sorted(registry.values.items()):
+        entry = {"name": name, "labels": dict(labels), **asdict(metric)}
+        lines.append(json.dumps(entry))
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def prometheus_name(name: str) -> str:
+    """Convert a metric name to a valid Prometheus name."""
+    return PROMETHEUS_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def prometheus_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    """Format the labels of a Prometheus sample."""
+    if len(labels) == 0:
+        return ""
+    escaped = [(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def to_prometheus_text(registry: MetricsRegistry) -> str:
+    """Dump the aggregated metrics in the Prometheus text format.
+
+    Counters become `_total` counters, timings become summaries in seconds.
+    """
+    lines = []
+    typed_names: set[str] = set()
+    for (name, labels), metric in sorted(registry.values.items()):
+        label_str = prometheus_labels(labels)
+        if metric.kind == "counter":
+            prom_name = prometheus_name(name) + "_total"
+            if prom_name not in typed_names:
+                lines.append(f"# TYPE {prom_name} counter")
+                typed_names.add(prom_name)
+            lines.append(f"{prom_name}{label_str} {metric.total}")
+        else:
+            prom_name = prometheus_name(name) + "_seconds"
+            if prom_name not in typed_names:
+                lines.append(f"# TYPE {prom_name} summary")
+                typed_names.add(prom_name)
+            lines.append(f"{prom_name}_count{label_str} {metric.count}")
+            lines.append(f"{prom_name}_sum{label_str} {metric.total}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def write_prometheus_file(registry: MetricsRegistry, prom_fp: Path) -> None:
+    """Write the metrics to a file for the node exporter textfile collector."""
+    tmp_fp = prom_fp.with_suffix(prom_fp.suffix + ".tmp")
+    tmp_fp.write_text(to_prometheus_text(registry))
+    tmp_fp.replace(prom_fp)
+
+
+class JsonLinesSink:
+    """Sink writing every metric event as a json line."""
+
+    def __init__(self, stream: TextIO) -> None:
+        """Initialize the sink on an open text stream."""
+        self.stream = stream
+
+    def __call__(self, event: MetricEvent) -> None:
+        self.stream.write(json.dumps(asdict(event)) + "\n")
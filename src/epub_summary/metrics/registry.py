@@ -0,0 +1,113 @@
+"""Timings and counters for the load and revise pipeline.
+
+The registry aggregates the values in memory, cheap enough to leave on,
+and forwards every event to the registered sinks, if any.
+"""
+
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Literal
+
+MetricKind = Literal["counter", "timing"]
+LabelsKey = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class MetricEvent:
+    """A single recorded value."""
+
+    name: str
+    kind: MetricKind
+    value: float
+    labels: dict[str, str]
+    timestamp: float
+
+
+MetricSink = Callable[[MetricEvent], None]
+
+
+@dataclass
+class MetricValue:
+    """Aggregate of the values recorded for a metric."""
+
+    kind: MetricKind
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, value: float) -> None:
+        """Add a value to the aggregate."""
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+
+@dataclass
+class MetricsRegistry:
+    """Registry of the pipeline metrics."""
+
+    enabled: bool = True
+    values: dict[tuple[str, LabelsKey], MetricValue] = field(default_factory=dict)
+    sinks: list[MetricSink] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        """Create the lock guarding the values."""
+        self.lock = threading.Lock()
+
+    def record(self, name: str, kind: MetricKind, value: float, **labels: str) -> None:
+        """Record a value of a metric."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            metric = self.values.get(key)
+            if metric is None:
+                metric = self.values[key] = MetricValue(kind)
+            metric.add(value)
+        if len(self.sinks) > 0:
+            event = MetricEvent(name, kind, value, labels, time.time())
+            for sink in self.sinks:
+                sink(event)
+
+    def incr(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increment a counter."""
+        self.record(name, "counter", value, **labels)
+
+    def timing(self, name: str, seconds: float, **labels: str) -> None:
+        """Record a duration in seconds."""
+        self.record(name, "timing", seconds, **labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Time the body of the with block."""
+        if not self.enabled:
+            yield
+            return
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing(name, time.perf_counter() - t_start, **labels)
+
+    def add_sink(self, sink: MetricSink) -> None:
+        """Forward every recorded event to the sink."""
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink: MetricSink) -> None:
+        """Stop forwarding events to the sink."""
+        self.sinks.remove(sink)
+
+    def get(self, name: str, **labels: str) -> MetricValue | None:
+        """Get the aggregate of a metric."""
+        return self.values.get((name, tuple(sorted(labels.items()))))
+
+    def reset(self) -> None:
+        """Drop all the aggregated values."""
+        with self.lock:
+            self.values.clear()
+
+
+METRICS = MetricsRegistry()
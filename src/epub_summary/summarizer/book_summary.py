@@ -0,0 +1,239 @@
+"""Summary of a whole book, built by a parallel tree reduction.
+
+The chapters are summarized concurrently, then the summaries are combined
+fan_in at a time, level after level, up to a single summary of the book:
+the depth is log(chapters) requests instead of one per chapter for a
+rolling summary. A node is combined as soon as its own children are done.
+
+A chapter longer than the max_chunk_tokens of the reviser is split in
+chunks, which are summarized as leaves and reduced to the chapter node.
+
+Each node is keyed on the content hashes below it, like a Merkle tree, and
+the summaries are kept by key: when a chapter changes, only the nodes on
+its path to the root are summarized again.
+"""
+
+import asyncio
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate
+from pydantic import BaseModel, Field
+
+from epub_summary.epubber.epub import Epub, EpubChapter
+from epub_summary.epubber.utils import hash_hashes, hash_str
+from epub_summary.metrics.registry import METRICS
+from epub_summary.summarizer.chunker import ChapterChunk, chunk_chapter, chunk_text
+from epub_summary.summarizer.reviser import ChapterReviser
+
+
+class PartSummary(BaseModel):
+    """Summary of a part of a book."""
+
+    summary: str = Field(..., description="The summary of the part of the book.")
+
+
+chapter_summary_template = """You are a book editor. \
+You have a chapter to summarize. \
+Keep the events, the characters and the details needed to follow the story. \
+
+The chapter is: {chapter}
+"""
+chapter_summary_prompt = ChatPromptTemplate(
+    [SystemMessagePromptTemplate.from_template(chapter_summary_template)]
+)
+
+combined_summary_template = """You are a book editor. \
+You have the summaries of {num_parts} consecutive parts of a book, in order. \
+Combine them into a single summary of the whole, as long as one of them. \
+Keep the events, the characters and the details needed to follow the story. \
+
+The summaries are:
+
+{summaries}
+"""
+combined_summary_prompt = ChatPromptTemplate(
+    [SystemMessagePromptTemplate.from_template(combined_summary_template)]
+)
+
+
+@dataclass
+class SummaryNode:
+    """Summary of a range of chapters, a node of the reduction tree."""
+
+    key: str
+    summary: str
+    first: int
+    """Index of the first chapter summarized."""
+    last: int
+    """Index after the last chapter summarized."""
+    children: list["SummaryNode"] = field(default_factory=list)
+
+    @property
+    def depth(self) -> int:
+        """Get the number of levels of the tree below and including the node."""
+        return 1 + max((child.depth for child in self.children), default=0)
+
+
+@dataclass
+class BookSummary:
+    """Summary of a book, with the tree of the partial summaries."""
+
+    root: SummaryNode
+
+    @property
+    def summary(self) -> str:
+        """Get the summary of the whole book."""
+        return self.root.summary
+
+    def get_level(self, level: int) -> list[SummaryNode]:
+        """Get the nodes at a distance from the root, in order."""
+        nodes = [self.root]
+        for _ in range(level):
+            nodes = [child for node in nodes for child in node.children]
+        return nodes
+
+    @property
+    def chapter_summaries(self) -> list[str]:
+        """Get the summary of each chapter, from the highest node covering it alone."""
+        summaries: list[str] = []
+        nodes = [self.root]
+        while len(nodes) > 0:
+            node = nodes.pop()
+            if node.last - node.first == 1:
+                summaries.append(node.summary)
+            else:
+                nodes.extend(reversed(node.children))
+        return summaries
+
+
+@dataclass
+class BookSummarizer:
+    """Summarize a book with a tree reduction of the chapter summaries.
+
+    The requests go through the reviser, sharing its limits, its client and
+    its disk cache, if any.
+    """
+
+    reviser: ChapterReviser
+    fan_in: int = 2
+    """Summaries combined in each request."""
+    summaries: dict[str, str] = field(default_factory=dict, repr=False)
+    """The summary of every node seen, by key."""
+
+    def __post_init__(self) -> None:
+        """Build the summary chains on the model of the reviser."""
+        if self.fan_in < 2:
+            raise ValueError(f"The fan in must be at least 2, got {self.fan_in}.")
+        summary_llm = self.reviser.model.with_structured_output(PartSummary)
+        self.chapter_chain = chapter_summary_prompt | summary_llm
+        self.combined_chain = combined_summary_prompt | summary_llm
+
+    def get_chunks(self, chapter: EpubChapter | str) -> list[ChapterChunk]:
+        """Split a chapter in the chunks of the reviser, if it is long."""
+        max_tokens = self.reviser.max_chunk_tokens
+        if max_tokens is None:
+            return []
+        count_fn = self.reviser.count_tokens
+        if isinstance(chapter, str):
+            return chunk_text(chapter, max_tokens, count_fn=count_fn)
+        return chunk_chapter(chapter, max_tokens, count_fn=count_fn)
+
+    async def asummarize_chapter(
+        self,
+        index: int,
+        chapter: EpubChapter | str,
+    ) -> SummaryNode:
+        """Summarize a chapter, a leaf of the tree or the root of its chunks."""
+        chunks = self.get_chunks(chapter)
+        if len(chunks) > 1:
+            leaves = [
+                asyncio.create_task(
+                    self.asummarize_leaf(index, chunk.text, hash_str(chunk.text))
+                )
+                for chunk in chunks
+            ]
+            return await self.areduce(leaves)
+        if isinstance(chapter, str):
+            return await self.asummarize_leaf(index, chapter, hash_str(chapter))
+        return await self.asummarize_leaf(index, chapter.text, chapter.content_hash)
+
+    async def asummarize_leaf(self, index: int, text: str, key: str) -> SummaryNode:
+        """Summarize a chapter or a chunk of one, a leaf of the tree."""
+        if key not in self.summaries:
+            if text.strip() == "":
+                self.summaries[key] = ""
+            else:
+                output = await self.reviser.arun_chain(
+                    self.chapter_chain,
+                    chapter_summary_template,
+                    {"chapter": text},
+                    PartSummary,
+                )
+                METRICS.incr("summary.nodes_computed")
+                self.summaries[key] = output.summary
+        else:
+            METRICS.incr("summary.nodes_reused")
+        return SummaryNode(key, self.summaries[key], index, index + 1)
+
+    async def acombine(self, child_tasks: list[asyncio.Task]) -> SummaryNode:
+        """Combine the summaries of consecutive nodes, once they are done."""
+        children: list[SummaryNode] = await asyncio.gather(*child_tasks)
+        key = hash_hashes([child.key for child in children])
+        if key not in self.summaries:
+            parts = [child.summary for child in children if child.summary != ""]
+            if len(parts) <= 1:
+                # nothing to combine, carry the summary up
+                self.summaries[key] = "".join(parts)
+            else:
+                summaries = "\n\n".join(
+                    f"Part {i}:\n{part}" for i, part in enumerate(parts, 1)
+                )
+                output = await self.reviser.arun_chain(
+                    self.combined_chain,
+                    combined_summary_template,
+                    {"num_parts": len(parts), "summaries": summaries},
+                    PartSummary,
+                )
+                METRICS.incr("summary.nodes_computed")
+                self.summaries[key] = output.summary
+        else:
+            METRICS.incr("summary.nodes_reused")
+        return SummaryNode(
+            key, self.summaries[key], children[0].first, children[-1].last, children
+        )
+
+    async def areduce(self, tasks: list[asyncio.Task]) -> SummaryNode:
+        """Combine the nodes of the tasks level after level, up to a root."""
+        tasks = list(tasks)
+        level = tasks
+        while len(level) > 1:
+            level = [
+                asyncio.create_task(self.acombine(level[i : i + self.fan_in]))
+                for i in range(0, len(level), self.fan_in)
+            ]
+            tasks.extend(level)
+        try:
+            return await level[0]
+        finally:
+            # a failed node leaves the rest of the tree pending
+            for task in tasks:
+                task.cancel()
+
+    async def asummarize(self, chapters: Sequence[EpubChapter | str]) -> BookSummary:
+        """Summarize the chapters, then reduce the summaries to the root."""
+        if len(chapters) == 0:
+            raise ValueError("No chapters to summarize.")
+        tasks = [
+            asyncio.create_task(self.asummarize_chapter(i, chapter))
+            for i, chapter in enumerate(chapters)
+        ]
+        return BookSummary(await self.areduce(tasks))
+
+    async def asummarize_book(self, epub: Epub) -> BookSummary:
+        """Summarize all the chapters of a book."""
+        return await self.asummarize(list(epub.chapters))
+
+    def summarize(self, chapters: Sequence[EpubChapter | str]) -> BookSummary:
+        """Summarize the chapters, from sync code."""
+        return asyncio.run(self.asummarize(chapters))
@@ -0,0 +1,95 @@
+"""Split chapters into chunks that fit a token budget.
+
+The chunks follow the section and paragraph boundaries of the chapter,
+so that they can be revised independently and stitched back in order.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable
+
+from epub_summary.epubber.epub import EpubChapter
+from epub_summary.summarizer.tokens import estimate_tokens
+
+
+@dataclass
+class ChapterChunk:
+    """Consecutive paragraphs of a chapter, revised in one request."""
+
+    index: int
+    paragraphs: list[str] = field(default_factory=list)
+    context: str = ""
+    """Text preceding the chunk, given to the model for continuity only."""
+
+    @property
+    def text(self) -> str:
+        """Get the text of the chunk."""
+        return "\n".join(self.paragraphs)
+
+
+def chunk_sections(
+    sections: list[list[str]],
+    max_tokens: int,
+    overlap_paragraphs: int = 0,
+    count_fn: Callable[[str], int] = estimate_tokens,
+) -> list[ChapterChunk]:
+    """Pack the paragraphs of the sections in chunks under max_tokens.
+
+    A section that fits in the budget is never split, a chunk that would
+    overflow is closed at the section boundary instead. A single paragraph
+    larger than the budget gets a chunk of its own.
+    The last overlap_paragraphs paragraphs of each chunk are the context
+    of the next one.
+    """
+    chunks: list[ChapterChunk] = []
+    current: list[str] = []
+    current_tokens = 0
+
+    def close_chunk() -> None:
+        nonlocal current, current_tokens
+        if len(current) == 0:
+            return
+        chunks.append(ChapterChunk(len(chunks), current))
+        current = []
+        current_tokens = 0
+
+    for paragraphs in sections:
+        pars_tokens = [count_fn(p) + 1 for p in paragraphs]
+        section_tokens = sum(pars_tokens)
+        # keep the section whole if it fits in a fresh chunk
+        if (
+            current_tokens + section_tokens > max_tokens
+            and section_tokens <= max_tokens
+        ):
+            close_chunk()
+        for par, par_tokens in zip(paragraphs, pars_tokens):
+            if current_tokens + par_tokens > max_tokens:
+                close_chunk()
+            current.append(par)
+            current_tokens += par_tokens
+    close_chunk()
+
+    if overlap_paragraphs > 0:
+        for prev_chunk, chunk in zip(chunks, chunks[1:]):
+            chunk.context = "\n".join(prev_chunk.paragraphs[-overlap_paragraphs:])
+    return chunks
+
+
+def chunk_chapter(
+    chapter: EpubChapter,
+    max_tokens: int,
+    overlap_paragraphs: int = 0,
+    count_fn: Callable[[str], int] = estimate_tokens,
+) -> list[ChapterChunk]:
+    """Split a chapter in chunks along its sections and paragraphs."""
+    sections = [[p.p_str for p in s.paragraphs] for s in chapter.sections]
+    return chunk_sections(sections, max_tokens, overlap_paragraphs, count_fn)
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int,
+    overlap_paragraphs: int = 0,
+    count_fn: Callable[[str], int] = estimate_tokens,
+) -> list[ChapterChunk]:
+    """Split a chapter text in chunks along its lines."""
+    return chunk_sections([text.split("\n")], max_tokens, overlap_paragraphs, count_fn)
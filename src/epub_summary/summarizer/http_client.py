@@ -0,0 +1,73 @@
+"""Async HTTP client of the chat model, with a connection pool per event loop.
+
+The connections of an httpx.AsyncClient belong to the loop they were
+opened on, and the sync entry points run each batch on a new loop with
+asyncio.run. The shared client sends each request through a transport
+made for the running loop, like the condition of the AimdLimiter.
+A transport is closed on its own loop when the loop shuts down its async
+generators, as asyncio.run does before closing it, so the connections of
+a finished batch are not leaked.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+import weakref
+
+import httpx
+
+
+async def close_on_shutdown(transport: httpx.AsyncBaseTransport) -> AsyncIterator[None]:
+    """Close the transport when the loop closes this generator, on its shutdown."""
+    try:
+        yield
+    finally:
+        await transport.aclose()
+
+
+class LoopTransport(httpx.AsyncBaseTransport):
+    """Transport sending each request on a connection pool of the running loop."""
+
+    def __init__(self, limits: httpx.Limits | None = None) -> None:
+        """Initialize the transport, the pools are made on first use in a loop."""
+        self.limits = limits or httpx.Limits()
+        self.transports: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport
+        ] = weakref.WeakKeyDictionary()
+        self.closers: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, AsyncIterator[None]
+        ] = weakref.WeakKeyDictionary()
+
+    async def get_transport(self) -> httpx.AsyncHTTPTransport:
+        """Get the pool of the running loop, a new one on a new loop."""
+        loop = asyncio.get_running_loop()
+        transport = self.transports.get(loop)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(limits=self.limits)
+            closer = close_on_shutdown(transport)
+            self.transports[loop] = transport
+            self.closers[loop] = closer
+            # started on the loop, so that its shutdown closes it
+            await anext(closer)
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = await self.get_transport()
+        return await transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Close the pool of the running loop."""
+        loop = asyncio.get_running_loop()
+        self.transports.pop(loop, None)
+        closer = self.closers.pop(loop, None)
+        if closer is not None:
+            await closer.aclose()
+
+
+class LoopAsyncClient(httpx.AsyncClient):
+    """AsyncClient sending each request on a pool of the running loop."""
+
+    def __init__(self, limits: httpx.Limits | None = None, **kwargs: Any) -> None:
+        """Initialize the client, the limits are those of each pool."""
+        self.loop_transport = LoopTransport(limits)
+        super().__init__(transport=self.loop_transport, **kwargs)
@@ -0,0 +1,180 @@
+"""Persistent content-addressed cache for the LLM outputs.
+
+The outputs are stored as json in a sqlite database, which handles the
+locking when several worker processes share the same cache file.
+The async methods run the queries in a worker thread, off the event loop.
+"""
+
+import asyncio
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, TypeVar
+
+from loguru import logger as lg
+from pydantic import BaseModel
+
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.config.epub_summary_config import get_epub_summary_paths
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# bump to invalidate all the cached entries
+CACHE_VERSION = 1
+
+
+def make_llm_cache_key(
+    rendered_prompt: str, chat_openai_config: ChatOpenAIConfig
+) -> str:
+    """Hash the prompt and the model settings into a cache key."""
+    key_data = {
+        "version": CACHE_VERSION,
+        "model": chat_openai_config.model,
+        "temperature": chat_openai_config.temperature,
+        "prompt": rendered_prompt,
+    }
+    key_str = json.dumps(key_data, sort_keys=True)
+    return hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+
+
+def make_llm_fingerprint(
+    templates: Sequence[str],
+    chat_openai_config: ChatOpenAIConfig,
+    settings: Mapping[str, Any] | None = None,
+) -> str:
+    """Hash the prompt templates and the settings of the outputs.
+
+    The settings are those, beyond the model, that change the outputs, like
+    the chunk sizes. Outputs with the same fingerprint were produced the
+    same way, and can be reused for the same input.
+    """
+    fingerprint_data = {
+        "version": CACHE_VERSION,
+        "model": chat_openai_config.model,
+        "temperature": chat_openai_config.temperature,
+        "templates": list(templates),
+        "settings": dict(settings or {}),
+    }
+    fingerprint_str = json.dumps(fingerprint_data, sort_keys=True)
+    return hashlib.sha256(fingerprint_str.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class LlmCache:
+    """Disk cache of LLM structured outputs, with size and age based eviction."""
+
+    cache_fp: Path | None = None
+    """Path of the sqlite file, defaults to the project cache folder."""
+    max_bytes: int | None = 512 * 2**20
+    """Maximum total size of the stored outputs."""
+    max_age_seconds: float | None = None
+    """Entries older than this are evicted."""
+    evict_every: int = 64
+    """Run the eviction every this many writes."""
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        """Open the database and create the table."""
+        if self.cache_fp is None:
+            self.cache_fp = get_epub_summary_paths().cache_fol / "llm_cache.sqlite"
+        self.cache_fp.parent.mkdir(parents=True, exist_ok=True)
+        self.puts_since_evict = 0
+        # shared by the worker threads of the async methods, one query at a time
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            self.cache_fp, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+
+    def get(self, key: str, model_cls: type[ModelT]) -> ModelT | None:
+        """Get a cached output, None on a miss."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM outputs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self.is_expired(row[1]):
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE outputs SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+        return model_cls.model_validate_json(row[0])
+
+    def put(self, key: str, output: BaseModel) -> None:
+        """Store an output."""
+        value = output.model_dump_json()
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self.puts_since_evict += 1
+            if self.puts_since_evict >= self.evict_every:
+                self.evict()
+
+    async def aget(self, key: str, model_cls: type[ModelT]) -> ModelT | None:
+        """Get a cached output without blocking the event loop."""
+        return await asyncio.to_thread(self.get, key, model_cls)
+
+    async def aput(self, key: str, output: BaseModel) -> None:
+        """Store an output without blocking the event loop."""
+        await asyncio.to_thread(self.put, key, output)
+
+    def is_expired(self, created: float) -> bool:
+        """Whether an entry created at this time is too old."""
+        if self.max_age_seconds is None:
+            return False
+        return time.time() - created > self.max_age_seconds
+
+    def evict(self) -> None:
+        """Drop the expired entries, then the least recently used over size."""
+        with self.lock:
+            self.puts_since_evict = 0
+            if self.max_age_seconds is not None:
+                oldest = time.time() - self.max_age_seconds
+                self.conn.execute("DELETE FROM outputs WHERE created < ?", (oldest,))
+            if self.max_bytes is None:
+                return
+            total_bytes = self.total_bytes()
+            if total_bytes <= self.max_bytes:
+                return
+            rows = self.conn.execute("SELECT key, size FROM outputs ORDER BY accessed")
+            evicted_keys = []
+            for key, size in rows.fetchall():
+                if total_bytes <= self.max_bytes:
+                    break
+                evicted_keys.append((key,))
+                total_bytes -= size
+            self.conn.executemany("DELETE FROM outputs WHERE key = ?", evicted_keys)
+            lg.debug(f"Evicted {len(evicted_keys)} outputs from the cache.")
+
+    def total_bytes(self) -> int:
+        """Total size of the stored outputs."""
+        with self.lock:
+            query = "SELECT COALESCE(SUM(size), 0) FROM outputs"
+            return self.conn.execute(query).fetchone()[0]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outputs").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,312 @@
+"""Shared client of the chat model, with adaptive concurrency and retries.
+
+All the revisers built on the same ChatOpenAIConfig share one LlmClient:
+one pool of HTTP connections, and one concurrency limit adapted to the
+server with AIMD, an additive increase on each success and a
+multiplicative decrease on rate limit errors.
+Failed requests are retried with jittered exponential backoff, honoring
+the Retry-After header, each attempt is bounded by a timeout, and a slow
+request can be hedged with a second copy.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+import json
+import random
+import time
+from typing import TYPE_CHECKING, TypeVar
+
+from loguru import logger as lg
+
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.metrics.registry import METRICS
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+
+T = TypeVar("T")
+
+# the server is overloaded or had a transient failure
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def get_status_code(error: BaseException) -> int | None:
+    """Get the HTTP status code of an API error, if any."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    """Check if an error is a rate limit error."""
+    return get_status_code(error) == 429
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Check if a request failing with an error can be retried."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    # openai is already loaded if one of its errors was raised
+    import openai
+
+    return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+def get_retry_after(error: BaseException) -> float | None:
+    """Get the delay asked by the server in the Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter."""
+
+    max_retries: int = 4
+    base_delay_s: float = 0.5
+    max_delay_s: float = 30.0
+
+    def get_delay(self, attempt: int, error: BaseException | None = None) -> float:
+        """Get the delay before the retry following a failed attempt."""
+        retry_after = get_retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay_s)
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2**attempt))
+
+
+class AimdLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease.
+
+    Each success raises the limit by `increase` per limit's worth of
+    requests, so by about one per round trip, and a rate limit error cuts
+    it by `decrease`. Only one cut is made per window of requests: those
+    started before the last cut do not cut it again.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+    ) -> None:
+        """Initialize the limiter."""
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.epoch = 0
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.condition: asyncio.Condition | None = None
+
+    def get_condition(self) -> asyncio.Condition:
+        """Get the condition of the running loop, the count starts over on a new one."""
+        loop = asyncio.get_running_loop()
+        if self.condition is None or self.loop is not loop:
+            self.loop = loop
+            self.condition = asyncio.Condition()
+            self.in_flight = 0
+        return self.condition
+
+    async def acquire(self) -> int:
+        """Wait for a free slot, return the current window."""
+        condition = self.get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self.epoch
+
+    def try_acquire(self) -> int | None:
+        """Take a free slot without waiting, None if there is none."""
+        self.get_condition()
+        if self.in_flight >= int(self.limit):
+            return None
+        self.in_flight += 1
+        return self.epoch
+
+    async def release(self) -> None:
+        """Free a slot."""
+        condition = self.get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def on_success(self) -> None:
+        """Ramp the limit up."""
+        self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+    def on_overload(self, epoch: int) -> None:
+        """Back the limit off, once per window."""
+        if epoch < self.epoch:
+            return
+        self.epoch += 1
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        lg.debug(f"Rate limited, concurrency limit down to {self.limit:.1f}")
+
+
+class LlmClient:
+    """Client of the chat model shared by the revisers of a config."""
+
+    def __init__(self, config: ChatOpenAIConfig) -> None:
+        """Initialize the client, the chat model is built on first use."""
+        self.config = config
+        self.retry_policy = RetryPolicy(
+            config.max_retries, config.retry_base_delay_s, config.retry_max_delay_s
+        )
+        self.limiter = AimdLimiter(
+            config.initial_concurrency, config.min_concurrency, config.max_concurrency
+        )
+        self.chat_model: "BaseChatModel | None" = None
+
+    def get_chat_model(self) -> "BaseChatModel":
+        """Get the ChatOpenAI model, on the shared connection pool."""
+        if self.chat_model is None:
+            # langchain_openai is slow to import, only load it when needed
+            import httpx
+            from langchain_openai import ChatOpenAI
+
+            from epub_summary.summarizer.http_client import LoopAsyncClient
+
+            c = self.config
+            limits = httpx.Limits(
+                max_connections=c.max_connections,
+                max_keepalive_connections=c.max_connections,
+            )
+            # the retries are done here, with the adaptive concurrency
+            self.chat_model = ChatOpenAI(
+                model=c.model,
+                temperature=c.temperature,
+                api_key=c.api_key,
+                base_url=c.base_url,
+                timeout=c.timeout_s,
+                max_retries=0,
+                http_client=httpx.Client(limits=limits, timeout=c.timeout_s),
+                http_async_client=LoopAsyncClient(limits=limits, timeout=c.timeout_s),
+            )
+        return self.chat_model
+
+    async def call_once(
+        self,
+        make_call: Callable[[], Awaitable[T]],
+        bounded: bool = True,
+    ) -> T:
+        """Make one attempt, bounded by the timeout unless told otherwise."""
+        if not bounded:
+            return await make_call()
+        return await asyncio.wait_for(make_call(), self.config.timeout_s)
+
+    async def call_hedged(self, make_call: Callable[[], Awaitable[T]]) -> T:
+        """Make one attempt, hedged by a second copy if it is slow."""
+        hedge_after_s = self.config.hedge_after_s
+        if hedge_after_s is None:
+            return await self.call_once(make_call)
+        first = asyncio.ensure_future(self.call_once(make_call))
+        done, _ = await asyncio.wait({first}, timeout=hedge_after_s)
+        if first in done or self.limiter.try_acquire() is None:
+            # done, or no spare concurrency to hedge with
+            return await first
+        METRICS.incr("llm.hedged")
+        second = asyncio.ensure_future(self.call_once(make_call))
+        pending = {first, second}
+        try:
+            while len(pending) > 0:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # both copies failed
+            return first.result()
+        finally:
+            first.cancel()
+            second.cancel()
+            await self.limiter.release()
+
+    async def arun(
+        self,
+        make_call: Callable[[], Awaitable[T]],
+        hedge: bool = True,
+        bounded: bool = True,
+    ) -> T:
+        """Run a request within the adaptive limit, retrying transient errors.
+
+        Without hedge, a single attempt runs at a time, for calls with side
+        effects like streaming. Without bounded, the duration of an attempt
+        is not limited, for calls timing out on their own like streaming.
+        """
+        attempt = 0
+        while True:
+            epoch = await self.limiter.acquire()
+            try:
+                if hedge:
+                    result = await self.call_hedged(make_call)
+                else:
+                    result = await self.call_once(make_call, bounded)
+            except Exception as e:
+                if is_rate_limit(e):
+                    METRICS.incr("llm.rate_limited")
+                    self.limiter.on_overload(epoch)
+                if attempt >= self.retry_policy.max_retries or not is_retryable(e):
+                    raise
+                error = e
+            else:
+                self.limiter.on_success()
+                return result
+            finally:
+                await self.limiter.release()
+            delay = self.retry_policy.get_delay(attempt, error)
+            lg.debug(f"Retrying in {delay:.2f}s after {error!r}")
+            METRICS.incr("llm.retries")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def run(self, make_call: Callable[[], T]) -> T:
+        """Run a request from sync code, retrying transient errors."""
+        attempt = 0
+        while True:
+            try:
+                return make_call()
+            except Exception as e:
+                if attempt >= self.retry_policy.max_retries or not is_retryable(e):
+                    raise
+                delay = self.retry_policy.get_delay(attempt, e)
+            lg.debug(f"Retrying in {delay:.2f}s")
+            METRICS.incr("llm.retries")
+            time.sleep(delay)
+            attempt += 1
+
+
+# the clients shared by the revisers, by config
+LLM_CLIENTS: dict[str, LlmClient] = {}
+
+
+def get_config_key(config: ChatOpenAIConfig) -> str:
+    """Get a key of the config, with the api key in clear."""
+    data = config.model_dump()
+    if config.api_key is not None:
+        data["api_key"] = config.api_key.get_secret_value()
+    return json.dumps(data, sort_keys=True)
+
+
+def get_llm_client(config: ChatOpenAIConfig) -> LlmClient:
+    """Get the client shared by all the revisers with the same config."""
+    key = get_config_key(config)
+    if key not in LLM_CLIENTS:
+        LLM_CLIENTS[key] = LlmClient(config)
+    return LLM_CLIENTS[key]
@@ -0,0 +1,45 @@
+"""LangChain callback recording the LLM token usage in the metrics."""
+
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from epub_summary.metrics.registry import METRICS
+
+
+class LlmMetricsCallback(BaseCallbackHandler):
+    """Record tokens, errors and retries of the LLM calls."""
+
+    run_inline = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        """Record the token usage of a call."""
+        prompt_tokens = 0
+        completion_tokens = 0
+        for generations in response.generations:
+            for gen in generations:
+                if not isinstance(gen, ChatGeneration):
+                    continue
+                usage = getattr(gen.message, "usage_metadata", None)
+                if usage is None:
+                    continue
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if prompt_tokens == 0 and response.llm_output is not None:
+            token_usage = response.llm_output.get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+        METRICS.incr("llm.prompt_tokens", prompt_tokens)
+        METRICS.incr("llm.completion_tokens", completion_tokens)
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        """Count a failed call."""
+        METRICS.incr("llm.errors", error=type(error).__name__)
+
+    def on_retry(self, retry_state: Any, **kwargs: Any) -> None:
+        """Count a retried call."""
+        METRICS.incr("llm.retries")
+
+
+LLM_METRICS_CALLBACK = LlmMetricsCallback()
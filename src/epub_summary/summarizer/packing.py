@@ -0,0 +1,62 @@
+"""Packing of consecutive short chapters into a single request.
+
+Front matter, interludes and epilogues are often a few hundred words, and
+revising each one on its own costs a full round trip. The planner groups
+consecutive chapters up to a token budget, and the packed chapters are
+revised in one structured call returning a revision per chapter.
+"""
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+import re
+
+from epub_summary.summarizer.tokens import estimate_tokens
+
+# the chapters of a packed prompt are wrapped in numbered tags
+PACKED_CHAPTER_RE = re.compile(r"<chapter (\d+)>\n(.*?)\n</chapter \1>", re.DOTALL)
+
+
+@dataclass
+class ChapterPack:
+    """Consecutive chapters revised in one request."""
+
+    indexes: list[int] = field(default_factory=list)
+    tokens: int = 0
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+
+def plan_packs(
+    texts: Sequence[str],
+    max_pack_tokens: int,
+    count_fn: Callable[[str], int] = estimate_tokens,
+) -> list[ChapterPack]:
+    """Group consecutive chapters in packs of at most max_pack_tokens.
+
+    A chapter over the budget is left alone in its pack.
+    """
+    packs: list[ChapterPack] = []
+    current = ChapterPack()
+    for index, text in enumerate(texts):
+        tokens = count_fn(text)
+        if len(current) > 0 and current.tokens + tokens > max_pack_tokens:
+            packs.append(current)
+            current = ChapterPack()
+        current.indexes.append(index)
+        current.tokens += tokens
+    if len(current) > 0:
+        packs.append(current)
+    return packs
+
+
+def format_packed_chapters(texts: Sequence[str]) -> str:
+    """Join the chapters of a pack, each wrapped in numbered tags."""
+    return "\n\n".join(
+        f"<chapter {i}>\n{text}\n</chapter {i}>" for i, text in enumerate(texts, 1)
+    )
+
+
+def split_packed_chapters(packed: str) -> list[str]:
+    """Split a packed prompt back into the chapters."""
+    return [text for _, text in PACKED_CHAPTER_RE.findall(packed)]
@@ -0,0 +1,73 @@
+"""Async rate limiting for the LLM calls."""
+
+import asyncio
+from dataclasses import dataclass, field
+import time
+
+
+@dataclass
+class TokenBucket:
+    """Token bucket refilled continuously up to a per minute capacity."""
+
+    per_minute: float
+
+    def __post_init__(self) -> None:
+        """Start with a full bucket."""
+        self.capacity = self.per_minute
+        self.level = self.per_minute
+        self.last_refill = time.monotonic()
+
+    def refill(self) -> None:
+        """Add the tokens accumulated since the last refill."""
+        now = time.monotonic()
+        self.level = min(
+            self.capacity,
+            self.level + (now - self.last_refill) * self.per_minute / 60,
+        )
+        self.last_refill = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds to wait until amount tokens are available."""
+        self.refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def consume(self, amount: float) -> None:
+        """Take amount tokens from the bucket."""
+        self.level -= min(amount, self.capacity)
+
+
+@dataclass
+class AsyncRateLimiter:
+    """Limit requests and tokens per minute across concurrent tasks.
+
+    A limit set to None is not enforced.
+    """
+
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
+
+    def __post_init__(self) -> None:
+        """Create the buckets for the enabled limits."""
+        self.buckets: list[tuple[TokenBucket, bool]] = []
+        if self.requests_per_minute is not None:
+            self.buckets.append((TokenBucket(self.requests_per_minute), False))
+        if self.tokens_per_minute is not None:
+            self.buckets.append((TokenBucket(self.tokens_per_minute), True))
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait until a request of tokens tokens fits in the limits."""
+        if len(self.buckets) == 0:
+            return
+        # the lock keeps the waiting tasks in order
+        async with self.lock:
+            while True:
+                wait_time = max(
+                    b.wait_time(tokens if is_tok else 1) for b, is_tok in self.buckets
+                )
+                if wait_time <= 0:
+                    break
+                await asyncio.sleep(wait_time)
+            for bucket, is_tok in self.buckets:
+                bucket.consume(tokens if is_tok else 1)
@@ -1,12 +1,45 @@
 """Prompt and response generation for the summarizer."""
 
-from dataclasses import dataclass
+import asyncio
+from collections.abc import AsyncIterator, Callable, Mapping, Sequence
+from dataclasses import dataclass, field
+import time
+from typing import Any, TypeVar
 
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableConfig
+from langchain_core.utils.json import parse_json_markdown
+from loguru import logger as lg
 from pydantic import BaseModel, Field
 
 from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.epubber.boilerplate import BoilerplateFilter
+from epub_summary.epubber.epub import Epub, EpubChapter
+from epub_summary.metrics.registry import METRICS
+from epub_summary.summarizer.chunker import ChapterChunk, chunk_chapter, chunk_text
+from epub_summary.summarizer.llm_cache import (
+    LlmCache,
+    make_llm_cache_key,
+    make_llm_fingerprint,
+)
+from epub_summary.summarizer.llm_client import get_llm_client
+from epub_summary.summarizer.llm_metrics import LLM_METRICS_CALLBACK
+from epub_summary.summarizer.packing import (
+    ChapterPack,
+    format_packed_chapters,
+    plan_packs,
+)
+from epub_summary.summarizer.rate_limit import AsyncRateLimiter
+from epub_summary.summarizer.streaming import (
+    AsyncIteratorSink,
+    CallbackSink,
+    PartialFieldReader,
+    RevisionSink,
+    StreamInterruptedError,
+    aiter_with_timeout,
+)
+from epub_summary.summarizer.tokens import estimate_tokens, get_token_counter
 
 
 class ChapterRevised(BaseModel):
@@ -16,6 +49,14 @@ class ChapterRevised(BaseModel):
     revised_chapter: str = Field(..., description="The revised chapter.")
 
 
+class ChaptersRevised(BaseModel):
+    """Revised chapters of a book, one per original chapter, in order."""
+
+    revised_chapters: list[ChapterRevised] = Field(
+        ..., description="The revised chapters, in the same order as the originals."
+    )
+
+
 # You need to shorten the chapter roughly by half. \
 # Remove on the nose narration, and improve the overall quality of the prose, as would a book editor. \
 
@@ -32,22 +73,432 @@ chapter_revised_prompt = ChatPromptTemplate(
     [SystemMessagePromptTemplate.from_template(chapter_revised_template)]
 )
 
+chunk_revised_template = """You are a book editor. \
+You have a part of a chapter to revise. \
+Maintain all the pertinent details to be able to follow the story. \
+Improve the overall quality of the prose, and remove on the nose narration, as would a book editor. \
+Only revise the part, the preceding text is given as context and must not be repeated. \
+
+The preceding text is: {previous_context}
+
+The part of the chapter to revise is: {original_chapter}
+"""
+chunk_revised_prompt = ChatPromptTemplate(
+    [SystemMessagePromptTemplate.from_template(chunk_revised_template)]
+)
+
+packed_revised_template = """You are a book editor. \
+You have {num_chapters} short chapters to revise. \
+Maintain all the pertinent details to be able to follow the story. \
+Improve the overall quality of the prose, and remove on the nose narration, as would a book editor. \
+Revise each chapter on its own, and return exactly one revised chapter per original chapter, in the same order. \
+
+The original chapters are:
+
+{original_chapters}
+"""
+packed_revised_prompt = ChatPromptTemplate(
+    [SystemMessagePromptTemplate.from_template(packed_revised_template)]
+)
+
+OutputT = TypeVar("OutputT", bound=BaseModel)
+
+# record the token usage of every call
+LLM_RUN_CONFIG = RunnableConfig(callbacks=[LLM_METRICS_CALLBACK])
+
+
+@dataclass
+class ChapterRevisionResult:
+    """Outcome of revising one chapter of a batch."""
+
+    index: int
+    revised: ChapterRevised | None = None
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether the chapter was revised."""
+        return self.revised is not None
+
 
 @dataclass
 class ChapterReviser:
     """Pick a revised chapter."""
 
     chat_openai_config: ChatOpenAIConfig
+    max_concurrency: int = 8
+    """Maximum number of LLM requests running at the same time."""
+    requests_per_minute: float | None = None
+    """Maximum number of LLM requests per minute."""
+    tokens_per_minute: float | None = None
+    """Maximum number of prompt tokens per minute, estimated locally."""
+    cache: LlmCache | None = None
+    """Disk cache of the revisions, keyed on the prompt and the model."""
+    max_chunk_tokens: int | None = 4000
+    """Longer chapters are revised in chunks of this many tokens, None to disable."""
+    chunk_overlap_paragraphs: int = 0
+    """Paragraphs of the previous chunk given as context to the next one."""
+    max_pack_tokens: int | None = None
+    """Consecutive short chapters are revised in one request of up to this
+    many tokens, None to revise each chapter on its own."""
+    chat_model: BaseChatModel | None = None
+    """Chat model to use instead of a ChatOpenAI built from the config."""
+    limits_loop: asyncio.AbstractEventLoop | None = field(
+        default=None, init=False, repr=False
+    )
 
     def __post_init__(self):
         """Initialize the action picker."""
-        self.model = ChatOpenAI(**self.chat_openai_config.model_dump())
+        # shared by the revisers with the same config
+        self.client = get_llm_client(self.chat_openai_config)
+        # the chunks and packs are sized with the tokenizer of the model
+        self.count_tokens = get_token_counter(self.chat_openai_config.model)
+        if self.chat_model is None:
+            self.model = self.client.get_chat_model()
+        else:
+            self.model = self.chat_model
         self.structured_llm = self.model.with_structured_output(ChapterRevised)
         self.chain = chapter_revised_prompt | self.structured_llm
+        # the raw tool call chunks, to read the revision while it is generated
+        self.tool_llm = self.model.bind_tools(
+            [ChapterRevised], tool_choice=ChapterRevised.__name__
+        )
+        self.stream_chain = chapter_revised_prompt | self.tool_llm
+        self.chunk_chain = chunk_revised_prompt | self.structured_llm
+        self.packed_chain = packed_revised_prompt | self.model.with_structured_output(
+            ChaptersRevised
+        )
+
+    def get_limits(self) -> tuple[asyncio.Semaphore, AsyncRateLimiter]:
+        """Get the concurrency and rate limits shared by the running loop."""
+        loop = asyncio.get_running_loop()
+        if self.limits_loop is not loop:
+            self.limits_loop = loop
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.limiter = AsyncRateLimiter(
+                self.requests_per_minute, self.tokens_per_minute
+            )
+        return self.semaphore, self.limiter
+
+    def get_cache_key(self, template: str, inputs: dict[str, Any]) -> str:
+        """Get the cache key of the revision of a rendered prompt."""
+        rendered = template.format(**inputs)
+        return make_llm_cache_key(rendered, self.chat_openai_config)
+
+    def get_fingerprint(self, settings: Mapping[str, Any] | None = None) -> str:
+        """Get the fingerprint of the prompts and settings of the revisions.
+
+        The settings of the caller changing the revisions are added to those
+        of the reviser.
+        """
+        templates = [
+            chapter_revised_template,
+            chunk_revised_template,
+            packed_revised_template,
+        ]
+        all_settings = {
+            "max_chunk_tokens": self.max_chunk_tokens,
+            "chunk_overlap_paragraphs": self.chunk_overlap_paragraphs,
+            "max_pack_tokens": self.max_pack_tokens,
+            **(settings or {}),
+        }
+        return make_llm_fingerprint(templates, self.chat_openai_config, all_settings)
 
     def invoke(self, original_chapter: str) -> ChapterRevised:
         """Pick a revised chapter."""
-        output = self.chain.invoke({"original_chapter": original_chapter})
+        inputs = {"original_chapter": original_chapter}
+        if self.cache is not None:
+            cache_key = self.get_cache_key(chapter_revised_template, inputs)
+            cached = self.cache.get(cache_key, ChapterRevised)
+            if cached is not None:
+                METRICS.incr("llm.cache_hits")
+                return cached
+        METRICS.incr("llm.requests")
+        with METRICS.timer("llm.latency"):
+            output = self.client.run(
+                lambda: self.chain.invoke(inputs, config=LLM_RUN_CONFIG)
+            )
         if not isinstance(output, ChapterRevised):
             raise ValueError(f"Unexpected output type: {type(output)}")
+        if self.cache is not None:
+            self.cache.put(cache_key, output)
         return output
+
+    async def arun_chain(
+        self,
+        chain: Any,
+        template: str,
+        inputs: dict[str, Any],
+        output_cls: type[OutputT],
+    ) -> OutputT:
+        """Run a structured output chain within the limits, asynchronously."""
+        if self.cache is not None:
+            cache_key = self.get_cache_key(template, inputs)
+            cached = await self.cache.aget(cache_key, output_cls)
+            if cached is not None:
+                METRICS.incr("llm.cache_hits")
+                return cached
+        semaphore, limiter = self.get_limits()
+        async with semaphore:
+            await limiter.acquire(sum(estimate_tokens(str(v)) for v in inputs.values()))
+            METRICS.incr("llm.requests")
+            with METRICS.timer("llm.latency"):
+                output = await self.client.arun(
+                    lambda: chain.ainvoke(inputs, config=LLM_RUN_CONFIG)
+                )
+        if not isinstance(output, output_cls):
+            raise ValueError(f"Unexpected output type: {type(output)}")
+        if self.cache is not None:
+            await self.cache.aput(cache_key, output)
+        return output
+
+    async def ainvoke_chain(
+        self,
+        chain: Any,
+        template: str,
+        inputs: dict[str, Any],
+    ) -> ChapterRevised:
+        """Run a revision chain within the limits, asynchronously."""
+        return await self.arun_chain(chain, template, inputs, ChapterRevised)
+
+    async def ainvoke(self, original_chapter: str) -> ChapterRevised:
+        """Pick a revised chapter, asynchronously."""
+        inputs = {"original_chapter": original_chapter}
+        return await self.ainvoke_chain(self.chain, chapter_revised_template, inputs)
+
+    async def arevise_chunk(self, chunk: ChapterChunk) -> ChapterRevised:
+        """Revise a chunk of a chapter, with the preceding context if any."""
+        # the first chunk has an empty context, but is still only a part
+        inputs = {"original_chapter": chunk.text, "previous_context": chunk.context}
+        return await self.ainvoke_chain(
+            self.chunk_chain, chunk_revised_template, inputs
+        )
+
+    async def arevise_pack(self, texts: Sequence[str]) -> list[ChapterRevised]:
+        """Revise several short chapters in a single request."""
+        inputs = {
+            "num_chapters": len(texts),
+            "original_chapters": format_packed_chapters(texts),
+        }
+        output = await self.arun_chain(
+            self.packed_chain, packed_revised_template, inputs, ChaptersRevised
+        )
+        if len(output.revised_chapters) != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} revised chapters,"
+                f" got {len(output.revised_chapters)}."
+            )
+        METRICS.incr("llm.packed_chapters", len(texts))
+        return output.revised_chapters
+
+    async def arevise_chapter(self, chapter: EpubChapter | str) -> ChapterRevised:
+        """Revise a chapter, splitting it in chunks revised concurrently if long."""
+        text = chapter if isinstance(chapter, str) else chapter.text
+        if self.max_chunk_tokens is None:
+            return await self.ainvoke(text)
+        if isinstance(chapter, str):
+            chunks = chunk_text(
+                chapter,
+                self.max_chunk_tokens,
+                self.chunk_overlap_paragraphs,
+                self.count_tokens,
+            )
+        else:
+            chunks = chunk_chapter(
+                chapter,
+                self.max_chunk_tokens,
+                self.chunk_overlap_paragraphs,
+                self.count_tokens,
+            )
+        if len(chunks) <= 1:
+            return await self.ainvoke(text)
+        lg.debug(f"Revising chapter in {len(chunks)} chunks.")
+        revised_chunks = await asyncio.gather(*[self.arevise_chunk(c) for c in chunks])
+        revised_text = "\n".join(rc.revised_chapter for rc in revised_chunks)
+        return ChapterRevised(revised_chapter=revised_text)
+
+    async def arevise_many(
+        self,
+        chapters: Sequence[EpubChapter | str],
+    ) -> list[ChapterRevisionResult]:
+        """Revise several chapters concurrently.
+
+        The results are in the same order as the chapters,
+        a failing chapter is reported in its result without stopping the others.
+        With max_pack_tokens, consecutive short chapters share a request.
+        """
+
+        async def revise_one(
+            index: int, chapter: EpubChapter | str
+        ) -> ChapterRevisionResult:
+            try:
+                revised = await self.arevise_chapter(chapter)
+            except Exception as e:
+                lg.warning(f"Failed to revise chapter {index}: {e!r}")
+                return ChapterRevisionResult(index, error=e)
+            return ChapterRevisionResult(index, revised=revised)
+
+        if self.max_pack_tokens is None:
+            tasks = [revise_one(i, ch) for i, ch in enumerate(chapters)]
+            return await asyncio.gather(*tasks)
+
+        async def revise_pack(pack: ChapterPack) -> list[ChapterRevisionResult]:
+            if len(pack) == 1:
+                return [await revise_one(pack.indexes[0], chapters[pack.indexes[0]])]
+            try:
+                revised_chapters = await self.arevise_pack(
+                    [texts[i] for i in pack.indexes]
+                )
+            except Exception as e:
+                # a bad packed answer should not fail its chapters
+                lg.warning(f"Failed to revise pack {pack.indexes}, unpacking: {e!r}")
+                return await asyncio.gather(
+                    *[revise_one(i, chapters[i]) for i in pack.indexes]
+                )
+            return [
+                ChapterRevisionResult(i, revised=revised)
+                for i, revised in zip(pack.indexes, revised_chapters)
+            ]
+
+        texts = [ch if isinstance(ch, str) else ch.text for ch in chapters]
+        packs = plan_packs(texts, self.max_pack_tokens, self.count_tokens)
+        lg.debug(f"Revising {len(chapters)} chapters in {len(packs)} requests.")
+        packs_results = await asyncio.gather(*[revise_pack(p) for p in packs])
+        return [result for results in packs_results for result in results]
+
+    async def arevise_book(
+        self,
+        epub: Epub,
+        strip_boilerplate: bool = False,
+    ) -> list[ChapterRevisionResult]:
+        """Revise all the chapters of a book concurrently.
+
+        With strip_boilerplate, the paragraphs repeated at the start and end
+        of the chapters are not sent to the model, and are put back around
+        the revised chapters.
+        """
+        if not strip_boilerplate:
+            return await self.arevise_many(list(epub.chapters))
+        texts = [ch.text for ch in epub.chapters]
+        boilerplate = BoilerplateFilter.from_texts(texts)
+        stripped_chapters, report = boilerplate.strip_book(texts)
+        tokens_saved = sum(estimate_tokens(text) for text in texts) - sum(
+            estimate_tokens(sc.text) for sc in stripped_chapters
+        )
+        lg.info(f"Boilerplate: {report}, about {tokens_saved} tokens")
+        METRICS.incr("boilerplate.tokens_saved", tokens_saved)
+        results = await self.arevise_many([sc.text for sc in stripped_chapters])
+        for result, stripped in zip(results, stripped_chapters):
+            if result.revised is not None:
+                revised_text = stripped.restore(result.revised.revised_chapter)
+                result.revised.revised_chapter = revised_text
+        return results
+
+    def revise_many(
+        self,
+        chapters: Sequence[EpubChapter | str],
+    ) -> list[ChapterRevisionResult]:
+        """Revise several chapters concurrently, from sync code."""
+        return asyncio.run(self.arevise_many(chapters))
+
+    def revise_chapter(self, chapter: EpubChapter | str) -> ChapterRevised:
+        """Revise a chapter in concurrent chunks, from sync code."""
+        return asyncio.run(self.arevise_chapter(chapter))
+
+    async def arevise_streaming(
+        self,
+        original_chapter: str,
+        sink: RevisionSink | Callable[[str], None],
+    ) -> ChapterRevised:
+        """Revise a chapter, writing the revised text to the sink as it arrives.
+
+        The sink is closed at the end, and the validated revision returned.
+        The request is retried like the others, until the first piece of
+        text is written to the sink. It times out when the next chunk is late
+        by stream_timeout_s, however long the whole stream takes.
+        """
+        if not hasattr(sink, "write"):
+            sink = CallbackSink(sink)
+        inputs = {"original_chapter": original_chapter}
+        try:
+            if self.cache is not None:
+                cache_key = self.get_cache_key(chapter_revised_template, inputs)
+                cached = await self.cache.aget(cache_key, ChapterRevised)
+                if cached is not None:
+                    METRICS.incr("llm.cache_hits")
+                    sink.write(cached.revised_chapter)
+                    return cached
+            t_start = time.perf_counter()
+            started = False
+
+            async def stream() -> PartialFieldReader:
+                nonlocal started
+                if started:
+                    # the sink cannot take the first pieces twice
+                    raise StreamInterruptedError("The revision stream was retried.")
+                reader = PartialFieldReader("revised_chapter")
+                chunks = self.stream_chain.astream(inputs, config=LLM_RUN_CONFIG)
+                # time out a stalled stream, not a long one
+                timeout_s = self.client.config.stream_timeout_s
+                try:
+                    async for chunk in aiter_with_timeout(chunks, timeout_s):
+                        for tool_chunk in getattr(chunk, "tool_call_chunks", []):
+                            delta = reader.feed(tool_chunk.get("args") or "")
+                            if delta == "":
+                                continue
+                            if not started:
+                                elapsed = time.perf_counter() - t_start
+                                METRICS.timing("llm.first_token_latency", elapsed)
+                                started = True
+                            sink.write(delta)
+                except Exception as e:
+                    if started:
+                        raise StreamInterruptedError(
+                            "The revision stream failed."
+                        ) from e
+                    raise
+                return reader
+
+            semaphore, limiter = self.get_limits()
+            async with semaphore:
+                await limiter.acquire(estimate_tokens(original_chapter))
+                METRICS.incr("llm.requests")
+                reader = await self.client.arun(stream, hedge=False, bounded=False)
+                METRICS.timing("llm.latency", time.perf_counter() - t_start)
+            if reader.args_json == "":
+                raise ValueError("No revision in the streamed response.")
+            output = ChapterRevised.model_validate(
+                parse_json_markdown(reader.args_json)
+            )
+            # the partial reader may lag behind the final parse
+            emitted = reader.emitted
+            if output.revised_chapter.startswith(emitted):
+                tail = output.revised_chapter[len(emitted) :]
+                if tail != "":
+                    sink.write(tail)
+            else:
+                sink.rewrite(output.revised_chapter)
+            if self.cache is not None:
+                await self.cache.aput(cache_key, output)
+            return output
+        finally:
+            sink.close()
+
+    async def astream(self, original_chapter: str) -> AsyncIterator[str]:
+        """Revise a chapter, yielding the revised text as it arrives.
+
+        A RevisionRewrite replaces the text yielded before it.
+        """
+        sink = AsyncIteratorSink()
+        task = asyncio.create_task(self.arevise_streaming(original_chapter, sink))
+        async for text in sink:
+            yield text
+        await task
+
+    def revise_streaming(
+        self,
+        original_chapter: str,
+        sink: RevisionSink | Callable[[str], None],
+    ) -> ChapterRevised:
+        """Revise a chapter streaming to the sink, from sync code."""
+        return asyncio.run(self.arevise_streaming(original_chapter, sink))
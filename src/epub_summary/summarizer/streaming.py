@@ -0,0 +1,269 @@
+"""Sinks receiving the revised text as it is generated."""
+
+import asyncio
+from collections.abc import AsyncIterator, Callable
+import json
+from pathlib import Path
+from typing import Literal, Protocol, TextIO, TypeVar
+
+from loguru import logger as lg
+
+T = TypeVar("T")
+
+
+class RevisionSink(Protocol):
+    """Receiver of the revised text, piece by piece."""
+
+    def write(self, text: str) -> None:
+        """Receive the next piece of revised text."""
+
+    def rewrite(self, text: str) -> None:
+        """Replace all the text received so far, it did not match the revision."""
+
+    def close(self) -> None:
+        """The revision is complete."""
+
+
+class StreamInterruptedError(Exception):
+    """The stream failed after some of the revision was written to the sink.
+
+    It is not retried, as the sink cannot take the revision twice.
+    """
+
+
+async def aiter_with_timeout(
+    items: AsyncIterator[T],
+    timeout_s: float | None,
+) -> AsyncIterator[T]:
+    """Iterate, raising TimeoutError if an item takes longer than the timeout.
+
+    Each wait is bounded, the first included, not the whole iteration.
+    """
+
+    async def get_next() -> T:
+        return await anext(items)
+
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(get_next(), timeout_s)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(items, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class RevisionRewrite(str):
+    """Text replacing all the pieces yielded before it."""
+
+
+class CallbackSink:
+    """Sink calling a function with every piece of text."""
+
+    def __init__(
+        self,
+        callback: Callable[[str], None],
+        rewrite_callback: Callable[[str], None] | None = None,
+    ) -> None:
+        """Initialize the sink with the callback.
+
+        The rewrite callback receives the whole text when the pieces given
+        to the callback did not match the revision, it defaults to a warning.
+        """
+        self.callback = callback
+        self.rewrite_callback = rewrite_callback
+
+    def write(self, text: str) -> None:
+        self.callback(text)
+
+    def rewrite(self, text: str) -> None:
+        if self.rewrite_callback is None:
+            lg.warning("The streamed text did not match the revision.")
+        else:
+            self.rewrite_callback(text)
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink:
+    """Sink appending the text to a file, flushed on every piece."""
+
+    def __init__(self, file_fp: Path) -> None:
+        """Open the file for writing."""
+        self.file_fp = file_fp
+        self.f: TextIO = file_fp.open("w", encoding="utf-8")
+
+    def write(self, text: str) -> None:
+        self.f.write(text)
+        self.f.flush()
+
+    def rewrite(self, text: str) -> None:
+        self.f.seek(0)
+        self.f.truncate()
+        self.write(text)
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class AsyncIteratorSink:
+    """Sink that can be consumed with `async for`.
+
+    A rewrite is yielded as a RevisionRewrite, replacing the previous pieces.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the queue of pieces."""
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue()
+
+    def write(self, text: str) -> None:
+        self.queue.put_nowait(text)
+
+    def rewrite(self, text: str) -> None:
+        self.queue.put_nowait(RevisionRewrite(text))
+
+    def close(self) -> None:
+        self.queue.put_nowait(None)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            text = await self.queue.get()
+            if text is None:
+                return
+            yield text
+
+
+class PartialFieldReader:
+    """Extract a string field from streamed fragments of json tool arguments.
+
+    Each character is scanned once: the arguments are tokenized up to the
+    opening quote of the field, then only the complete characters of the
+    value that follow are decoded, stopping before an unfinished escape.
+    """
+
+    def __init__(self, field_name: str) -> None:
+        """Initialize the reader for a field."""
+        self.field_name = field_name
+        self.args_parts: list[str] = []
+        self.emitted_parts: list[str] = []
+        # json not scanned yet, or the undecoded tail of the value
+        self.pending = ""
+        self.state: Literal["before", "value", "after"] = "before"
+        # tokenizer of the arguments before the value
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.expect_key = False
+        self.string_chars: list[str] = []
+        self.last_key: str | None = None
+        self.after_key = False
+
+    @property
+    def args_json(self) -> str:
+        """Get the arguments received so far."""
+        return "".join(self.args_parts)
+
+    @property
+    def emitted(self) -> str:
+        """Get the text of the field returned so far."""
+        return "".join(self.emitted_parts)
+
+    def feed(self, args_fragment: str) -> str:
+        """Add a fragment of the arguments, return the new text of the field."""
+        if args_fragment == "":
+            return ""
+        self.args_parts.append(args_fragment)
+        if self.state == "after":
+            return ""
+        self.pending += args_fragment
+        if self.state == "before":
+            self.scan_to_value()
+        if self.state != "value":
+            return ""
+        delta = self.decode_value()
+        if delta != "":
+            self.emitted_parts.append(delta)
+        return delta
+
+    def scan_to_value(self) -> None:
+        """Tokenize the pending json up to the opening quote of the field."""
+        for i, char in enumerate(self.pending):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.expect_key:
+                        self.last_key = json.loads(
+                            '"' + "".join(self.string_chars) + '"', strict=False
+                        )
+                        self.expect_key = False
+                        self.after_key = True
+                    continue
+                if self.expect_key:
+                    self.string_chars.append(char)
+            elif char == '"':
+                if (
+                    self.depth == 1
+                    and self.after_key
+                    and self.last_key == (self.field_name)
+                ):
+                    self.state = "value"
+                    self.pending = self.pending[i + 1 :]
+                    return
+                self.in_string = True
+                self.string_chars = []
+            elif char in "{[":
+                self.depth += 1
+                self.expect_key = char == "{" and self.depth == 1
+            elif char in "}]":
+                self.depth -= 1
+            elif char == "," and self.depth == 1:
+                self.expect_key = True
+                self.after_key = False
+            elif char == ":" and self.depth == 1:
+                continue
+            elif not char.isspace():
+                # a value other than a string ends the key
+                self.after_key = False
+        self.pending = ""
+
+    def decode_value(self) -> str:
+        """Decode the complete characters of the pending value."""
+        pending = self.pending
+        end = len(pending)
+        i = 0
+        while i < len(pending):
+            quote = pending.find('"', i)
+            backslash = pending.find("\\", i, quote if quote != -1 else len(pending))
+            if backslash == -1:
+                if quote != -1:
+                    end = quote
+                    self.state = "after"
+                break
+            # an escape is 2 characters, or 6 for a code point, 12 for a pair
+            size = 2
+            if pending[backslash + 1 : backslash + 2] == "u":
+                size = 6
+                code = pending[backslash + 2 : backslash + 6]
+                if len(code) == 4 and "D800" <= code.upper() < "DC00":
+                    size = 12
+            if backslash + size > len(pending):
+                end = backslash
+                break
+            i = backslash + size
+        self.pending = pending[end:]
+        if end == 0:
+            return ""
+        try:
+            return json.loads('"' + pending[:end] + '"', strict=False)
+        except ValueError:
+            # a broken escape, the final parse reports it
+            self.state = "after"
+            return ""
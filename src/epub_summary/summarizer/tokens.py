@@ -0,0 +1,51 @@
+"""Local token counting."""
+
+from collections.abc import Callable
+from functools import cache, partial
+from typing import TYPE_CHECKING
+
+from loguru import logger as lg
+
+if TYPE_CHECKING:
+    import tiktoken
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough local estimate of the number of tokens in a text."""
+    return estimate_tokens_for_length(len(text))
+
+
+def estimate_tokens_for_length(num_chars: int) -> int:
+    """Rough local estimate of the number of tokens in a text of that length."""
+    return num_chars // 4 + 1
+
+
+@cache
+def get_encoding(model: str) -> "tiktoken.Encoding | None":
+    """Get the tiktoken encoding of a model, None if it is not available."""
+    # tiktoken is slow to import, only load it when counting tokens
+    import tiktoken
+
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = "o200k_base"
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # the encodings are downloaded on first use, which can fail offline
+        lg.warning(f"Token encoding for {model} not available, estimating: {e!r}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens of a model in a text, falling back to an estimate."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """Get the function counting the tokens of a model in a text."""
+    return partial(count_tokens, model=model)
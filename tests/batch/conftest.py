@@ -0,0 +1,15 @@
+"""Fixtures of the batch tests."""
+
+from pathlib import Path
+
+import pytest
+
+from epub_summary.config.epub_summary_config import get_epub_summary_paths
+
+
+@pytest.fixture(autouse=True)
+def tmp_cache_fol(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep the default caches of the runner out of the project cache folder."""
+    cache_fol = tmp_path / "cache"
+    monkeypatch.setattr(get_epub_summary_paths(), "cache_fol", cache_fol)
+    return cache_fol
@@ -0,0 +1,264 @@
+"""Test the resumable batch runner."""
+
+import json
+from pathlib import Path
+import zipfile
+
+from langchain_core.runnables import RunnableLambda
+
+from epub_summary.batch.checkpoint import ChapterRecord, CheckpointManifest
+from epub_summary.batch.runner import MANIFEST_NAME, BatchRunner, hash_file
+from epub_summary.benchmark.synthetic import SyntheticEpubConfig, write_synthetic_epub
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.epubber.epub import Epub
+from epub_summary.summarizer.packing import split_packed_chapters
+from epub_summary.summarizer.reviser import (
+    ChapterRevised,
+    ChapterReviser,
+    ChaptersRevised,
+)
+
+
+def make_library(input_fol: Path, num_books: int) -> None:
+    """Write a folder of small synthetic epubs."""
+    input_fol.mkdir(parents=True)
+    for i in range(num_books):
+        config = SyntheticEpubConfig(num_chapters=3, paragraphs_per_chapter=4, seed=i)
+        write_synthetic_epub(input_fol / f"book{i}.epub", config)
+
+
+def make_reviser(calls: list[str], fail_marker: str | None = None) -> ChapterReviser:
+    """Make a reviser with a fake chain recording its calls."""
+
+    def fake_revise(inputs: dict) -> ChapterRevised:
+        text = inputs["original_chapter"]
+        if fail_marker is not None and fail_marker in text:
+            raise RuntimeError("boom")
+        calls.append(text)
+        return ChapterRevised(revised_chapter=text.upper())
+
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake"), max_chunk_tokens=None)
+    cr.chain = RunnableLambda(fake_revise)
+    return cr
+
+
+def test_batch_runs_and_resumes(tmp_path: Path) -> None:
+    """All the chapters are written, and a rerun does not redo them."""
+    make_library(tmp_path / "in", 2)
+    calls: list[str] = []
+    runner = BatchRunner(tmp_path / "in", tmp_path / "out", make_reviser(calls), 2)
+    stats = runner.run()
+    assert (stats.books_done, stats.chapters_done) == (2, 6)
+    assert len(calls) == 6
+    out_fps = sorted((tmp_path / "out").rglob("*.json"))
+    assert len(out_fps) == 6
+    revised = json.loads(out_fps[0].read_text())
+    assert revised["revised_chapter"].isupper()
+
+    calls.clear()
+    runner = BatchRunner(tmp_path / "in", tmp_path / "out", make_reviser(calls), 2)
+    stats = runner.run()
+    assert calls == []
+    assert stats.books_done == 2
+
+
+def test_batch_caches_parsed_books(tmp_path: Path, tmp_cache_fol: Path) -> None:
+    """The parsed books are cached, and give the same revisions from the cache."""
+    make_library(tmp_path / "in", 2)
+    calls: list[str] = []
+    BatchRunner(tmp_path / "in", tmp_path / "out", make_reviser(calls), 2).run()
+    assert len(list((tmp_cache_fol / "parsed_books").iterdir())) == 2
+    cached_calls: list[str] = []
+    BatchRunner(
+        tmp_path / "in", tmp_path / "out_cached", make_reviser(cached_calls), 2
+    ).run()
+    uncached_calls: list[str] = []
+    runner = BatchRunner(
+        tmp_path / "in", tmp_path / "out_uncached", make_reviser(uncached_calls), 2
+    )
+    runner.book_cache = None
+    runner.run()
+    assert sorted(cached_calls) == sorted(uncached_calls) == sorted(calls)
+
+
+def test_batch_resumes_partial_run(tmp_path: Path) -> None:
+    """After a crash only the missing chapters are revised."""
+    make_library(tmp_path / "in", 1)
+    calls: list[str] = []
+    runner = BatchRunner(tmp_path / "in", tmp_path / "out", make_reviser(calls), 1)
+    runner.run()
+    # simulate a crash: drop the book marker and one chapter
+    manifest_fp = tmp_path / "out" / MANIFEST_NAME
+    lines = manifest_fp.read_text().splitlines()
+    kept = [l for l in lines if json.loads(l)["chapter"] not in (-1, 2)]
+    manifest_fp.write_text("\n".join(kept) + "\n{truncated")
+
+    calls.clear()
+    runner = BatchRunner(tmp_path / "in", tmp_path / "out", make_reviser(calls), 1)
+    stats = runner.run()
+    assert len(calls) == 1
+    assert (stats.chapters_done, stats.chapters_skipped) == (1, 2)
+
+
+def test_batch_failed_chapters_retried(tmp_path: Path) -> None:
+    """Failed chapters are recorded and retried on the next run."""
+    make_library(tmp_path / "in", 1)
+    calls: list[str] = []
+    runner = BatchRunner(
+        tmp_path / "in", tmp_path / "out", make_reviser(calls, fail_marker=""), 1
+    )
+    stats = runner.run()
+    assert stats.chapters_failed == 3
+    manifest = CheckpointManifest(tmp_path / "out" / MANIFEST_NAME)
+    book_hash = hash_file(tmp_path / "in" / "book0.epub")
+    assert not manifest.is_book_done("book0.epub", book_hash)
+
+    runner = BatchRunner(tmp_path / "in", tmp_path / "out", make_reviser(calls), 1)
+    stats = runner.run()
+    assert stats.chapters_done == 3
+
+
+def test_manifest_records(tmp_path: Path) -> None:
+    """The manifest keeps the last status of each chapter."""
+    manifest = CheckpointManifest(tmp_path / MANIFEST_NAME)
+    (tmp_path / "c0.json").write_text("{}")
+    manifest.append(ChapterRecord("b", 0, "c0", "done", output="c0.json"))
+    manifest.append(ChapterRecord("b", 1, "c1", "failed", error="boom"))
+    reloaded = CheckpointManifest(tmp_path / MANIFEST_NAME)
+    assert reloaded.is_done("b", 0)
+    assert not reloaded.is_done("b", 1)
+
+
+def test_batch_corrected_edition(tmp_path: Path) -> None:
+    """A corrected edition only revises the chapters that changed."""
+    config = SyntheticEpubConfig(num_chapters=4, paragraphs_per_chapter=4)
+    (tmp_path / "in").mkdir()
+    epub_fp = write_synthetic_epub(tmp_path / "in" / "book.epub", config)
+    calls: list[str] = []
+    BatchRunner(tmp_path / "in", tmp_path / "out", make_reviser(calls), 1).run()
+    assert len(calls) == 4
+
+    # rewrite the book with the third chapter corrected
+    with zipfile.ZipFile(epub_fp) as zf:
+        entries = {n: zf.read(n) for n in zf.namelist()}
+    name = "OEBPS/text/chapter3.xhtml"
+    entries[name] = entries[name].replace(b"<p>", b"<p>Corrected. ", 1)
+    (tmp_path / "in2").mkdir()
+    with zipfile.ZipFile(tmp_path / "in2" / "book_v2.epub", "w") as zf:
+        for n, data in entries.items():
+            zf.writestr(n, data)
+
+    calls.clear()
+    runner = BatchRunner(
+        tmp_path / "in2",
+        tmp_path / "out2",
+        make_reviser(calls),
+        1,
+        previous_output_fols=[tmp_path / "out"],
+    )
+    stats = runner.run()
+    assert len(calls) == 1
+    assert calls[0].startswith("Corrected.")
+    assert (stats.chapters_done, stats.chapters_reused) == (1, 3)
+    assert len(list((tmp_path / "out2").rglob("*.json"))) == 4
+
+    # another model does not reuse the revisions
+    calls.clear()
+    reviser = make_reviser(calls)
+    reviser.chat_openai_config = ChatOpenAIConfig(api_key="fake", model="gpt-4o")
+    runner = BatchRunner(
+        tmp_path / "in2",
+        tmp_path / "out3",
+        reviser,
+        1,
+        previous_output_fols=[tmp_path / "out", tmp_path / "out2"],
+    )
+    stats = runner.run()
+    assert len(calls) == 4
+    assert stats.chapters_reused == 0
+
+    # nor do other chunk sizes or boilerplate settings
+    for setting, value in [("max_chunk_tokens", 100_000), ("strip_boilerplate", False)]:
+        calls.clear()
+        reviser = make_reviser(calls)
+        runner = BatchRunner(
+            tmp_path / "in2",
+            tmp_path / f"out_{setting}",
+            reviser,
+            1,
+            previous_output_fols=[tmp_path / "out", tmp_path / "out2"],
+        )
+        setattr(reviser if hasattr(reviser, setting) else runner, setting, value)
+        stats = runner.run()
+        assert len(calls) == 4
+        assert stats.chapters_reused == 0
+
+
+def test_manifest_diff_chapters(tmp_path: Path) -> None:
+    """The manifest tells which chapters of a book changed."""
+    config = SyntheticEpubConfig(num_chapters=3, paragraphs_per_chapter=2)
+    epub = Epub.from_zip(write_synthetic_epub(tmp_path / "book.epub", config))
+    manifest = CheckpointManifest(tmp_path / MANIFEST_NAME)
+    (tmp_path / "c1.json").write_text("{}")
+    record = ChapterRecord(
+        "book",
+        1,
+        "c1",
+        "done",
+        output="c1.json",
+        content_hash=epub.chapters[1].content_hash,
+        fingerprint="abc",
+    )
+    manifest.append(record)
+    reusable, changed = manifest.diff_chapters(epub, "abc")
+    assert reusable == {1: tmp_path / "c1.json"}
+    assert changed == [0, 2]
+    # revised with other prompts or model settings
+    reusable, changed = manifest.diff_chapters(epub, "def")
+    assert reusable == {}
+    assert changed == [0, 1, 2]
+
+
+def test_batch_strips_boilerplate(tmp_path: Path) -> None:
+    """Repeated headers are not sent to the model, and are restored."""
+    input_fol = tmp_path / "in"
+    input_fol.mkdir()
+    with zipfile.ZipFile(input_fol / "book.epub", "w") as zf:
+        for i in range(1, 5):
+            html = (
+                f"<body><p>Running Header</p><p>Chapter {i}</p>"
+                f"<p>Only in chapter {'abcd'[i - 1]}.</p></body>"
+            )
+            zf.writestr(f"chapter{i}.xhtml", html)
+    calls: list[str] = []
+    runner = BatchRunner(input_fol, tmp_path / "out", make_reviser(calls), 1)
+    runner.run()
+    assert sorted(calls) == [f"Only in chapter {c}." for c in "abcd"]
+    out_fp = sorted((tmp_path / "out").rglob("*.json"))[0]
+    revised = json.loads(out_fp.read_text())["revised_chapter"]
+    assert revised == "Running Header\nChapter 1\nONLY IN CHAPTER A."
+
+
+def test_batch_packs_short_chapters(tmp_path: Path) -> None:
+    """The short chapters of a book are revised in a single request."""
+    make_library(tmp_path / "in", 1)
+    calls: list[str] = []
+    packed_calls: list[list[str]] = []
+
+    def fake_revise_packed(inputs: dict) -> ChaptersRevised:
+        texts = split_packed_chapters(inputs["original_chapters"])
+        packed_calls.append(texts)
+        return ChaptersRevised(
+            revised_chapters=[ChapterRevised(revised_chapter=t.upper()) for t in texts]
+        )
+
+    reviser = make_reviser(calls)
+    reviser.max_pack_tokens = 10_000
+    reviser.packed_chain = RunnableLambda(fake_revise_packed)
+    runner = BatchRunner(tmp_path / "in", tmp_path / "out", reviser, 1)
+    stats = runner.run()
+    assert calls == []
+    assert [len(texts) for texts in packed_calls] == [3]
+    assert stats.chapters_done == 3
+    for out_fp in (tmp_path / "out").rglob("*.json"):
+        assert json.loads(out_fp.read_text())["revised_chapter"].isupper()
@@ -0,0 +1,67 @@
+"""Test the fake OpenAI server and the load test driver."""
+
+import random
+
+from epub_summary.benchmark.fake_server import FakeOpenAIServer, LatencyDistribution
+from epub_summary.benchmark.load_test import LoadTestConfig, percentile, run_load_test
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.reviser import ChapterReviser
+
+
+def make_reviser(server: FakeOpenAIServer, **kwargs) -> ChapterReviser:
+    """Make a reviser talking to the fake server."""
+    kwargs.setdefault("retry_base_delay_s", 0.0)
+    config = ChatOpenAIConfig(api_key="fake", base_url=server.base_url, **kwargs)
+    return ChapterReviser(config)
+
+
+def test_latency_distributions() -> None:
+    """The samples are centered on the median."""
+    rng = random.Random(0)
+    for kind in ["constant", "uniform", "exponential", "lognormal"]:
+        latency = LatencyDistribution(kind, median_s=0.1, spread=0.05)
+        samples = [latency.sample(rng) for _ in range(2000)]
+        assert 0.09 < percentile(samples, 50) < 0.11
+        assert min(samples) >= 0
+
+
+def test_percentile() -> None:
+    """The percentiles are taken by nearest rank."""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3
+    assert percentile([], 50) == 0
+
+
+def test_streamed_tool_call() -> None:
+    """The revision streams in pieces at the rate of the server."""
+    with FakeOpenAIServer(tokens_per_s=1000, stream_chunk_tokens=2) as server:
+        cr = make_reviser(server)
+        pieces: list[str] = []
+        revised = cr.revise_streaming("one two three four five six", pieces.append)
+    assert len(pieces) > 1
+    assert "".join(pieces) == revised.revised_chapter
+
+
+def test_injected_failures_are_retried() -> None:
+    """Injected errors fail the request once the retries run out."""
+    with FakeOpenAIServer(failure_rate=1.0) as server:
+        cr = make_reviser(server, max_retries=2)
+        results = cr.revise_many(["one two three"])
+    assert not results[0].ok
+    assert server.num_requests == 3
+    assert server.num_failed == 3
+
+
+def test_load_test_report() -> None:
+    """All the chapters of all the books are revised and timed."""
+    config = LoadTestConfig(num_books=2, chapters_per_book=3, paragraphs_per_chapter=2)
+    with FakeOpenAIServer(LatencyDistribution(median_s=0.01)) as server:
+        report = run_load_test(server, config)
+    assert report.num_chapters == 6
+    assert report.num_failed == 0
+    assert len(report.latencies_s) == 6
+    assert report.num_requests == 6
+    assert report.chapters_per_minute > 0
+    assert report.to_dict()["latency"]["p50"] >= 0.01
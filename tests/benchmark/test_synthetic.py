@@ -0,0 +1,48 @@
+"""Test the synthetic epub generator and the fake chat model."""
+
+from pathlib import Path
+
+import pytest
+
+from epub_summary.benchmark.fake_chat import FakeChatModel
+from epub_summary.benchmark.synthetic import SyntheticEpubConfig, write_synthetic_epub
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.epubber.epub import Epub
+from epub_summary.summarizer.reviser import ChapterRevised, ChapterReviser
+
+
+def test_synthetic_epub_deterministic(tmp_path: Path) -> None:
+    """The same config writes the same book."""
+    config = SyntheticEpubConfig(num_chapters=3, paragraphs_per_chapter=5)
+    ep_a = Epub.from_zip(write_synthetic_epub(tmp_path / "a.epub", config))
+    ep_b = Epub.from_zip(write_synthetic_epub(tmp_path / "b.epub", config))
+    assert [c.text for c in ep_a.chapters] == [c.text for c in ep_b.chapters]
+
+
+@pytest.mark.parametrize("naming", ["chapter", "padded", "split", "opaque"])
+def test_synthetic_epub_shape(tmp_path: Path, naming: str) -> None:
+    """The book has the configured chapters and paragraphs."""
+    config = SyntheticEpubConfig(
+        num_chapters=4,
+        paragraphs_per_chapter=6,
+        markup_noise=0.3,
+        naming=naming,
+        num_images=2,
+    )
+    ep = Epub.from_zip(write_synthetic_epub(tmp_path / "book.epub", config))
+    assert len(ep.chapters) == 4
+    for chapter in ep.chapters:
+        assert len(chapter.sections[0].paragraphs) == 6
+        assert "<" not in chapter.text
+
+
+def test_fake_chat_structured_output() -> None:
+    """The fake model drives the reviser end to end."""
+    fake_model = FakeChatModel()
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake"), chat_model=fake_model)
+    revised = cr.invoke("one two three four")
+    assert isinstance(revised, ChapterRevised)
+    assert len(revised.revised_chapter) > 0
+    results = cr.revise_many(["a b c", "d e f"])
+    assert all(r.ok for r in results)
+    assert fake_model.num_calls == 3
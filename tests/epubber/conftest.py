@@ -0,0 +1,31 @@
+"""Shared fixtures of the epubber tests."""
+
+from collections.abc import Callable
+from pathlib import Path
+import zipfile
+
+import pytest
+
+
+def write_minimal_epub(
+    epub_fp: Path,
+    num_chapters: int,
+    pars_per_chapter: int = 3,
+    with_empty: bool = False,
+) -> Path:
+    """Write a minimal epub, with numbered chapters of numbered paragraphs."""
+    with zipfile.ZipFile(epub_fp, "w") as zf:
+        for i in range(1, num_chapters + 1):
+            pars = "".join(
+                f"<p>Chapter {i} café par {j}.</p>" for j in range(pars_per_chapter)
+            )
+            zf.writestr(f"OEBPS/chapter{i}.xhtml", f"<html><body>{pars}</body></html>")
+        if with_empty:
+            zf.writestr("OEBPS/empty.xhtml", "<html><body></body></html>")
+    return epub_fp
+
+
+@pytest.fixture
+def write_epub() -> Callable[..., Path]:
+    """Get the writer of minimal epubs."""
+    return write_minimal_epub
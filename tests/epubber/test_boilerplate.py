@@ -0,0 +1,78 @@
+"""Test the boilerplate removal."""
+
+from epub_summary.epubber.boilerplate import BoilerplateFilter
+
+HEADER = "The Great Novel — Copyright 2024 Some Press"
+
+
+WORDS = ["rain", "wind", "snow", "fog", "sun", "hail", "dew", "mist", "frost", "ice"]
+
+
+def make_texts(num_chapters: int) -> list[str]:
+    """Make chapters with a running header, a caption and a footer."""
+    return [
+        f"{HEADER}\nChapter {i}\nThe {WORDS[i]} began.\nYes.\n"
+        f"The {WORDS[i]} ended.\nPage {i * 10}"
+        for i in range(1, num_chapters + 1)
+    ]
+
+
+def test_find_boilerplate() -> None:
+    """Repeated paragraphs at the edges are found, numbers masked."""
+    texts = make_texts(5)
+    boilerplate = BoilerplateFilter.from_texts(texts)
+    assert boilerplate.is_boilerplate(HEADER)
+    assert boilerplate.is_boilerplate("Chapter 12")
+    assert boilerplate.is_boilerplate("page 3")
+    assert not boilerplate.is_boilerplate("The wind began.")
+    stripped = boilerplate.strip(texts[0])
+    assert stripped.text == "The wind began.\nYes.\nThe wind ended."
+    assert stripped.header == [HEADER, "Chapter 1"]
+    assert stripped.footer == ["Page 10"]
+
+
+def test_story_lines_kept() -> None:
+    """A paragraph repeated in the middle of the chapters is story."""
+    texts = [
+        f"{HEADER}\nThe {word} began.\nYes.\nThe {word} ended.\nEnd."
+        for word in WORDS[:4]
+    ]
+    boilerplate = BoilerplateFilter.from_texts(texts, edge_paragraphs=2)
+    assert not boilerplate.is_boilerplate("Yes.")
+    stripped = boilerplate.strip(texts[0])
+    assert stripped.header == [HEADER]
+    assert stripped.footer == ["End."]
+    # a boilerplate line in the middle of a chapter is kept
+    stripped = boilerplate.strip(f"Start.\n{HEADER}\nMiddle.\n\nEnd.")
+    assert stripped.text == f"Start.\n{HEADER}\nMiddle.\n"
+    assert stripped.footer == ["End."]
+
+
+def test_min_chapters() -> None:
+    """Paragraphs in too few chapters are not boilerplate."""
+    texts = make_texts(2)
+    assert BoilerplateFilter.from_texts(texts).keys == set()
+    texts = make_texts(4) + ["Other.\nText."] * 6
+    boilerplate = BoilerplateFilter.from_texts(texts, min_fraction=0.5)
+    assert not boilerplate.is_boilerplate(HEADER)
+
+
+def test_restore() -> None:
+    """The removed paragraphs go back around the revised text."""
+    texts = make_texts(4)
+    boilerplate = BoilerplateFilter.from_texts(texts)
+    stripped = boilerplate.strip(texts[1])
+    assert stripped.restore(stripped.text) == texts[1]
+    assert stripped.restore("A.\nB.") == f"{HEADER}\nChapter 2\nA.\nB.\nPage 20"
+    assert stripped.restore("") == f"{HEADER}\nChapter 2\nPage 20"
+
+
+def test_report() -> None:
+    """The savings are counted over the book."""
+    texts = make_texts(4)
+    stripped_chapters, report = BoilerplateFilter.from_texts(texts).strip_book(texts)
+    assert report.paragraphs_removed == 4 * 3
+    assert report.chars_before == sum(len(t) for t in texts)
+    assert report.chars_removed == sum(len(t) for t in texts) - sum(
+        len(sc.text) for sc in stripped_chapters
+    )
@@ -0,0 +1,104 @@
+"""Test the parsed book cache."""
+
+from collections.abc import Callable
+import gc
+from pathlib import Path
+
+import pytest
+
+from epub_summary.epubber.book_cache import MappedEpubSection, ParsedBookCache
+from epub_summary.epubber.epub import Epub, HtmlChapterParserLxml
+
+
+def test_book_cache_roundtrip(tmp_path: Path, write_epub: Callable[..., Path]) -> None:
+    """A warm load gives the same book as a cold one."""
+    epub_fp = write_epub(tmp_path / "book.epub", 4, with_empty=True)
+    cache = ParsedBookCache(tmp_path / "cache")
+    ep_cold = Epub.from_zip(epub_fp, cache=cache)
+    ep_warm = Epub.from_zip(epub_fp, cache=cache)
+    assert len(ep_warm.chapters) == len(ep_cold.chapters)
+    for ch_warm, ch_cold in zip(ep_warm.chapters, ep_cold.chapters):
+        assert ch_warm.chap_stem == ch_cold.chap_stem
+        assert ch_warm.html == ch_cold.html
+        assert ch_warm.text == ch_cold.text
+        for sec_warm, sec_cold in zip(ch_warm.sections, ch_cold.sections):
+            assert isinstance(sec_warm, MappedEpubSection)
+            assert sec_warm.section_title == sec_cold.section_title
+            assert [p.p_str for p in sec_warm.paragraphs] == [
+                p.p_str for p in sec_cold.paragraphs
+            ]
+
+
+def test_book_cache_lazy_paragraphs(
+    tmp_path: Path, write_epub: Callable[..., Path]
+) -> None:
+    """The paragraphs are decoded only when accessed."""
+    epub_fp = write_epub(tmp_path / "book.epub", 2)
+    cache = ParsedBookCache(tmp_path / "cache")
+    Epub.from_zip(epub_fp, cache=cache)
+    ep = Epub.from_zip(epub_fp, cache=cache)
+    sec = ep.chapters[0].sections[0]
+    assert sec._paragraphs is None
+    assert (
+        sec.text
+        == "Chapter 1 café par 0.\nChapter 1 café par 1.\nChapter 1 café par 2."
+    )
+    assert sec._paragraphs is None
+    sec.paragraphs[0].set_p_str("Changed.")
+    assert sec.text.startswith("Changed.\n")
+
+
+def test_book_cache_key(tmp_path: Path, write_epub: Callable[..., Path]) -> None:
+    """The key changes with the content and with the parser."""
+    cache = ParsedBookCache(tmp_path / "cache")
+    fp_a = write_epub(tmp_path / "a.epub", 2)
+    fp_b = write_epub(tmp_path / "b.epub", 3)
+    key_a = cache.get_key(fp_a, Epub().parser_cls)
+    assert key_a != cache.get_key(fp_b, Epub().parser_cls)
+    assert key_a != cache.get_key(fp_a, HtmlChapterParserLxml)
+    assert not cache.load(key_a, Epub())
+
+
+@pytest.mark.parametrize(
+    "index_str",
+    [
+        '{"chapters": [',
+        '{"version": 1}',
+        '{"chapters": [{"stem": "chapter1", "html": [0, 1]}]}',
+        '{"chapters": [{"stem": "chapter1", "html": 3, "sections": []}]}',
+        "[]",
+    ],
+)
+def test_book_cache_corrupt_index(
+    tmp_path: Path, write_epub: Callable[..., Path], index_str: str
+) -> None:
+    """A corrupt or truncated index is a miss, and the book is stored again."""
+    epub_fp = write_epub(tmp_path / "book.epub", 2)
+    cache = ParsedBookCache(tmp_path / "cache")
+    Epub.from_zip(epub_fp, cache=cache)
+    key = cache.get_key(epub_fp, Epub().parser_cls)
+    index_fp = cache.get_book_fol(key) / "index.json"
+    index_fp.write_text(index_str)
+    ep_miss = Epub()
+    assert not cache.load(key, ep_miss)
+    assert len(ep_miss.chapters) == 0
+    assert not index_fp.exists()
+    ep = Epub.from_zip(epub_fp, cache=cache)
+    assert len(ep.chapters) == 2
+    assert cache.load(key, Epub())
+
+
+def test_book_cache_unmaps_dropped_book(
+    tmp_path: Path, write_epub: Callable[..., Path]
+) -> None:
+    """The mapped buffer is closed with the book."""
+    epub_fp = write_epub(tmp_path / "book.epub", 2)
+    cache = ParsedBookCache(tmp_path / "cache")
+    Epub.from_zip(epub_fp, cache=cache)
+    ep = Epub.from_zip(epub_fp, cache=cache)
+    sec = ep.chapters[0].sections[0]
+    assert isinstance(sec, MappedEpubSection)
+    buffer = sec.buffer
+    del ep, sec
+    gc.collect()
+    assert buffer.closed
@@ -0,0 +1,138 @@
+"""Test the book text buffer and the cached texts."""
+
+import pytest
+
+from epub_summary.epubber.book_text import ChapterText
+from epub_summary.epubber.epub import (
+    Epub,
+    EpubChapter,
+    EpubParagraph,
+    EpubSection,
+    HtmlChapterParserLxml,
+)
+
+
+def make_section(title: str, p_strs: list[str]) -> EpubSection:
+    """Make a section from paragraph strings."""
+    return EpubSection.from_data((title, p_strs))
+
+
+def make_epub() -> Epub:
+    """Make an epub with empty sections and chapters in the mix."""
+    ep = Epub()
+    chapters_data = [
+        [["One two.", "Three four five."], ["Six."]],
+        [],
+        [[], ["Seven eight", ""]],
+    ]
+    for i, sections_data in enumerate(chapters_data):
+        sections = [make_section(f"s{j}", d) for j, d in enumerate(sections_data)]
+        chapter = EpubChapter.from_sections(
+            "", f"ch{i}", HtmlChapterParserLxml(), sections
+        )
+        ep.add_chapter(chapter)
+    return ep
+
+
+def test_book_text_matches_chapters() -> None:
+    """The slices of the buffer match the joined texts."""
+    ep = make_epub()
+    bt = ep.book_text
+    assert bt.get_text() == "\n".join(ch.text for ch in ep.chapters)
+    for i, chapter in enumerate(ep.chapters):
+        assert bt.get_text(i) == chapter.text
+        assert bt.count_chars(i) == len(chapter.text)
+        assert bt.count_words(i) == len(chapter.text.split())
+        for j, section in enumerate(chapter.sections):
+            assert bt.get_text(i, j) == section.text
+            assert bt.count_words(i, j) == len(section.text.split())
+            for k, par in enumerate(section.paragraphs):
+                assert bt.get_text(i, j, k) == par.p_str
+    assert bt.count_words() == 8
+    assert bt.count_tokens(0) == len(ep.chapters[0].text) // 4 + 1
+    with pytest.raises(IndexError):
+        bt.get_text(0, 2)
+    with pytest.raises(IndexError):
+        bt.get_text(0, 1, 1)
+
+
+def test_cached_text_invalidated() -> None:
+    """A changed paragraph refreshes the texts and the buffer."""
+    ep = make_epub()
+    chapter = ep.chapters[0]
+    bt = ep.book_text
+    assert chapter.text == bt.get_text(0)
+    assert ep.book_text is bt
+
+    chapter.sections[1].paragraphs[0].set_p_str("Changed here.")
+    assert bt.is_stale
+    assert chapter.text == "One two.\nThree four five.\nChanged here."
+    assert ep.book_text.count_words(0, 1) == 2
+
+    chapter.sections[1].add_paragraph(EpubParagraph.from_p_str("Added."))
+    assert chapter.text.endswith("Changed here.\nAdded.")
+    chapter.sections = chapter.sections[:1]
+    assert chapter.text == "One two.\nThree four five."
+    assert ep.book_text.get_text(0) == chapter.text
+
+
+def test_direct_edits_refresh_text() -> None:
+    """Edits made in place on the lists and paragraphs are seen."""
+    ep = make_epub()
+    chapter = ep.chapters[0]
+    chapter.sections[0].paragraphs[0].p_str = "Direct."
+    assert chapter.text.startswith("Direct.\n")
+    chapter.sections[1].paragraphs.append(EpubParagraph.from_p_str("Appended."))
+    assert chapter.sections[1].text == "Six.\nAppended."
+    del chapter.sections[0]
+    assert chapter.text == "Six.\nAppended."
+    assert ep.book_text.get_text(0) == chapter.text
+
+
+def test_other_book_keeps_buffer() -> None:
+    """A change in a book does not rebuild the buffer of another one."""
+    ep_a = make_epub()
+    ep_b = make_epub()
+    bt_a = ep_a.book_text
+    ep_b.chapters[0].sections[0].paragraphs[0].set_p_str("Changed.")
+    assert ep_a.book_text is bt_a
+    assert not bt_a.is_stale
+
+
+def test_chapter_alone() -> None:
+    """A chapter in no book slices its own buffer."""
+    chapter = EpubChapter.from_sections(
+        "", "ch", HtmlChapterParserLxml(), [make_section("s", ["A.", "B."])]
+    )
+    assert chapter.text == "A.\nB."
+    chapter.sections[0].paragraphs[1].p_str = "C."
+    assert chapter.text == "A.\nC."
+    assert chapter.sections[0].text == "A.\nC."
+
+
+def test_read_after_write_joins_one_chapter(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Reading a chapter after writing it joins that chapter, not the book."""
+    ep = Epub()
+    for i in range(50):
+        ep.add_chapter(
+            EpubChapter.from_sections(
+                "", f"ch{i}", HtmlChapterParserLxml(), [make_section("s", ["A."])]
+            )
+        )
+    assert ep.book_text.count_words() == 50
+    joined: list[int] = []
+    init = ChapterText.__init__
+
+    def count_joins(self: ChapterText, chapter: EpubChapter) -> None:
+        joined.append(len(chapter.sections))
+        init(self, chapter)
+
+    monkeypatch.setattr(ChapterText, "__init__", count_joins)
+    for chapter in ep.chapters[:10]:
+        chapter.text = chapter.text + " Revised."
+        assert chapter.text == "A. Revised."
+    assert len(joined) == 10
+    # the book only joins the chapters that changed
+    assert ep.book_text.get_text(9) == "A. Revised."
+    assert ep.book_text.count_words() == 60
+    assert len(joined) == 10
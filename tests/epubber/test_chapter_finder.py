@@ -110,3 +110,22 @@ def test_fcf_same_stem_diff_numbers() -> None:
     ]
     cfp = find_chapter_files(zfp)
     assert cfp == zfp
+
+
+def test_fcf_many_chapters() -> None:
+    """The function can sort thousands of shuffled chapter files."""
+    expected = [Path(f"text/part_{i}.xhtml") for i in range(3000)]
+    zfp = expected[::-1] + [Path("text/cover.xhtml")]
+    cfp = find_chapter_files(zfp)
+    assert cfp == expected
+
+
+def test_fcf_special_chars() -> None:
+    """The prefix is matched literally, not as a regex."""
+    zfp = [
+        Path("ch(1).xhtml"),
+        Path("ch(3).xhtml"),
+        Path("ch(2).xhtml"),
+    ]
+    cfp = find_chapter_files(zfp)
+    assert cfp == [zfp[0], zfp[2], zfp[1]]
@@ -0,0 +1,84 @@
+"""Test that the lxml chapter parser matches the BeautifulSoup one."""
+
+from pathlib import Path
+import zipfile
+
+import pytest
+
+from epub_summary.epubber.epub import (
+    Epub,
+    HtmlChapterParserLxml,
+    HtmlChapterParserSections,
+    HtmlChapterParserSingle,
+)
+
+HTML_SAMPLES = {
+    "simple": "<html><body><p>One.</p><p>Two.</p></body></html>",
+    "xhtml": (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>T</title></head>'
+        "<body><p>One.</p></body></html>"
+    ),
+    "inline": "<body><p>Some <i>italic</i> and <b>bold <span>nested</span></b>.</p></body>",
+    "entities": "<body><p>Caf&eacute; &amp; bar &lt;ok&gt; &#8212; done</p></body>",
+    "newlines": "<body><p>Line one\nline two\r\nline three</p></body>",
+    "nested_div": "<body><div><section><p>Deep.</p></section></div><p>Top.</p></body>",
+    "comment": "<body><p>Before<!-- hidden -->after</p></body>",
+    "br": "<body><p>First<br/>second</p></body>",
+    "unicode": "<body><p>“Quoted” — ñ 日本</p></body>",
+    "empty_p": "<body><p></p><p>Text</p></body>",
+    "no_p": "<body><div>No paragraphs here.</div></body>",
+    "head_only": "<html><head><title>T</title></head></html>",
+    "unclosed_p": "<body><p>One<p>Two<div>Three</div></body>",
+    "script": "<body><p><script>var x=1;</script>Hello</p></body>",
+    "style_template": (
+        "<body><p><style>p {}</style>Hi <template><b>t</b></template>there</p></body>"
+    ),
+    "ruby": "<body><p><ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>字</p></body>",
+    "pretty_inline": "<body><p>a <i>x</i>\n\n<i>y</i></p></body>",
+    "pretty_indent": "<body><p>\n  <i>x</i>\n  <b>y</b>\n</p></body>",
+    "pretty_br": "<body><p>a<br/>\n<br/>\n  b</p></body>",
+    "tab_and_comment": "<body><p><i>a</i>\t<b>b</b><!--c-->\r\n<i>c</i></p></body>",
+}
+
+
+def sections_data(parser, html: str) -> list[tuple[str, list[str]]]:
+    """Parse the html and get the compact section data."""
+    return [sec.to_data() for sec in parser.parse(html)]
+
+
+@pytest.mark.parametrize("name", sorted(HTML_SAMPLES))
+def test_parser_parity(name: str) -> None:
+    """The two parsers give the same sections and paragraphs."""
+    html = HTML_SAMPLES[name]
+    expected = sections_data(HtmlChapterParserSingle(), html)
+    actual = sections_data(HtmlChapterParserLxml(), html)
+    assert actual == expected
+
+
+@pytest.mark.parametrize("name", sorted(HTML_SAMPLES))
+def test_section_parser_paragraphs(name: str) -> None:
+    """The section parser finds the same paragraphs, maybe split differently."""
+    html = HTML_SAMPLES[name]
+    expected = sections_data(HtmlChapterParserLxml(), html)
+    actual = sections_data(HtmlChapterParserSections(), html)
+    assert [p for _, ps in actual for p in ps] == [p for _, ps in expected for p in ps]
+
+
+def test_parser_lxml_empty() -> None:
+    """The lxml parser handles an empty document."""
+    assert HtmlChapterParserLxml().parse("") == []
+
+
+def test_epub_parser_selection(tmp_path: Path) -> None:
+    """The parser can be selected per epub load."""
+    epub_fp = tmp_path / "book.epub"
+    with zipfile.ZipFile(epub_fp, "w") as zf:
+        for i in range(1, 4):
+            zf.writestr(f"chapter{i}.xhtml", f"<body><p>Chapter {i}.</p></body>")
+    ep_bs4 = Epub.from_zip(epub_fp)
+    ep_lxml = Epub.from_zip(epub_fp, parser_cls=HtmlChapterParserLxml)
+    assert all(isinstance(c.parser, HtmlChapterParserLxml) for c in ep_lxml.chapters)
+    assert [c.text for c in ep_lxml.chapters] == [c.text for c in ep_bs4.chapters]
+    with Epub.open(epub_fp, parser_cls=HtmlChapterParserLxml) as ep_lazy:
+        assert isinstance(ep_lazy.chapters[0].parser, HtmlChapterParserLxml)
@@ -0,0 +1,53 @@
+"""Test setting the text of chapters."""
+
+import pytest
+
+from epub_summary.epubber.epub import (
+    Epub,
+    EpubChapter,
+    HtmlChapterParserLxml,
+    HtmlChapterParserSingle,
+)
+
+
+def make_chapter() -> EpubChapter:
+    """Make a chapter with two parsed paragraphs."""
+    html = "<html><body><p>Old one.</p><p>Old two.</p></body></html>"
+    return EpubChapter.from_html(html, "chapter1", HtmlChapterParserSingle())
+
+
+def test_text_setter_replaces() -> None:
+    """The new text replaces the sections instead of adding to them."""
+    chapter = make_chapter()
+    chapter.text = "New one.\nNew two.\nNew three."
+    assert len(chapter.sections) == 1
+    assert [p.p_str for p in chapter.sections[0].paragraphs] == [
+        "New one.",
+        "New two.",
+        "New three.",
+    ]
+    assert chapter.text == "New one.\nNew two.\nNew three."
+    chapter.text = "Again."
+    assert chapter.text == "Again."
+    assert chapter.sections[0].text == "Again."
+
+
+@pytest.mark.parametrize("parser_cls", [HtmlChapterParserSingle, HtmlChapterParserLxml])
+def test_text_setter_html_escaped(parser_cls) -> None:
+    """The html of the chapter parses back to the same text."""
+    chapter = make_chapter()
+    text = "Fish & chips <b>not bold</b>.\n\nA < B > C."
+    chapter.text = text
+    assert "&amp;" in chapter.html
+    reparsed = EpubChapter.from_html(chapter.html, "chapter1", parser_cls())
+    assert reparsed.text == text
+
+
+def test_set_chapter_texts() -> None:
+    """Many chapters are updated at once, the others are untouched."""
+    ep = Epub()
+    for _ in range(3):
+        ep.add_chapter(make_chapter())
+    ep.set_chapter_texts({0: "Zero.", 2: "Two."})
+    assert [ch.text for ch in ep.chapters] == ["Zero.", "Old one.\nOld two.", "Two."]
+    assert ep.book_text.get_text(2) == "Two."
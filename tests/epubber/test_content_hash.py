@@ -0,0 +1,36 @@
+"""Test the content hashes of paragraphs, sections and chapters."""
+
+from epub_summary.epubber.epub import (
+    EpubChapter,
+    EpubParagraph,
+    EpubSection,
+    HtmlChapterParserLxml,
+    HtmlChapterParserSingle,
+)
+
+HTML = "<body><p>One.</p><p>Two.</p></body>"
+
+
+def test_paragraph_hash_stable() -> None:
+    """Equal text gives equal hashes."""
+    par_a = EpubParagraph.from_p_str("Some text.")
+    par_b = EpubParagraph.from_p_str("Some text.")
+    assert par_a.content_hash == par_b.content_hash
+    par_b.set_p_str("Other text.")
+    assert par_a.content_hash != par_b.content_hash
+
+
+def test_section_hash_order() -> None:
+    """The section hash depends on the paragraph order."""
+    sec_a = EpubSection.from_data(("default", ["a", "b"]))
+    sec_b = EpubSection.from_data(("default", ["b", "a"]))
+    assert sec_a.content_hash != sec_b.content_hash
+
+
+def test_chapter_hash_parser_independent() -> None:
+    """Chapters with the same content hash the same with any parser."""
+    ch_bs4 = EpubChapter.from_html(HTML, "c", HtmlChapterParserSingle())
+    ch_lxml = EpubChapter.from_html(HTML, "c", HtmlChapterParserLxml())
+    assert ch_bs4.content_hash == ch_lxml.content_hash
+    ch_bs4.sections[0].paragraphs[1].set_p_str("Changed.")
+    assert ch_bs4.content_hash != ch_lxml.content_hash
@@ -0,0 +1,102 @@
+"""Test the lazy epub loader."""
+
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from epub_summary.epubber.epub import Epub, LazyEpubChapters
+
+
+@pytest.fixture
+def epub_fp(tmp_path: Path, write_epub: Callable[..., Path]) -> Path:
+    return write_epub(tmp_path / "book.epub", 5)
+
+
+def test_open_matches_from_zip(epub_fp: Path) -> None:
+    """The lazy chapters have the same text as the eager ones."""
+    ep_eager = Epub.from_zip(epub_fp)
+    with Epub.open(epub_fp) as ep_lazy:
+        assert isinstance(ep_lazy.chapters, LazyEpubChapters)
+        assert len(ep_lazy.chapters) == len(ep_eager.chapters) == 5
+        for ch_lazy, ch_eager in zip(ep_lazy.chapters, ep_eager.chapters):
+            assert ch_lazy.chap_stem == ch_eager.chap_stem
+            assert ch_lazy.text == ch_eager.text
+        assert [c.chap_stem for c in ep_lazy.chapters[1:3]] == ["chapter2", "chapter3"]
+        assert ep_lazy.chapters[-1].chap_stem == "chapter5"
+
+
+def test_open_parses_on_access(epub_fp: Path) -> None:
+    """Chapters are parsed only when accessed."""
+    with Epub.open(epub_fp) as ep:
+        assert len(ep.chapters.cache) == 0
+        ch = ep.chapters[2]
+        assert list(ep.chapters.cache) == [2]
+        assert ep.chapters[2] is ch
+
+
+def test_open_lru_bounded(epub_fp: Path) -> None:
+    """The parsed chapter cache is bounded."""
+    with Epub.open(epub_fp, cache_size=2) as ep:
+        ep.chapters[0]
+        ep.chapters[1]
+        ep.chapters[0]
+        ep.chapters[3]
+        assert list(ep.chapters.cache) == [0, 3]
+
+
+def test_open_closes_zip(epub_fp: Path) -> None:
+    """The zip file is closed when leaving the context."""
+    with Epub.open(epub_fp) as ep:
+        assert ep.input_zip is not None
+    assert ep.input_zip is None
+    with pytest.raises(ValueError):
+        ep.chapters[0]
+
+
+def test_from_zip_closes_zip(epub_fp: Path) -> None:
+    """The eager loader does not leave the zip file open."""
+    ep = Epub.from_zip(epub_fp)
+    assert ep.input_zip is None
+    assert len(ep.chapters) == 5
+
+
+def test_open_pins_modified_chapters(epub_fp: Path) -> None:
+    """Edits to a lazy chapter survive its eviction from the cache."""
+    with Epub.open(epub_fp, cache_size=1) as ep:
+        ep.chapters[0].text = "Edited."
+        ep.chapters[1]
+        ep.chapters[2]
+        assert list(ep.chapters.cache) == [2]
+        assert ep.chapters[0].text == "Edited."
+        ep.set_chapter_texts({3: "Also edited."})
+        ep.chapters[4]
+        assert ep.chapters[3].text == "Also edited."
+        assert ep.chapters[1].text == "\n".join(
+            f"Chapter 2 café par {j}." for j in range(3)
+        )
+        with pytest.raises(TypeError):
+            ep.add_chapter(ep.chapters[0])
+
+
+def test_book_text_keeps_lru_bound(epub_fp: Path) -> None:
+    """The book text of a lazy book does not keep the chapters in memory."""
+    ep_eager = Epub.from_zip(epub_fp)
+    with Epub.open(epub_fp, cache_size=2) as ep:
+        assert ep.book_text.get_text() == ep_eager.book_text.get_text()
+        assert len(ep.chapters.cache) == 0
+        assert len(ep.chapters.pinned) == 0
+        loaded: list[Path] = []
+        load_chapter = ep.load_chapter
+
+        def count_loads(chapter_fp: Path):
+            loaded.append(chapter_fp)
+            return load_chapter(chapter_fp)
+
+        ep.load_chapter = count_loads
+        ep.chapters[1].text = "Edited."
+        assert ep.book_text.get_text(1) == "Edited."
+        assert ep.book_text.get_text(0) == ep_eager.chapters[0].text
+        # only the edited chapter was parsed again
+        assert len(loaded) == 1
+        assert len(ep.chapters.cache) <= 2
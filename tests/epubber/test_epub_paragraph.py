@@ -0,0 +1,36 @@
+"""Test the epub paragraph."""
+
+from bs4 import BeautifulSoup
+
+from epub_summary.epubber.epub import EpubParagraph
+
+
+def test_paragraph_from_p_tag() -> None:
+    """The paragraph keeps the normalized text of the tag."""
+    soup = BeautifulSoup("<p>Some\ntext\nhere</p>", features="lxml")
+    par = EpubParagraph.from_p_tag(soup.p)
+    assert par.p_str == "Some text here"
+
+
+def test_paragraph_p_tag_is_lazy() -> None:
+    """The p tag is built on first access and then kept."""
+    par = EpubParagraph.from_p_str("Some text")
+    assert par._p_tag is None
+    p_tag = par.p_tag
+    assert p_tag.name == "p"
+    assert p_tag.text == "Some text"
+    assert par.p_tag is p_tag
+
+
+def test_paragraph_set_p_str_resets_tag() -> None:
+    """Setting a new string drops the cached tag."""
+    par = EpubParagraph.from_p_str("Old text")
+    par.p_tag
+    par.set_p_str("New text")
+    assert par.p_tag.text == "New text"
+
+
+def test_paragraph_slots() -> None:
+    """The paragraph has no instance dict."""
+    par = EpubParagraph()
+    assert not hasattr(par, "__dict__")
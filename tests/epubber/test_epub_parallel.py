@@ -0,0 +1,30 @@
+"""Test the parallel epub loader."""
+
+from collections.abc import Callable
+from pathlib import Path
+
+from epub_summary.epubber.epub import MIN_PARALLEL_CHAPTERS, Epub
+
+
+def test_parallel_matches_serial(
+    tmp_path: Path, write_epub: Callable[..., Path]
+) -> None:
+    """The parallel load gives the same chapters in the same order."""
+    epub_fp = write_epub(tmp_path / "book.epub", MIN_PARALLEL_CHAPTERS + 4, 10)
+    ep_serial = Epub.from_zip(epub_fp)
+    ep_parallel = Epub.from_zip(epub_fp, workers=2)
+    assert len(ep_parallel.chapters) == len(ep_serial.chapters)
+    for ch_par, ch_ser in zip(ep_parallel.chapters, ep_serial.chapters):
+        assert ch_par.chap_stem == ch_ser.chap_stem
+        assert ch_par.html == ch_ser.html
+        assert ch_par.text == ch_ser.text
+        assert [s.section_title for s in ch_par.sections] == ["default"]
+
+
+def test_parallel_small_book_falls_back(
+    tmp_path: Path, write_epub: Callable[..., Path]
+) -> None:
+    """Small books are loaded serially."""
+    epub_fp = write_epub(tmp_path / "book.epub", 3, 10)
+    ep = Epub.from_zip(epub_fp, workers=4)
+    assert [c.chap_stem for c in ep.chapters] == ["chapter1", "chapter2", "chapter3"]
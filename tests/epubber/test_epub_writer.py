@@ -0,0 +1,117 @@
+"""Test the streaming epub writer."""
+
+from pathlib import Path
+import zipfile
+
+import pytest
+
+from epub_summary.benchmark.synthetic import SyntheticEpubConfig, write_synthetic_epub
+from epub_summary.epubber import epub_writer
+from epub_summary.epubber.epub import Epub, HtmlChapterParserLxml
+from epub_summary.epubber.epub_writer import EpubWriter, text_to_xhtml
+from epub_summary.epubber.utils import find_head
+
+
+@pytest.fixture
+def source_fp(tmp_path: Path) -> Path:
+    config = SyntheticEpubConfig(num_chapters=4, paragraphs_per_chapter=5, num_images=3)
+    return write_synthetic_epub(tmp_path / "book.epub", config)
+
+
+def read_raw(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    """Read the compressed bytes of an entry."""
+    assert zf.fp is not None
+    zf.fp.seek(info.header_offset + zipfile.sizeFileHeader)
+    zf.fp.seek(len(info.filename.encode()) + len(info.extra), 1)
+    return zf.fp.read(info.compress_size)
+
+
+def test_text_to_xhtml() -> None:
+    """The text is escaped and split in paragraphs."""
+    xhtml = text_to_xhtml("a < b\nc & d", title="T")
+    assert "<p>a &lt; b</p>\n<p>c &amp; d</p>" in xhtml
+    assert "<title>T</title>" in xhtml
+    head = '<head><link rel="stylesheet" href="style.css"/></head>'
+    xhtml = text_to_xhtml("a", title="T", head=head)
+    assert find_head(xhtml) == head
+
+
+def test_write_revised_chapters(source_fp: Path, tmp_path: Path) -> None:
+    """Revised chapters are replaced, everything else is copied untouched."""
+    output_fp = tmp_path / "out" / "book.epub"
+    with EpubWriter(source_fp, output_fp) as writer:
+        assert len(writer.chapter_fps) == 4
+        writer.write_chapter_text(2, "Revised two.\nSecond line.")
+        writer.write_chapter_text(0, "Revised zero.")
+        revised_names = {writer.chapter_fps[i].as_posix() for i in [0, 2]}
+
+    with zipfile.ZipFile(source_fp) as src, zipfile.ZipFile(output_fp) as out:
+        assert out.testzip() is None
+        assert out.infolist()[0].filename == "mimetype"
+        assert out.infolist()[0].compress_type == zipfile.ZIP_STORED
+        assert sorted(out.namelist()) == sorted(src.namelist())
+        for name in src.namelist():
+            if name in revised_names:
+                continue
+            src_info, out_info = src.getinfo(name), out.getinfo(name)
+            assert out_info.CRC == src_info.CRC
+            assert read_raw(out, out_info) == read_raw(src, src_info)
+
+    revised = Epub.from_zip(output_fp, parser_cls=HtmlChapterParserLxml)
+    original = Epub.from_zip(source_fp, parser_cls=HtmlChapterParserLxml)
+    texts = [ch.text for ch in revised.chapters]
+    assert texts[0] == "Revised zero."
+    assert texts[2] == "Revised two.\nSecond line."
+    assert texts[1] == original.chapters[1].text
+    assert texts[3] == original.chapters[3].text
+
+
+def test_write_keeps_head(source_fp: Path, tmp_path: Path) -> None:
+    """A revised chapter keeps the head of the source chapter."""
+    output_fp = tmp_path / "out.epub"
+    with EpubWriter(source_fp, output_fp) as writer:
+        name = writer.chapter_fps[1].as_posix()
+        writer.write_chapter_text(1, "Revised one.")
+    with zipfile.ZipFile(source_fp) as src, zipfile.ZipFile(output_fp) as out:
+        source_head = find_head(src.read(name).decode())
+        assert source_head is not None
+        assert find_head(out.read(name).decode()) == source_head
+
+
+def test_write_without_raw_copy(
+    source_fp: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Without the zipfile internals the entries are recompressed."""
+    monkeypatch.setattr(epub_writer, "RAW_COPY_SUPPORTED", False)
+    output_fp = tmp_path / "out.epub"
+    with EpubWriter(source_fp, output_fp) as writer:
+        assert not writer.raw_copy
+        writer.write_chapter_text(0, "Revised zero.")
+        revised_name = writer.chapter_fps[0].as_posix()
+
+    with zipfile.ZipFile(source_fp) as src, zipfile.ZipFile(output_fp) as out:
+        assert out.testzip() is None
+        assert out.infolist()[0].filename == "mimetype"
+        assert out.infolist()[0].compress_type == zipfile.ZIP_STORED
+        assert sorted(out.namelist()) == sorted(src.namelist())
+        for name in src.namelist():
+            if name != revised_name:
+                assert out.read(name) == src.read(name)
+
+
+def test_write_twice_fails(source_fp: Path, tmp_path: Path) -> None:
+    """A chapter can only be replaced once."""
+    with EpubWriter(source_fp, tmp_path / "out.epub") as writer:
+        writer.write_chapter_text(1, "One.")
+        with pytest.raises(ValueError, match="already written"):
+            writer.write_chapter_text(1, "Again.")
+
+
+def test_abort_removes_output(source_fp: Path, tmp_path: Path) -> None:
+    """A failure while writing leaves no partial epub behind."""
+    output_fp = tmp_path / "out.epub"
+    with pytest.raises(RuntimeError), EpubWriter(source_fp, output_fp) as writer:
+        writer.write_chapter_text(0, "Zero.")
+        raise RuntimeError("boom")
+    assert not output_fp.exists()
+    assert not writer.tmp_fp.exists()
@@ -0,0 +1,43 @@
+"""Test the multi-section chapter parser."""
+
+import pytest
+
+from epub_summary.epubber.epub import HtmlChapterParserSections
+
+CHAPTER_HTML = """<body>
+<p>Intro.</p>
+<h1>Chapter 1</h1><h2>The Storm</h2>
+<p>Rain.</p>
+<p>* * *</p>
+<p>After.</p>
+<hr/>
+<p>Later.</p>
+<section><h3>Inner</h3><p>In.</p><section><p>Deeper.</p></section><p>Back in.</p></section>
+<p>Out.</p>
+</body>"""
+
+
+def sections_data(html: str) -> list[tuple[str, list[str]]]:
+    """Parse the html with the section parser."""
+    return [sec.to_data() for sec in HtmlChapterParserSections().parse(html)]
+
+
+def test_split_sections() -> None:
+    """Headings, scene breaks and section tags start new sections."""
+    assert sections_data(CHAPTER_HTML) == [
+        ("default", ["Intro."]),
+        ("Chapter 1: The Storm", ["Rain."]),
+        ("Chapter 1: The Storm", ["After."]),
+        ("Chapter 1: The Storm", ["Later."]),
+        ("Inner", ["In."]),
+        ("Inner", ["Deeper."]),
+        ("Inner", ["Back in."]),
+        ("Chapter 1: The Storm", ["Out."]),
+    ]
+
+
+@pytest.mark.parametrize("marker", ["***", "* * *", "#", "⁂", "~ ~ ~"])
+def test_scene_break_markers(marker: str) -> None:
+    """The common scene break markers split the section and are dropped."""
+    html = f"<body><p>Before.</p><p> {marker} </p><p>After.</p></body>"
+    assert sections_data(html) == [("default", ["Before."]), ("default", ["After."])]
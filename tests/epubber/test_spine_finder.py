@@ -0,0 +1,91 @@
+"""Test the OPF spine chapter finder."""
+
+from pathlib import Path
+import zipfile
+
+from epub_summary.epubber.epub import Epub
+from epub_summary.epubber.utils import find_spine_files
+
+CONTAINER_XML = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+CONTENT_OPF = """<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    <item id="css" href="style.css" media-type="text/css"/>
+    <item id="open" href="text/the%20opening.xhtml" media-type="application/xhtml+xml"/>
+    <item id="mid" href="text/middle.xhtml" media-type="application/xhtml+xml"/>
+    <item id="end" href="text/zz_end.xhtml" media-type="application/xhtml+xml"/>
+    <item id="back" href="../Extra/./back.xhtml" media-type="application/xhtml+xml"/>
+  </manifest>
+  <spine>
+    <itemref idref="nav" linear="no"/>
+    <itemref idref="open"/>
+    <itemref idref="mid"/>
+    <itemref idref="missing"/>
+    <itemref idref="end"/>
+    <itemref idref="back"/>
+  </spine>
+</package>
+"""
+
+
+def write_epub(epub_fp: Path, container: str | None, opf: str | None) -> Path:
+    """Write an epub with the given container and OPF."""
+    with zipfile.ZipFile(epub_fp, "w") as zf:
+        if container is not None:
+            zf.writestr("META-INF/container.xml", container)
+        if opf is not None:
+            zf.writestr("OEBPS/content.opf", opf)
+        zf.writestr("OEBPS/nav.xhtml", "<body><p>Nav</p></body>")
+        zf.writestr("OEBPS/style.css", "p {}")
+        zf.writestr("OEBPS/text/zz_end.xhtml", "<body><p>End</p></body>")
+        zf.writestr("OEBPS/text/middle.xhtml", "<body><p>Middle</p></body>")
+        zf.writestr("OEBPS/text/the opening.xhtml", "<body><p>Opening</p></body>")
+        zf.writestr("Extra/back.xhtml", "<body><p>Back</p></body>")
+    return epub_fp
+
+
+def test_spine_order(tmp_path: Path) -> None:
+    """The chapters follow the spine order, not the file names."""
+    epub_fp = write_epub(tmp_path / "book.epub", CONTAINER_XML, CONTENT_OPF)
+    with zipfile.ZipFile(epub_fp) as zf:
+        spine_fps = find_spine_files(zf)
+    assert spine_fps == [
+        Path("OEBPS/text/the opening.xhtml"),
+        Path("OEBPS/text/middle.xhtml"),
+        Path("OEBPS/text/zz_end.xhtml"),
+        Path("Extra/back.xhtml"),
+    ]
+    ep = Epub.from_zip(epub_fp)
+    assert [c.text for c in ep.chapters] == ["Opening", "Middle", "End", "Back"]
+
+
+def test_spine_missing_container(tmp_path: Path) -> None:
+    """Without a container the spine finder gives up."""
+    epub_fp = write_epub(tmp_path / "book.epub", None, CONTENT_OPF)
+    with zipfile.ZipFile(epub_fp) as zf:
+        assert find_spine_files(zf) is None
+
+
+def test_spine_broken_opf(tmp_path: Path) -> None:
+    """With a broken OPF the loader falls back to the heuristic."""
+    epub_fp = write_epub(tmp_path / "book.epub", CONTAINER_XML, "<package><spine>")
+    with zipfile.ZipFile(epub_fp) as zf:
+        assert find_spine_files(zf) is None
+    ep = Epub.from_zip(epub_fp)
+    texts = {c.text for c in ep.chapters}
+    assert {"Nav", "Opening", "Middle", "End"} <= texts
+
+
+def test_spine_missing_opf(tmp_path: Path) -> None:
+    """With a container pointing to a missing OPF the spine finder gives up."""
+    epub_fp = write_epub(tmp_path / "book.epub", CONTAINER_XML, None)
+    with zipfile.ZipFile(epub_fp) as zf:
+        assert find_spine_files(zf) is None
@@ -0,0 +1,90 @@
+"""Test the pipeline metrics and their export."""
+
+import io
+import json
+from pathlib import Path
+
+from epub_summary.benchmark.fake_chat import FakeChatModel
+from epub_summary.benchmark.synthetic import SyntheticEpubConfig, write_synthetic_epub
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.epubber.epub import Epub
+from epub_summary.metrics.export import (
+    JsonLinesSink,
+    to_json_lines,
+    to_prometheus_text,
+    write_prometheus_file,
+)
+from epub_summary.metrics.registry import METRICS, MetricsRegistry
+from epub_summary.summarizer.reviser import ChapterReviser
+
+
+def test_registry_aggregates() -> None:
+    """Counters and timings are aggregated per name and labels."""
+    registry = MetricsRegistry()
+    registry.incr("books")
+    registry.incr("books", 2)
+    registry.incr("books", parser="lxml")
+    with registry.timer("load"):
+        pass
+    assert registry.get("books").total == 3
+    assert registry.get("books", parser="lxml").total == 1
+    assert registry.get("load").count == 1
+
+
+def test_registry_disabled() -> None:
+    """A disabled registry records nothing."""
+    registry = MetricsRegistry(enabled=False)
+    registry.incr("books")
+    with registry.timer("load"):
+        pass
+    assert registry.values == {}
+
+
+def test_registry_sink() -> None:
+    """The events are forwarded to the sinks."""
+    registry = MetricsRegistry()
+    stream = io.StringIO()
+    sink = JsonLinesSink(stream)
+    registry.add_sink(sink)
+    registry.incr("books", parser="lxml")
+    registry.remove_sink(sink)
+    registry.incr("books")
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(events) == 1
+    assert events[0]["name"] == "books"
+    assert events[0]["labels"] == {"parser": "lxml"}
+
+
+def test_export_formats(tmp_path: Path) -> None:
+    """The metrics export as json lines and Prometheus text."""
+    registry = MetricsRegistry()
+    registry.incr("epub.chapters", 4)
+    registry.timing("llm.latency", 0.5, model='gpt"x')
+    lines = [json.loads(line) for line in to_json_lines(registry).splitlines()]
+    assert {line["name"] for line in lines} == {"epub.chapters", "llm.latency"}
+    prom = to_prometheus_text(registry)
+    assert "# TYPE epub_summary_epub_chapters_total counter" in prom
+    assert "epub_summary_epub_chapters_total 4" in prom
+    assert 'epub_summary_llm_latency_seconds_count{model="gpt\\"x"} 1' in prom
+    prom_fp = tmp_path / "metrics.prom"
+    write_prometheus_file(registry, prom_fp)
+    assert prom_fp.read_text() == prom
+
+
+def test_pipeline_instrumented(tmp_path: Path) -> None:
+    """Loading and revising a book records the pipeline metrics."""
+    config = SyntheticEpubConfig(num_chapters=3, paragraphs_per_chapter=5)
+    epub_fp = write_synthetic_epub(tmp_path / "book.epub", config)
+    METRICS.reset()
+    ep = Epub.from_zip(epub_fp)
+    assert METRICS.get("epub.load_zip").count == 1
+    assert METRICS.get("epub.chapters").total == 3
+    assert METRICS.get("epub.bytes_read").total > 0
+    assert METRICS.get("chapter.paragraphs").total == 15
+    assert METRICS.get("parser.tree", parser="HtmlChapterParserSingle").count == 3
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake"), chat_model=FakeChatModel())
+    cr.invoke(ep.chapters[0].text)
+    assert METRICS.get("llm.requests").total == 1
+    assert METRICS.get("llm.latency").count == 1
+    assert METRICS.get("llm.prompt_tokens").total > 0
+    assert METRICS.get("llm.completion_tokens").total > 0
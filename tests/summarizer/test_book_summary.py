@@ -0,0 +1,119 @@
+"""Test the book summary by tree reduction."""
+
+import pytest
+
+from epub_summary.benchmark.fake_chat import FakeChatModel
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.book_summary import (
+    BookSummarizer,
+    SummaryNode,
+    chapter_summary_template,
+    combined_summary_template,
+)
+from epub_summary.summarizer.chunker import chunk_text
+from epub_summary.summarizer.reviser import ChapterReviser
+
+
+def make_summarizer(fan_in: int = 2, latency_s: float = 0.0) -> BookSummarizer:
+    """Make a summarizer on the fake chat model."""
+    fake_model = FakeChatModel(latency_s=latency_s)
+    reviser = ChapterReviser(
+        ChatOpenAIConfig(api_key="fake"), max_concurrency=64, chat_model=fake_model
+    )
+    return BookSummarizer(reviser, fan_in=fan_in)
+
+
+def make_chapters(num_chapters: int) -> list[str]:
+    """Make distinct chapter texts."""
+    return [
+        f"Chapter {i} tells the story of the day number {i}."
+        for i in range(num_chapters)
+    ]
+
+
+@pytest.mark.parametrize(
+    ("num_chapters", "fan_in", "num_calls", "depth"),
+    [(8, 2, 15, 4), (5, 2, 9, 4), (7, 3, 10, 3), (1, 2, 1, 1)],
+)
+def test_tree_shape(num_chapters: int, fan_in: int, num_calls: int, depth: int) -> None:
+    """Each level combines fan_in nodes, a lone node is carried up for free."""
+    bs = make_summarizer(fan_in)
+    book_summary = bs.summarize(make_chapters(num_chapters))
+    assert bs.reviser.model.num_calls == num_calls
+    assert book_summary.root.depth == depth
+    assert len(book_summary.chapter_summaries) == num_chapters
+    assert (book_summary.root.first, book_summary.root.last) == (0, num_chapters)
+    assert book_summary.summary != ""
+
+
+def test_changed_chapter_recomputes_its_path() -> None:
+    """Only the nodes from the changed chapter to the root are summarized again."""
+    bs = make_summarizer()
+    chapters = make_chapters(8)
+    first = bs.summarize(chapters)
+    assert bs.reviser.model.num_calls == 15
+    chapters[3] = "A new chapter three."
+    second = bs.summarize(chapters)
+    assert bs.reviser.model.num_calls == 15 + 4
+    assert second.chapter_summaries[2] == first.chapter_summaries[2]
+    assert second.chapter_summaries[3] != first.chapter_summaries[3]
+    assert second.summary != first.summary
+
+
+def test_empty_chapters_are_skipped() -> None:
+    """Empty chapters cost no request and are left out of the combined summaries."""
+    bs = make_summarizer()
+    book_summary = bs.summarize(["", "The only chapter.", ""])
+    assert bs.reviser.model.num_calls == 1
+    assert book_summary.summary == book_summary.chapter_summaries[1]
+
+
+def test_long_chapter_is_chunked() -> None:
+    """A long chapter is summarized in chunks, reduced to the chapter node."""
+    bs = make_summarizer()
+    bs.reviser.max_chunk_tokens = 30
+    long_chapter = "\n".join(
+        f"Paragraph {i} of the long chapter goes on and on." for i in range(12)
+    )
+    chunks = chunk_text(long_chapter, 30, count_fn=bs.reviser.count_tokens)
+    assert len(chunks) > 2
+    book_summary = bs.summarize([long_chapter, "A short chapter."])
+    # a leaf and a combine per chunk, the short chapter and the root
+    assert bs.reviser.model.num_calls == 2 * len(chunks) - 1 + 2
+    assert len(book_summary.chapter_summaries) == 2
+    chapter_node = book_summary.root.children[0]
+    assert (chapter_node.first, chapter_node.last) == (0, 1)
+
+    def get_leaves(node: SummaryNode) -> list[SummaryNode]:
+        if len(node.children) == 0:
+            return [node]
+        return [leaf for child in node.children for leaf in get_leaves(child)]
+
+    assert len(get_leaves(chapter_node)) == len(chunks)
+    # the chunks are cached like the chapters
+    bs.summarize([long_chapter, "Another short chapter."])
+    assert bs.reviser.model.num_calls == 2 * len(chunks) + 1 + 2
+
+
+def test_levels_run_in_parallel() -> None:
+    """All the chapters are summarized at once, then each level at once."""
+    bs = make_summarizer(latency_s=0.05)
+    arun_chain = bs.reviser.arun_chain
+    in_flight: dict[str, int] = {}
+    peaks: dict[str, int] = {}
+
+    async def count_in_flight(chain, template, inputs, output_type):
+        in_flight[template] = in_flight.get(template, 0) + 1
+        peaks[template] = max(peaks.get(template, 0), in_flight[template])
+        try:
+            return await arun_chain(chain, template, inputs, output_type)
+        finally:
+            in_flight[template] -= 1
+
+    bs.reviser.arun_chain = count_in_flight
+    book_summary = bs.summarize(make_chapters(16))
+    assert bs.reviser.model.num_calls == 31
+    assert book_summary.root.depth == 5
+    assert peaks[chapter_summary_template] == 16
+    # the 8 combines of the first level
+    assert peaks[combined_summary_template] == 8
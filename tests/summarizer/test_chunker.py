@@ -0,0 +1,83 @@
+"""Test the chapter chunker and the chunked revision."""
+
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.epubber.epub import EpubChapter, EpubSection, HtmlChapterParserSingle
+from epub_summary.summarizer.chunker import chunk_chapter, chunk_sections
+from epub_summary.summarizer.reviser import ChapterRevised, ChapterReviser
+
+
+def count_words(text: str) -> int:
+    """Count one token per word."""
+    return len(text.split())
+
+
+def test_chunk_sections_budget() -> None:
+    """The chunks stay under the budget and keep the paragraph order."""
+    pars = [f"p{i} w w" for i in range(10)]
+    chunks = chunk_sections([pars], max_tokens=9, count_fn=count_words)
+    assert [c.paragraphs for c in chunks] == [
+        pars[0:2],
+        pars[2:4],
+        pars[4:6],
+        pars[6:8],
+        pars[8:10],
+    ]
+    assert [c.index for c in chunks] == list(range(5))
+
+
+def test_chunk_sections_keeps_sections_whole() -> None:
+    """A section that fits in a chunk is not split."""
+    sections = [["a b", "c d"], ["e f", "g h", "i j"]]
+    chunks = chunk_sections(sections, max_tokens=9, count_fn=count_words)
+    assert [c.paragraphs for c in chunks] == sections
+
+
+def test_chunk_sections_large_paragraph() -> None:
+    """A paragraph over the budget gets its own chunk."""
+    sections = [["a", "b " * 20, "c"]]
+    chunks = chunk_sections(sections, max_tokens=5, count_fn=count_words)
+    assert [len(c.paragraphs) for c in chunks] == [1, 1, 1]
+
+
+def test_chunk_sections_overlap() -> None:
+    """The previous paragraphs are the context of the next chunk."""
+    pars = ["a", "b", "c", "d"]
+    chunks = chunk_sections([pars], 4, overlap_paragraphs=1, count_fn=count_words)
+    assert [c.paragraphs for c in chunks] == [["a", "b"], ["c", "d"]]
+    assert [c.context for c in chunks] == ["", "b"]
+
+
+def test_chunk_chapter() -> None:
+    """A chapter is chunked along its sections."""
+    chapter = EpubChapter(HtmlChapterParserSingle())
+    for title in ["one", "two"]:
+        sec = EpubSection.from_data((title, [f"{title} paragraph text"] * 3))
+        chapter.add_section(sec)
+    chunks = chunk_chapter(chapter, max_tokens=20)
+    assert "\n".join(c.text for c in chunks) == chapter.text
+
+
+def test_revise_chapter_in_chunks() -> None:
+    """A long chapter is revised in concurrent chunks and stitched in order."""
+    seen_contexts = []
+
+    async def fake_revise(inputs: dict) -> ChapterRevised:
+        seen_contexts.append(inputs.get("previous_context"))
+        await asyncio.sleep(0.01)
+        return ChapterRevised(revised_chapter=inputs["original_chapter"].upper())
+
+    cr = ChapterReviser(
+        ChatOpenAIConfig(api_key="fake"),
+        max_chunk_tokens=20,
+        chunk_overlap_paragraphs=1,
+    )
+    cr.chunk_chain = RunnableLambda(lambda x: None, afunc=fake_revise)
+    text = "\n".join(f"paragraph number {i} of the chapter" for i in range(20))
+    revised = cr.revise_chapter(text)
+    assert revised.revised_chapter == text.upper()
+    assert len(seen_contexts) > 1
+    assert seen_contexts.count("") == 1
@@ -0,0 +1,98 @@
+"""Test the persistent LLM output cache."""
+
+import asyncio
+from pathlib import Path
+import threading
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.llm_cache import LlmCache, make_llm_cache_key
+from epub_summary.summarizer.reviser import ChapterRevised, ChapterReviser
+
+
+def test_cache_key() -> None:
+    """The key depends on the prompt and on the model settings."""
+    config = ChatOpenAIConfig(api_key="fake")
+    key = make_llm_cache_key("prompt", config)
+    assert key == make_llm_cache_key("prompt", config)
+    assert key != make_llm_cache_key("other prompt", config)
+    hot_config = ChatOpenAIConfig(api_key="fake", temperature=0.9)
+    assert key != make_llm_cache_key("prompt", hot_config)
+
+
+def test_cache_get_put(tmp_path: Path) -> None:
+    """Stored outputs are found again, across connections."""
+    cache = LlmCache(tmp_path / "cache.sqlite")
+    assert cache.get("k", ChapterRevised) is None
+    cache.put("k", ChapterRevised(revised_chapter="text"))
+    assert cache.get("k", ChapterRevised) == ChapterRevised(revised_chapter="text")
+    assert (cache.hits, cache.misses) == (1, 1)
+    other = LlmCache(tmp_path / "cache.sqlite")
+    assert other.get("k", ChapterRevised) is not None
+
+
+def test_cache_async_off_loop(tmp_path: Path) -> None:
+    """The async methods query the database from worker threads."""
+    cache = LlmCache(tmp_path / "cache.sqlite")
+    threads = []
+    execute = cache.conn.execute
+
+    class TracedConnection:
+        def execute(self, *args):
+            threads.append(threading.get_ident())
+            return execute(*args)
+
+    cache.conn = TracedConnection()
+
+    async def run() -> list[ChapterRevised | None]:
+        outputs = [ChapterRevised(revised_chapter=f"text {i}") for i in range(8)]
+        await asyncio.gather(*[cache.aput(f"k{i}", o) for i, o in enumerate(outputs)])
+        return await asyncio.gather(
+            *[cache.aget(f"k{i}", ChapterRevised) for i in range(8)]
+        )
+
+    found = asyncio.run(run())
+    assert [f.revised_chapter for f in found] == [f"text {i}" for i in range(8)]
+    assert threading.get_ident() not in threads
+
+
+def test_cache_evict_size(tmp_path: Path) -> None:
+    """The least recently used entries are evicted over the size limit."""
+    cache = LlmCache(tmp_path / "cache.sqlite", max_bytes=100, evict_every=1)
+    for i in range(10):
+        cache.put(f"k{i}", ChapterRevised(revised_chapter="x" * 20))
+        time.sleep(0.001)
+    assert cache.total_bytes() <= 100
+    assert cache.get("k9", ChapterRevised) is not None
+    assert cache.get("k0", ChapterRevised) is None
+
+
+def test_cache_evict_age(tmp_path: Path) -> None:
+    """Old entries are not returned."""
+    cache = LlmCache(tmp_path / "cache.sqlite", max_age_seconds=0.01)
+    cache.put("k", ChapterRevised(revised_chapter="text"))
+    time.sleep(0.02)
+    assert cache.get("k", ChapterRevised) is None
+    cache.evict()
+    assert len(cache) == 0
+
+
+def test_reviser_uses_cache(tmp_path: Path) -> None:
+    """A cached chapter is not sent to the model again."""
+    calls = []
+
+    def fake_revise(inputs: dict) -> ChapterRevised:
+        calls.append(inputs)
+        return ChapterRevised(revised_chapter=inputs["original_chapter"].upper())
+
+    cache = LlmCache(tmp_path / "cache.sqlite")
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake"), cache=cache)
+    cr.chain = RunnableLambda(fake_revise)
+    assert cr.invoke("chapter").revised_chapter == "CHAPTER"
+    assert cr.invoke("chapter").revised_chapter == "CHAPTER"
+    results = cr.revise_many(["chapter", "other"])
+    assert [r.revised.revised_chapter for r in results] == ["CHAPTER", "OTHER"]
+    assert len(calls) == 2
+    assert cache.hits == 2
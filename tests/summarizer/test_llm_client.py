@@ -0,0 +1,280 @@
+"""Test the shared chat client, its adaptive concurrency and retries."""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from epub_summary.benchmark.fake_server import FakeOpenAIServer, LatencyDistribution
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.http_client import LoopAsyncClient
+from epub_summary.summarizer.llm_client import (
+    AimdLimiter,
+    LlmClient,
+    RetryPolicy,
+    get_llm_client,
+)
+from epub_summary.summarizer.reviser import ChapterReviser
+from epub_summary.summarizer.streaming import StreamInterruptedError
+
+
+class FakeApiError(Exception):
+    """Error with a status code, like the ones of the openai client."""
+
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def make_client(**kwargs) -> LlmClient:
+    """Make a client retrying without delay."""
+    kwargs.setdefault("retry_base_delay_s", 0.0)
+    return LlmClient(ChatOpenAIConfig(api_key="fake", **kwargs))
+
+
+def test_aimd_limiter() -> None:
+    """The limit ramps up on success and is cut once per window on overload."""
+    limiter = AimdLimiter(initial=4, min_limit=1, max_limit=6)
+    for _ in range(4):
+        limiter.on_success()
+    assert 4.8 < limiter.limit < 5
+    epoch = limiter.epoch
+    limiter.on_overload(epoch)
+    limiter.on_overload(epoch)
+    assert 2.4 < limiter.limit < 2.5
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 6
+    for _ in range(10):
+        limiter.on_overload(limiter.epoch)
+    assert limiter.limit == 1
+
+
+def test_aimd_limiter_waits() -> None:
+    """A request over the limit waits for a slot to be released."""
+    limiter = AimdLimiter(initial=1)
+
+    async def run() -> list[str]:
+        events = []
+        await limiter.acquire()
+        assert limiter.try_acquire() is None
+
+        async def second() -> None:
+            await limiter.acquire()
+            events.append("second")
+            await limiter.release()
+
+        task = asyncio.create_task(second())
+        await asyncio.sleep(0.01)
+        events.append("release")
+        await limiter.release()
+        await task
+        return events
+
+    assert asyncio.run(run()) == ["release", "second"]
+
+
+def test_retry_delay() -> None:
+    """The delay is jittered under the exponential cap."""
+    policy = RetryPolicy(base_delay_s=1.0, max_delay_s=5.0)
+    assert all(0 <= policy.get_delay(1) <= 2 for _ in range(20))
+    assert all(policy.get_delay(10) <= 5 for _ in range(20))
+
+
+def test_retry_transient_errors() -> None:
+    """Rate limits and server errors are retried, and the limit backs off."""
+    client = make_client(initial_concurrency=8)
+    errors = [FakeApiError(429), FakeApiError(500)]
+
+    async def call() -> str:
+        if len(errors) > 0:
+            raise errors.pop(0)
+        return "ok"
+
+    assert asyncio.run(client.arun(call)) == "ok"
+    assert client.limiter.limit < 8
+
+
+def test_no_retry_on_client_error() -> None:
+    """A bad request fails at once."""
+    client = make_client()
+    calls = []
+
+    async def call() -> str:
+        calls.append(1)
+        raise FakeApiError(400)
+
+    try:
+        asyncio.run(client.arun(call))
+    except FakeApiError:
+        pass
+    else:
+        raise AssertionError("The error was not raised.")
+    assert len(calls) == 1
+
+
+def test_timeout_is_retried() -> None:
+    """An attempt over the timeout is cancelled and retried."""
+    client = make_client(timeout_s=0.05)
+    delays = [1.0, 0.0]
+
+    async def call() -> str:
+        await asyncio.sleep(delays.pop(0))
+        return "ok"
+
+    assert asyncio.run(client.arun(call)) == "ok"
+    assert len(delays) == 0
+
+
+def test_hedged_request() -> None:
+    """A slow request is beaten by its hedge."""
+    client = make_client(hedge_after_s=0.02)
+    delays = [1.0, 0.0]
+
+    async def call() -> str:
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return f"slept {delay}"
+
+    assert asyncio.run(client.arun(call)) == "slept 0.0"
+
+
+def test_client_shared_by_config() -> None:
+    """The revisers with the same config share a client."""
+    config = ChatOpenAIConfig(api_key="fake", base_url="http://localhost:1/v1")
+    assert get_llm_client(config) is get_llm_client(config.model_copy())
+    other = config.model_copy(update={"max_retries": 1})
+    assert get_llm_client(config) is not get_llm_client(other)
+
+
+def test_loop_async_client() -> None:
+    """The async client gets a pool per event loop, closed with its loop."""
+    client = LoopAsyncClient()
+    pools: list[httpx.AsyncHTTPTransport] = []
+
+    async def post(url: str) -> None:
+        pool = await client.loop_transport.get_transport()
+        assert await client.loop_transport.get_transport() is pool
+        pools.append(pool)
+        response = await client.post(url, json={})
+        assert response.status_code == 404
+        assert len(pool._pool.connections) == 1
+
+    with FakeOpenAIServer() as server:
+        asyncio.run(post(f"{server.base_url}/nope"))
+        asyncio.run(post(f"{server.base_url}/nope"))
+    assert pools[0] is not pools[1]
+    assert all(len(pool._pool.connections) == 0 for pool in pools)
+
+
+def test_reviser_against_fake_server() -> None:
+    """The reviser adapts to a server limiting the requests in flight."""
+    with FakeOpenAIServer(
+        LatencyDistribution(median_s=0.05), max_in_flight=3
+    ) as server:
+        config = ChatOpenAIConfig(
+            api_key="fake",
+            base_url=server.base_url,
+            initial_concurrency=8,
+            retry_base_delay_s=0.01,
+        )
+        cr = ChapterReviser(config, max_concurrency=16, max_chunk_tokens=None)
+        chapters = [f"chapter {i} is here" for i in range(12)]
+        # twice, on two event loops
+        for _ in range(2):
+            results = cr.revise_many(chapters)
+            assert all(r.ok for r in results)
+            assert all("here" in r.revised.revised_chapter for r in results)
+    assert server.num_rate_limited > 0
+    assert server.peak_in_flight <= 3
+    assert cr.client.limiter.epoch > 0
+    assert cr.client.limiter.limit < 8
+
+
+def test_streaming_against_fake_server() -> None:
+    """Streamed revisions are retried when rate limited."""
+    with FakeOpenAIServer(
+        LatencyDistribution(median_s=0.01), rate_limit_rate=0.3
+    ) as server:
+        config = ChatOpenAIConfig(
+            api_key="fake", base_url=server.base_url, retry_base_delay_s=0.01
+        )
+        cr = ChapterReviser(config)
+        chapters = [f"chapter {i} is here and there" for i in range(20)]
+
+        async def revise_all() -> list[tuple[str, str]]:
+            async def revise(text: str) -> tuple[str, str]:
+                pieces: list[str] = []
+                revised = await cr.arevise_streaming(text, pieces.append)
+                return "".join(pieces), revised.revised_chapter
+
+            return await asyncio.gather(*[revise(text) for text in chapters])
+
+        results = asyncio.run(revise_all())
+    assert server.num_rate_limited > 0
+    for streamed, revised in results:
+        assert streamed == revised
+        assert "there" in revised
+
+
+def test_streaming_not_retried_once_started() -> None:
+    """A stream failing after the first piece is not retried."""
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake", retry_base_delay_s=0.0))
+    calls = []
+
+    class FailingStreamChain:
+        async def astream(self, inputs, config=None):
+            calls.append(1)
+            yield SimpleNamespace(tool_call_chunks=[{"args": '{"revised_chapter": "a'}])
+            raise FakeApiError(500)
+
+    cr.stream_chain = FailingStreamChain()
+    pieces: list[str] = []
+    with pytest.raises(StreamInterruptedError):
+        cr.revise_streaming("text", pieces.append)
+    assert pieces == ["a"]
+    assert len(calls) == 1
+
+
+class SlowStreamChain:
+    """Stream chain yielding the pieces of a revision with delays."""
+
+    def __init__(self, delays_s: list[float], first_delay_s: list[float]) -> None:
+        self.delays_s = delays_s
+        self.first_delay_s = first_delay_s
+        self.calls = 0
+
+    async def astream(self, inputs, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.first_delay_s.pop(0))
+        yield SimpleNamespace(tool_call_chunks=[{"args": '{"revised_chapter": "'}])
+        for delay_s in self.delays_s:
+            await asyncio.sleep(delay_s)
+            yield SimpleNamespace(tool_call_chunks=[{"args": "ab"}])
+        yield SimpleNamespace(tool_call_chunks=[{"args": '"}'}])
+
+
+def test_long_stream_not_timed_out() -> None:
+    """A stream receiving text is not cut by the timeout of a request."""
+    config = ChatOpenAIConfig(
+        api_key="fake", timeout_s=0.05, stream_timeout_s=0.05, retry_base_delay_s=0.0
+    )
+    cr = ChapterReviser(config)
+    cr.stream_chain = SlowStreamChain([0.01] * 10, [0.0])
+    pieces: list[str] = []
+    revised = cr.revise_streaming("text", pieces.append)
+    assert revised.revised_chapter == "ab" * 10
+    assert "".join(pieces) == revised.revised_chapter
+
+
+def test_stalled_stream_is_retried() -> None:
+    """A stream late for its first chunk times out and is retried."""
+    config = ChatOpenAIConfig(
+        api_key="fake", stream_timeout_s=0.05, retry_base_delay_s=0.0
+    )
+    cr = ChapterReviser(config)
+    chain = SlowStreamChain([0.0], [1.0, 0.0])
+    cr.stream_chain = chain
+    assert cr.revise_streaming("text", lambda _: None).revised_chapter == "ab"
+    assert chain.calls == 2
@@ -0,0 +1,63 @@
+"""Test the packing of short chapters into shared requests."""
+
+from langchain_core.runnables import RunnableLambda
+
+from epub_summary.benchmark.fake_chat import FakeChatModel
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.packing import (
+    format_packed_chapters,
+    plan_packs,
+    split_packed_chapters,
+)
+from epub_summary.summarizer.reviser import (
+    ChapterRevised,
+    ChapterReviser,
+    ChaptersRevised,
+)
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def test_plan_packs() -> None:
+    """Consecutive chapters are packed under the budget, big ones alone."""
+    texts = ["a " * 3, "b " * 3, "c " * 3, "d " * 20, "e " * 2, "f " * 9]
+    packs = plan_packs(texts, 10, count_fn=count_words)
+    assert [p.indexes for p in packs] == [[0, 1, 2], [3], [4], [5]]
+    assert [p.tokens for p in packs] == [9, 20, 2, 9]
+
+
+def test_split_packed_chapters() -> None:
+    """The chapters of a packed prompt are found back."""
+    texts = ["One.\nTwo.", "Three.", "<chapter 9>\nodd"]
+    assert split_packed_chapters(format_packed_chapters(texts)) == texts
+
+
+def test_revise_many_packed() -> None:
+    """Short chapters share a request and come back in order."""
+    fake_model = FakeChatModel(keep_every=1)
+    cr = ChapterReviser(
+        ChatOpenAIConfig(api_key="fake"), chat_model=fake_model, max_pack_tokens=200
+    )
+    chapters = [f"Short chapter number {i}." for i in range(10)] + ["long " * 300]
+    results = cr.revise_many(chapters)
+    assert [r.index for r in results] == list(range(11))
+    assert all(r.ok for r in results)
+    assert results[3].revised.revised_chapter == "Short chapter number 3."
+    assert fake_model.num_calls == 2
+
+
+def test_revise_many_packed_fallback() -> None:
+    """A packed answer with the wrong count falls back to single requests."""
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake"), max_pack_tokens=1000)
+    cr.packed_chain = RunnableLambda(
+        lambda x: ChaptersRevised(
+            revised_chapters=[ChapterRevised(revised_chapter="?")]
+        )
+    )
+    cr.chain = RunnableLambda(
+        lambda x: ChapterRevised(revised_chapter=x["original_chapter"].upper())
+    )
+    results = cr.revise_many(["one", "two", "three"])
+    assert [r.revised.revised_chapter for r in results] == ["ONE", "TWO", "THREE"]
@@ -0,0 +1,69 @@
+"""Test the concurrent chapter revision."""
+
+import asyncio
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.rate_limit import AsyncRateLimiter
+from epub_summary.summarizer.reviser import ChapterRevised, ChapterReviser
+
+
+async def fake_revise(inputs: dict) -> ChapterRevised:
+    """Revise a chapter after a delay depending on its text."""
+    chapter = inputs["original_chapter"]
+    if chapter.startswith("fail"):
+        raise RuntimeError("boom")
+    await asyncio.sleep(0.1 if chapter.startswith("slow") else 0.01)
+    return ChapterRevised(revised_chapter=chapter.upper())
+
+
+def make_reviser(**kwargs) -> ChapterReviser:
+    """Make a reviser with the chain replaced by a fake."""
+    cr = ChapterReviser(ChatOpenAIConfig(api_key="fake"), **kwargs)
+    cr.chain = RunnableLambda(lambda x: None, afunc=fake_revise)
+    return cr
+
+
+def test_revise_many_order_and_errors() -> None:
+    """Results come back in order and failures are isolated."""
+    cr = make_reviser()
+    chapters = ["slow one", "two", "fail three", "four"]
+    results = cr.revise_many(chapters)
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    assert [r.ok for r in results] == [True, True, False, True]
+    assert results[0].revised.revised_chapter == "SLOW ONE"
+    assert isinstance(results[2].error, RuntimeError)
+
+
+def test_revise_many_is_concurrent() -> None:
+    """The wall time is close to the slowest chapter, not the sum."""
+    cr = make_reviser(max_concurrency=10)
+    t_start = time.perf_counter()
+    results = cr.revise_many(["slow"] * 10)
+    elapsed = time.perf_counter() - t_start
+    assert all(r.ok for r in results)
+    assert elapsed < 0.5
+
+
+def test_revise_many_concurrency_limit() -> None:
+    """The concurrency limit serializes the chapters."""
+    cr = make_reviser(max_concurrency=1)
+    t_start = time.perf_counter()
+    cr.revise_many(["slow"] * 3)
+    assert time.perf_counter() - t_start >= 0.3
+
+
+def test_rate_limiter_requests() -> None:
+    """The requests per minute limit delays the extra requests."""
+
+    async def run() -> float:
+        limiter = AsyncRateLimiter(requests_per_minute=600)
+        t_start = time.perf_counter()
+        for _ in range(600 + 2):
+            await limiter.acquire()
+        return time.perf_counter() - t_start
+
+    # the bucket starts full, two more requests need 0.2 s
+    assert asyncio.run(run()) >= 0.15
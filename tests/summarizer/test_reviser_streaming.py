@@ -0,0 +1,112 @@
+"""Test the streaming chapter revision."""
+
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+from epub_summary.benchmark.fake_chat import FakeChatModel
+from epub_summary.config.chat_openai import ChatOpenAIConfig
+from epub_summary.summarizer.llm_cache import LlmCache
+from epub_summary.summarizer.reviser import ChapterRevised, ChapterReviser
+from epub_summary.summarizer.streaming import (
+    FileSink,
+    PartialFieldReader,
+    RevisionRewrite,
+)
+
+CHAPTER = 'It was a dark and stormy night, the rain fell in "torrents".\nThe end.'
+
+
+def make_reviser(**kwargs) -> ChapterReviser:
+    """Make a reviser on the fake chat model."""
+    fake_model = FakeChatModel(stream_chunk_chars=5)
+    return ChapterReviser(
+        ChatOpenAIConfig(api_key="fake"), chat_model=fake_model, **kwargs
+    )
+
+
+def test_partial_field_reader() -> None:
+    """The reader yields the new text of the field from json fragments."""
+    reader = PartialFieldReader("revised_chapter")
+    fragments = ["", '{"revised', '_chapter": "Hel', "lo \\\\n", "wor", 'ld"}']
+    deltas = [reader.feed(f) for f in fragments]
+    assert "".join(deltas) == "Hello \\nworld"
+    assert deltas[1] == ""
+
+
+def test_partial_field_reader_escapes() -> None:
+    """Escapes split across fragments are decoded once complete."""
+    reader = PartialFieldReader("revised_chapter")
+    args_json = (
+        '{"other": {"revised_chapter": "no"},'
+        ' "revised_chapter": "a\\"b\\ud83d\\ude00c"}'
+    )
+    deltas = [reader.feed(c) for c in args_json]
+    assert "".join(deltas) == 'a"b\U0001f600c'
+    assert "\ud83d" not in deltas
+    assert reader.args_json == args_json
+
+
+def test_revise_streaming_callback() -> None:
+    """The pieces add up to the validated revision."""
+    cr = make_reviser()
+    pieces: list[str] = []
+    revised = cr.revise_streaming(CHAPTER, pieces.append)
+    assert isinstance(revised, ChapterRevised)
+    assert len(pieces) > 1
+    assert "".join(pieces) == revised.revised_chapter
+    assert revised == cr.invoke(CHAPTER)
+
+
+def test_revise_streaming_file(tmp_path: Path) -> None:
+    """The revised text is written to a file as it arrives."""
+    cr = make_reviser()
+    out_fp = tmp_path / "revised.txt"
+    revised = cr.revise_streaming(CHAPTER, FileSink(out_fp))
+    assert out_fp.read_text() == revised.revised_chapter
+
+
+def test_astream() -> None:
+    """The revision can be consumed as an async iterator."""
+    cr = make_reviser()
+
+    async def collect() -> list[str]:
+        return [piece async for piece in cr.astream(CHAPTER)]
+
+    pieces = asyncio.run(collect())
+    assert "".join(pieces) == cr.invoke(CHAPTER).revised_chapter
+
+
+def test_revise_streaming_cached(tmp_path: Path) -> None:
+    """A cached revision is written to the sink in one piece."""
+    cr = make_reviser(cache=LlmCache(tmp_path / "cache.sqlite"))
+    first = cr.revise_streaming(CHAPTER, lambda _: None)
+    pieces: list[str] = []
+    second = cr.revise_streaming(CHAPTER, pieces.append)
+    assert second == first
+    assert pieces == [first.revised_chapter]
+
+
+def test_revise_streaming_rewrite(tmp_path: Path) -> None:
+    """The sink is corrected when the streamed text was not the revision."""
+    cr = make_reviser()
+    args_json = '{"revised_chapter": "Draft.", "revised_chapter": "Final."}'
+
+    class FakeStreamChain:
+        async def astream(self, inputs, config=None):
+            for i in range(0, len(args_json), 4):
+                yield SimpleNamespace(tool_call_chunks=[{"args": args_json[i : i + 4]}])
+
+    cr.stream_chain = FakeStreamChain()
+    out_fp = tmp_path / "revised.txt"
+    revised = cr.revise_streaming(CHAPTER, FileSink(out_fp))
+    assert revised.revised_chapter == "Final."
+    assert out_fp.read_text() == "Final."
+
+    async def collect() -> list[str]:
+        return [piece async for piece in cr.astream(CHAPTER)]
+
+    pieces = asyncio.run(collect())
+    assert "".join(pieces[:-1]) == "Draft."
+    assert isinstance(pieces[-1], RevisionRewrite)
+    assert pieces[-1] == "Final."
@@ -0,0 +1,59 @@
+"""Test that importing the parsing modules stays fast and light."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# generous budget, the modules import in well under 0.2 s on a laptop
+IMPORT_BUDGET_S = 1.0
+
+HEAVY_MODULES = ["langchain_core", "langchain_openai", "openai", "tiktoken"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+t_start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t_start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def import_in_subprocess(module: str) -> dict:
+    """Import a module in a fresh interpreter, get the time and heavy modules."""
+    script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "epub_summary.epubber.epub",
+        "epub_summary.epubber.book_cache",
+        "epub_summary.config.epub_summary_config",
+        "epub_summary.config.chat_openai",
+    ],
+)
+def test_import_time(module: str) -> None:
+    """The parsing and config modules import fast, without LangChain."""
+    result = import_in_subprocess(module)
+    assert result["heavy"] == []
+    assert result["elapsed"] < IMPORT_BUDGET_S
+
+
+def test_import_reviser_without_openai() -> None:
+    """The reviser module does not load the OpenAI client until it is used."""
+    result = import_in_subprocess("epub_summary.summarizer.reviser")
+    assert "langchain_openai" not in result["heavy"]
+    assert "tiktoken" not in result["heavy"]